@@ -1,21 +1,35 @@
 import streamlit as st
-import os
-import io
 import time
-from openai import OpenAI
-from dotenv import load_dotenv
-from reportlab.lib.pagesizes import letter
-import PyPDF2
-from docx import Document
-import pandas as pd
-from datetime import datetime
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-import base64
+import asyncio
+import os
+from email_generator.config import (
+    DEFAULT_MODEL,
+    MODEL_OPTIONS,
+    MAX_FILE_SIZE_MB,
+    MAX_HISTORY_ITEMS,
+    HISTORY_USER,
+    EMAIL_PRESETS,
+    BATCH_OUTPUT_DIR,
+    EXPORT_OUTPUT_DIR,
+    BATCH_MAX_CONCURRENCY,
+    BATCH_DEFAULT_CONCURRENCY,
+    BATCH_DEFAULT_RPM,
+    BATCH_DEFAULT_TPM,
+    JOB_POLL_SECONDS,
+    MAX_VARIANTS,
+    TEMPLATE_FIELD_SLOTS,
+)
+from email_generator import generation
+from email_generator.extraction import validate_file, get_extraction_cache
+from email_generator.generation import get_completion_cache
+from email_generator.history import build_email_record, get_history_store
+from email_generator.templates import get_preset_template, parse_slot_values, render_preset
+from email_generator.export import get_pdf_cache, export_history_zip, prune_exports
+from email_generator.batch import read_batch_rows, build_batch_params, build_batch_job, run_batch
+from email_generator.metrics import get_metrics, collect_stages
+from email_generator.jobs import get_job_queue, PENDING_STATUSES
 
 # --- Configuration ---
-load_dotenv()  # Load environment variables
-
 # Set up page configuration
 st.set_page_config(
     page_title="AI Email Generator",
@@ -24,332 +38,67 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# --- Constants ---
-DEFAULT_MODEL = "gpt-4o-mini"  # Updated default model
-MODEL_OPTIONS = ["gpt-4o", "gpt-4o-mini", "o1-mini", "o3-mini"]  # Current model options
-MAX_HISTORY_ITEMS = 20  # Maximum number of history items to keep
-MAX_FILE_SIZE_MB = 5  # Maximum file size for attachments in MB
-MAX_CONTENT_LENGTH = 3000  # Maximum context length for file content
-MAX_RETRIES = 3  # Maximum API retry attempts
-
-# Define email presets with templates and metadata
-EMAIL_PRESETS = {
-    "Job Application": {
-        "tone": "Professional",
-        "purpose": "Applying for a job position",
-        "template": """Subject: Application for [Position Name] at [Company Name]
-
-Dear [Hiring Manager's Name],
-
-I am excited to apply for the [Position Name] role at [Company Name]. With my background in [Relevant Field/Experience], I am confident in my ability to contribute effectively to your team.
-
-In my current role at [Current Company], I have [describe key achievement or responsibility]. This experience has equipped me with [specific skills] that align well with the requirements for this position.
-
-I am particularly drawn to [Company Name] because of [specific reason - company values, projects, etc.]. I would welcome the opportunity to bring my [specific skills] to your team.
-
-Please find my resume attached for your review. I would appreciate the chance to discuss how my skills and experiences align with your needs. I am available at [your phone number] or [your email] at your convenience.
-
-Thank you for your time and consideration. I look forward to the possibility of contributing to your team.
-
-Best regards,
-[Your Name]"""
-    },
-    "Follow-Up Email": {
-        "tone": "Professional",
-        "purpose": "Following up after a meeting or application",
-        "template": """Subject: Following Up on [Meeting/Application Topic]
-
-Dear [Recipient's Name],
-
-I hope this email finds you well. I wanted to follow up regarding our recent [meeting/conversation] about [topic] on [date]. 
-
-[If applicable: Thank you again for taking the time to [discuss/meet about] [topic]. I found our conversation particularly valuable because [specific reason].]
-
-[If waiting for response: I understand you're busy, but I wanted to check if there have been any updates regarding [specific question or next steps].]
-
-Please don't hesitate to let me know if you need any additional information from my side. I'm happy to provide further details or clarify anything about [subject].
-
-Looking forward to hearing from you.
-
-Best regards,
-[Your Name]"""
-    },
-    "Thank You Note": {
-        "tone": "Friendly",
-        "purpose": "Expressing gratitude after an interview or favor",
-        "template": """Subject: Thank You for [Specific Reason]
-
-Dear [Recipient's Name],
-
-I wanted to take a moment to sincerely thank you for [specific reason - interview, help, gift, etc.]. I truly appreciate the time and effort you took to [specific action].
-
-[For interviews: I particularly enjoyed learning about [something specific from the conversation]. Our discussion about [topic] reinforced my excitement about the opportunity to join [Company Name].]
-
-[If appropriate: Please don't hesitate to let me know if there's ever anything I can do to return the favor.]
-
-Thanks again for your [kindness/guidance/support]. It means a great deal to me.
-
-Warm regards,
-[Your Name]"""
-    },
-    "Sales Pitch": {
-        "tone": "Persuasive",
-        "purpose": "Introducing a product or service to potential clients",
-        "template": """Subject: [Product/Service] to Help You [Solve Problem]
-
-Dear [Recipient's Name],
-
-I hope you're doing well. I'm reaching out because I believe [Company Name]'s [Product/Service] could help you [solve specific problem or achieve specific goal].
-
-Many [industry] professionals like yourself are facing challenges with [specific pain point]. Our solution helps by [key benefit 1], [key benefit 2], and [key benefit 3].
-
-For example, we recently helped [Client Name] achieve [specific result] within [timeframe]. They were able to [specific outcome] while reducing [pain point] by [percentage].
-
-I'd love to schedule a quick call to discuss how we might be able to help you with [specific challenge]. Would [date/time] or [date/time] work for you?
-
-In the meantime, I've attached [relevant materials] that provide more details about our solution.
-
-Looking forward to the possibility of working together.
-
-Best regards,
-[Your Name]
-[Your Position]
-[Your Company]"""
-    },
-    "Networking Request": {
-        "tone": "Professional",
-        "purpose": "Requesting an informational interview or connection",
-        "template": """Subject: Request for [Informational Interview/Advice]
-
-Dear [Recipient's Name],
-
-I hope this message finds you well. My name is [Your Name], and I'm [your current position/student status] with a strong interest in [field/industry].
-
-I've been following your work at [Company/Organization] and particularly admire [specific aspect of their work]. I would greatly appreciate the opportunity to learn more about your experiences and insights in [specific area].
-
-Would you be available for a brief [15-20 minute] conversation in the coming weeks? I'm happy to accommodate your schedule and can meet in person or virtually, whichever is most convenient for you.
-
-I completely understand if you're unable to spare the time, but any advice you could share would be invaluable as I [your current goal - navigate my career path, learn about the industry, etc.].
-
-Thank you for considering this request. I look forward to the possibility of connecting.
-
-Best regards,
-[Your Name]
-[Your Contact Information]"""
-    }
-}
-
 # --- Helper Functions ---
 
 def initialize_openai_client():
     """Initialize and return OpenAI client using API key from .env"""
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        st.error("OPENAI_API_KEY not found in .env file")
-        return None
     try:
-        return OpenAI(api_key=api_key)
+        return generation.initialize_openai_client()
     except Exception as e:
         st.error(f"Error initializing OpenAI client: {str(e)}")
         return None
 
-def validate_file(file):
-    """Validate uploaded file size and type."""
-    valid_types = ['pdf', 'docx', 'xlsx', 'txt', 'jpg', 'png', 'jpeg']
-    file_type = file.name.split('.')[-1].lower()
-    
-    if file_type not in valid_types:
-        raise ValueError(f"Unsupported file type: {file_type}")
-    if file.size > MAX_FILE_SIZE_MB * 1024 * 1024:
-        raise ValueError(f"File size exceeds {MAX_FILE_SIZE_MB}MB limit")
-    return True
-
-def extract_text_from_file(file):
-    """Extract text content from various file types with error handling."""
-    try:
-        validate_file(file)
-        file_type = file.name.split('.')[-1].lower()
-        
-        if file_type == 'pdf':
-            return extract_text_from_pdf(file)
-        elif file_type == 'docx':
-            return extract_text_from_docx(file)
-        elif file_type in ['xlsx', 'xls']:
-            return extract_text_from_excel(file)
-        elif file_type == 'txt':
-            return file.read().decode('utf-8')
-        elif file_type in ['jpg', 'png', 'jpeg']:
-            return "[Image content - description not extracted]"
-        else:
-            return f"[Unsupported file format: {file_type}]"
-    except Exception as e:
-        return f"[Error processing {file.name}: {str(e)}]"
-
-def extract_text_from_pdf(file):
-    """Extract text from PDF files."""
-    try:
-        pdf_reader = PyPDF2.PdfReader(file)
-        text = ""
-        for page in pdf_reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-        return text.strip()
-    except Exception as e:
-        raise Exception(f"PDF extraction error: {str(e)}")
-
-def extract_text_from_docx(file):
-    """Extract text from Word documents."""
-    try:
-        doc = Document(io.BytesIO(file.read()))
-        return '\n'.join([para.text for para in doc.paragraphs if para.text.strip()])
-    except Exception as e:
-        raise Exception(f"DOCX extraction error: {str(e)}")
-
-def extract_text_from_excel(file):
-    """Extract text from Excel files."""
-    try:
-        df = pd.read_excel(file)
-        return df.to_string()
-    except Exception as e:
-        raise Exception(f"Excel extraction error: {str(e)}")
-
-# def generate_pdf(content):
-#     """Generate PDF from email content with proper formatting."""
-#     buffer = io.BytesIO()
-#     try:
-#         c = canvas.Canvas(buffer, pagesize=letter)
-#         width, height = letter
-#         y_position = height - 40
-#         line_height = 14
-        
-#         text = c.beginText(40, y_position)
-#         text.setFont("Courier", 12)
-        
-#         for line in content.split('\n'):
-#             if y_position < 40:
-#                 c.drawText(text)
-#                 c.showPage()
-#                 y_position = height - 40
-#                 text = c.beginText(40, y_position)
-#                 text.setFont("Courier", 12)
-            
-#             text.textLine(line)
-#             y_position -= line_height
-        
-#         c.drawText(text)
-#         c.save()
-#         buffer.seek(0)
-#         return buffer
-#     except Exception as e:
-#         st.error(f"Error generating PDF: {str(e)}")
-#         return None
-
-def generate_pdf(content, title="Generated Email"):
-    """Generate PDF from email content with proper formatting."""
-    buffer = io.BytesIO()
-    try:
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        
-        flowables = []
-        
-        # Add title
-        flowables.append(Paragraph(title, styles['Title']))
-        flowables.append(Spacer(1, 12))
-        
-        # Process content
-        for line in content.split('\n'):
-            if line.strip():
-                if line.startswith('Subject:'):
-                    flowables.append(Paragraph(f"<b>{line}</b>", styles['Heading2']))
-                elif line.startswith('Dear'):
-                    flowables.append(Paragraph(line, styles['Heading3']))
-                elif any(line.startswith(prefix) for prefix in ['Best regards,', 'Sincerely,', 'Regards,']):
-                    flowables.append(Paragraph(line, styles['Heading3']))
-                else:
-                    flowables.append(Paragraph(line, styles['BodyText']))
-                
-                flowables.append(Spacer(1, 6))
-        
-        doc.build(flowables)
-        buffer.seek(0)
-        return buffer
-    except Exception as e:
-        st.error(f"Error generating PDF: {str(e)}")
-        return None
-
-def create_download_link_pdf(pdf_bytes, filename, link_text):
-    """Create a download link for PDF content"""
-    b64 = base64.b64encode(pdf_bytes.getvalue()).decode()
-    href = f'<a href="data:application/pdf;base64,{b64}" download="{filename}">{link_text}</a>'
-    return href
-
-def create_download_link_txt(text_content, filename, link_text):
-    """Create a download link for text content"""
-    b64 = base64.b64encode(text_content.encode()).decode()
-    href = f'<a href="data:text/plain;base64,{b64}" download="{filename}">{link_text}</a>'
-    return href
-
-def build_email_prompt(params):
-    """Construct the prompt for email generation."""
-    file_contents = []
-    if params.get('uploaded_files'):
-        with st.spinner("Processing attachments..."):
-            for file in params['uploaded_files']:
-                content = extract_text_from_file(file)
-                file_contents.append(f"=== Content from {file.name} ===\n{content}\n")
-    
-    combined_content = '\n'.join(file_contents)
-    if len(combined_content) > MAX_CONTENT_LENGTH:
-        combined_content = combined_content[:MAX_CONTENT_LENGTH] + "\n[Content truncated]"
-
-    return f"""
-    Compose a {params['tone'].lower()} email in {params['language']} with these specifications:
-    
-    - Sender: {params['user_name']} ({params['user_role']})
-    - Recipient: {params['recipient_name']} ({params['recipient_role']})
-    - Purpose: {params['email_purpose']}
-    - Background: {params['background_info']}
-    - Special instructions: {params['special_instructions']}
-    
-    {f"Incorporate relevant information from these attached files:\n{combined_content}" if combined_content else "No file content available"}
-    
-    Structure:
-    1. Clear subject line
-    2. Appropriate greeting
-    3. Well-structured body
-    4. Professional closing
-    5. Mention of attachments if applicable
-    
-    Style Guidelines:
-    - Maintain {params['writing_style'].lower()} style
-    - Keep length {params['email_length'].lower()}
-    - Use proper business email formatting
-    - Highlight key points from file content when relevant
-    """
+def open_job(job):
+    """Show a finished job's email in the generator tab."""
+    st.session_state.generated_email = job['email']
+    st.session_state.current_email_id = job['email_id']
+    st.session_state.generation_stats = job['stats']
+    st.session_state.stage_timings = job['stats']['stages']
+    st.session_state.variants = job['variants']
+    st.session_state.edit_mode = False
+    st.session_state.selected_preset = None
+    st.session_state.loaded_preset_name = None
+
+def generation_queue():
+    """Render the user's background jobs; runs as a fragment that polls while jobs are active."""
+    job_queue = get_job_queue()
+    followed = st.session_state.get('followed_job_id')
+    icons = {"queued": "⏳", "running": "✍️", "done": "✅", "failed": "❌"}
+    st.subheader("🗂️ Generation Queue")
+    for job in job_queue.list(st.session_state.user_id):
+        if job['id'] == followed and job['status'] not in PENDING_STATUSES:
+            # The job started from this session finished: show it in full
+            st.session_state.followed_job_id = None
+            if job['status'] == "done":
+                open_job(job)
+                st.rerun()
 
-def generate_email_with_retry(prompt, max_retries=MAX_RETRIES):
-    """Generate email with retry logic for API failures."""
-    client = initialize_openai_client(st.session_state.api_key)
-    if not client:
-        return None
-        
-    for attempt in range(max_retries):
-        try:
-            response = client.chat.completions.create(
-                model=st.session_state.selected_model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                max_tokens=1500
+        elapsed = (job['finished_at'] or time.time()) - (job['started_at'] or job['created_at'])
+        purpose = job['email_purpose'][:60] + ("…" if len(job['email_purpose']) > 60 else "")
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.write(
+                f"{icons[job['status']]} **{job['status'].title()}** · "
+                f"To {job['recipient_name'] or 'recipient'}" + (f": {purpose}" if purpose else "")
+                + (f" ({elapsed:.1f}s)" if job['status'] != "queued" else "")
             )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            if attempt == max_retries - 1:
-                st.error(f"Failed after {max_retries} attempts: {str(e)}")
-                raise e
-            wait_time = 1 * (attempt + 1)
-            time.sleep(wait_time)
+            if job['status'] == "running" and job['partial']:
+                st.code(job['partial'], language="text")
+            elif job['status'] == "failed":
+                st.caption(f"Error: {job['error']}")
+        with col2:
+            if job['status'] == "queued":
+                if st.button("✖️ Cancel", key=f"job_cancel_{job['id']}"):
+                    job_queue.cancel(job['id'], st.session_state.user_id)
+                    st.rerun()
+            elif job['status'] == "done":
+                if st.button("📝 Open", key=f"job_open_{job['id']}"):
+                    open_job(job)
+                    st.rerun()
+            elif job['status'] == "failed":
+                if st.button("🗑️ Dismiss", key=f"job_dismiss_{job['id']}"):
+                    job_queue.dismiss(job['id'], st.session_state.user_id)
+                    st.rerun()
 
 def remove_attachment(file_name):
     """Remove an attachment from the uploaded files"""
@@ -358,26 +107,96 @@ def remove_attachment(file_name):
         if f.name != file_name
     ]
 
-def extract_subject(email_content):
-    """Extract subject line from email content"""
-    for line in email_content.split('\n'):
-        if line.startswith('Subject:'):
-            return line.replace('Subject:', '').strip()
-    return "No Subject"
+def history_page(key, total, page_size=MAX_HISTORY_ITEMS):
+    """Render a page selector when needed and return the offset of the current page."""
+    pages = max(1, -(-total // page_size))
+    if pages == 1:
+        return 0
+    if st.session_state.get(key, 1) > pages:
+        # Deleting entries can leave the selector past the last page
+        st.session_state[key] = pages
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, key=key)
+    return (page - 1) * page_size
+
+def load_history_email(email_id):
+    """Open a history email in the generator tab."""
+    email = get_history_store().get(email_id, st.session_state.user_id)
+    if email:
+        st.session_state.generated_email = email['content']
+        st.session_state.current_email_id = email_id
+        st.session_state.generation_stats = None
+        st.session_state.variants = None
+        st.session_state.edit_mode = False
+        st.session_state.current_tab = "📧 Email Generator"
+
+def render_history_email(email, section, show_delete=True):
+    """Render one history entry; its body is only fetched while the expander is open."""
+    history_store = get_history_store()
+    expander = st.expander(
+        f"{email['timestamp']} - {email['metadata']['subject']}",
+        key=f"{section}_open_{email['id']}",
+        on_change="rerun"
+    )
+    if not expander.open:
+        return
+    with expander:
+        col1, col2 = st.columns([4,1])
+        with col1:
+            st.write(f"**Tone:** {email['metadata']['tone']}| **Writing Style:** {email['metadata']['writing_style']}| **Email Length:** {email['metadata']['email_length']}")
+            if email['metadata'].get('preset'):
+                st.write(f"**Template:** {email['metadata']['preset']}")
+            full_email = history_store.get(email['id'], st.session_state.user_id)
+            if full_email:
+                st.code(full_email['content'], language="text")
+        with col2:
+            # Favorite toggle
+            is_favorite = email['favorite']
+            fav_label = "❤️ Remove" if is_favorite else "♡ Add"
+            if st.button(fav_label, key=f"{section}_fav_{email['id']}"):
+                history_store.set_favorite(email['id'], not is_favorite, st.session_state.user_id)
+                st.rerun()
+
+            # Load button
+            if st.button("📝 Load", key=f"{section}_load_{email['id']}"):
+                load_history_email(email['id'])
+                st.rerun()
+
+            # Delete button
+            if show_delete and st.button("🗑️ Delete", key=f"{section}_delete_{email['id']}"):
+                history_store.delete(email['id'], st.session_state.user_id)
+                st.rerun()
+
+def session_owner():
+    """Return the history owner for this session.
+
+    A user signed in with st.login owns their history by email, so visitors
+    of a shared deployment never see or clear each other's emails and jobs.
+    Without sign-in every session uses HISTORY_USER, the owner the CLI also
+    writes to, so history survives reloads and restarts.
+    """
+    if st.user.get("is_logged_in") and st.user.get("email"):
+        return st.user.get("email")
+    return HISTORY_USER
 
 # --- Session State Initialization ---
-if 'history' not in st.session_state:
-    st.session_state.history = []
-if 'favorites' not in st.session_state:
-    st.session_state.favorites = []
+if 'user_id' not in st.session_state:
+    st.session_state.user_id = session_owner()
+if 'current_email_id' not in st.session_state:
+    st.session_state.current_email_id = None
 if 'selected_preset' not in st.session_state:
     st.session_state.selected_preset = None
+if 'loaded_preset_name' not in st.session_state:
+    st.session_state.loaded_preset_name = None
 if 'uploaded_files' not in st.session_state:
     st.session_state.uploaded_files = []
 if 'edit_mode' not in st.session_state:
     st.session_state.edit_mode = False
 if 'selected_model' not in st.session_state:
     st.session_state.selected_model = DEFAULT_MODEL
+if 'stream_output' not in st.session_state:
+    st.session_state.stream_output = True
+if 'use_completion_cache' not in st.session_state:
+    st.session_state.use_completion_cache = True
 
 # --- Sidebar Configuration ---
 with st.sidebar:
@@ -390,12 +209,62 @@ with st.sidebar:
         index=MODEL_OPTIONS.index(DEFAULT_MODEL),
         help="More powerful models may produce better results but cost more"
     )
+
+    st.session_state.stream_output = st.checkbox(
+        "Stream output",
+        value=st.session_state.stream_output,
+        help="Show the email as it is being written"
+    )
+    st.session_state.use_completion_cache = st.checkbox(
+        "Reuse cached responses",
+        value=st.session_state.use_completion_cache,
+        help="Return the previous email for an identical request instead of calling the model again"
+    )
     
     st.markdown("---")
     st.caption("Note: API key is loaded from .env file")
 
+    # Attachment cache statistics
+    cache_stats = get_extraction_cache().stats()
+    with st.expander("📦 Attachment Cache", expanded=False):
+        st.write(f"**Hits:** {cache_stats['hits']} (disk: {cache_stats['disk_hits']})")
+        st.write(f"**Misses:** {cache_stats['misses']}")
+        st.write(f"**Entries:** {cache_stats['entries']} ({cache_stats['bytes'] // 1024} KB)")
+
+    # Completion cache statistics
+    completion_stats = get_completion_cache().stats()
+    with st.expander("💬 Response Cache", expanded=False):
+        st.write(f"**Hits:** {completion_stats['hits']} (coalesced: {completion_stats['coalesced']})")
+        st.write(f"**Misses:** {completion_stats['misses']}")
+        st.write(f"**Entries:** {completion_stats['entries']}")
+
+    # Where the time of the last generation went
+    if st.session_state.get('stage_timings'):
+        with st.expander("⏱️ Last Request", expanded=False):
+            for sample in st.session_state.stage_timings:
+                details = [
+                    f"{key.replace('_', ' ')}: {value}" for key, value in sample.items()
+                    if key not in ("stage", "seconds", "model")
+                ]
+                st.write(
+                    f"**{sample['stage']}:** {sample['seconds'] * 1000:.0f} ms"
+                    + (f" ({', '.join(details)})" if details else "")
+                )
+
+    # Latency percentiles per stage since the server started
+    stage_metrics = get_metrics().snapshot()
+    if stage_metrics:
+        with st.expander("📈 Stage Latency", expanded=False):
+            rows = ["| Stage | Count | p50 | p95 | p99 |", "|---|---|---|---|---|"]
+            for stage, entry in sorted(stage_metrics.items()):
+                rows.append(
+                    f"| {stage} | {entry['count']} | {entry['p50'] * 1000:.0f} ms | "
+                    f"{entry['p95'] * 1000:.0f} ms | {entry['p99'] * 1000:.0f} ms |"
+                )
+            st.markdown("\n".join(rows))
+
 # --- Main Application Tabs ---
-tab1, tab2 = st.tabs(["📧 Email Generator", "📚 History & Favorites"])
+tab1, tab2, tab3 = st.tabs(["📧 Email Generator", "📚 History & Favorites", "📬 Batch"])
 
 with tab1:
     # --- Email Generator Interface ---
@@ -417,13 +286,15 @@ with tab1:
             if selected_preset_name != "Custom Email":
                 if st.button("Load Preset", key="load_preset_button", help="Load this template"):
                     st.session_state.selected_preset = EMAIL_PRESETS[selected_preset_name]
+                    st.session_state.loaded_preset_name = selected_preset_name
                     st.rerun()
         
         # Clear preset button with immediate effect
         if st.session_state.get('selected_preset'):
-            st.info(f"Loaded preset: {selected_preset_name}")
+            st.info(f"Loaded preset: {st.session_state.loaded_preset_name}")
             if st.button("Clear Preset", key="clear_preset_button", help="Return to custom email"):
                 st.session_state.selected_preset = None
+                st.session_state.loaded_preset_name = None
                 st.rerun()
 
     # --- Email Configuration ---
@@ -454,6 +325,17 @@ with tab1:
                 ["English", "Spanish", "French", "German", "Chinese"],
                 help="Select the output language"
             )
+        variant_count = st.number_input(
+            "Variants:",
+            min_value=1,
+            max_value=MAX_VARIANTS,
+            value=1,
+            help="Drafts written from one request (attachments are sent once) and ranked; several are not streamed"
+        )
+
+    # A loaded preset can be filled locally from its template
+    # The loaded preset, not the selectbox, which may have moved on since "Load Preset"
+    template_preset = st.session_state.loaded_preset_name if st.session_state.selected_preset else None
 
     # --- Email Content Form ---
     with st.form("email_inputs", clear_on_submit=False):
@@ -486,6 +368,18 @@ with tab1:
             max_chars=300
         )
         st.caption(f"{len(special_instructions)}/300 characters")
+
+        slot_text = ""
+        if template_preset:
+            form_slots = {slot for slots in TEMPLATE_FIELD_SLOTS.values() for slot in slots}
+            open_slots = [slot for slot in get_preset_template(template_preset).slots if slot not in form_slots]
+            slot_text = st.text_area(
+                "Template Values:",
+                placeholder="\n".join(f"{slot}: ..." for slot in open_slots[:3]),
+                help="One 'Slot: value' per line for the template's [placeholders]; your and the recipient's names come from the fields above",
+                key="template_slot_values"
+            )
+            st.caption("Slots: " + ", ".join(f"[{slot}]" for slot in open_slots))
         
         # File attachment section
         uploaded_files = st.file_uploader(
@@ -496,10 +390,23 @@ with tab1:
             key="file_uploader"
         )
 
-        generate_button = st.form_submit_button(
-            "✨ Generate Email",
-            help="Generate email using the provided information"
-        )
+        submit_col1, submit_col2 = st.columns(2)
+        with submit_col1:
+            generate_button = st.form_submit_button(
+                "✨ Generate Email",
+                help="Generate email using the provided information"
+            )
+        with submit_col2:
+            regenerate_button = st.form_submit_button(
+                "🔄 Regenerate",
+                help="Ignore any cached response and call the model again"
+            )
+        fill_button = False
+        if template_preset:
+            fill_button = st.form_submit_button(
+                "⚡ Fill Template",
+                help="Fill the template's slots locally, without calling the model"
+            )
 
     # Store uploaded files in session state
     if uploaded_files:
@@ -524,72 +431,137 @@ with tab1:
                     st.rerun()
 
     # --- Email Generation Logic ---
-    if generate_button:
-        with st.spinner("Generating your email..."):
-            try:
-                client = initialize_openai_client()
-                if not client:
-                    st.error("Failed to initialize OpenAI client. Please check your .env file.")
-                    st.stop()
-
-                prompt = build_email_prompt({
-                    'tone': tone,
-                    'language': language,
-                    'user_name': user_name,
-                    'user_role': user_role,
-                    'recipient_name': recipient_name,
-                    'recipient_role': recipient_role,
-                    'email_purpose': email_purpose,
-                    'background_info': background_info,
-                    'special_instructions': special_instructions,
-                    'writing_style': writing_style,
-                    'email_length': email_length,
-                    'uploaded_files': st.session_state.uploaded_files
-                })
-                
-                response = client.chat.completions.create(
-                    model=st.session_state.selected_model,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.7,
-                    max_tokens=1500
-                )
-                generated_email = response.choices[0].message.content.strip()
-                    
-                if generated_email:
-                    # Save to history
-                    email_record = {
-                        "content": generated_email,
-                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                        "favorite": False,
-                        "metadata": {
-                            "tone": tone,
-                            "recipient": recipient_name,
-                            "language": language,
-                            "writing_style": writing_style,
-                            "email_length": email_length,
-                            "subject": extract_subject(generated_email),
-                            "purpose": email_purpose[:50],
-                            "preset": selected_preset_name if selected_preset_name != "Custom Email" else None
-                        }
-                    }
-                    st.session_state.history.append(email_record)
-                        
-                    # Maintain history size limit
-                    if len(st.session_state.history) > MAX_HISTORY_ITEMS:
-                        st.session_state.history = st.session_state.history[-MAX_HISTORY_ITEMS:]
-                            
-                    st.session_state.generated_email = generated_email
-                    st.session_state.edit_mode = False
-                    st.session_state.selected_preset = None
-                    st.rerun()
-                        
-            except Exception as e:
-                st.error(f"Error generating email: {str(e)}")
+    if generate_button or regenerate_button or fill_button:
+        email_params = {
+            'tone': tone,
+            'language': language,
+            'user_name': user_name,
+            'user_role': user_role,
+            'recipient_name': recipient_name,
+            'recipient_role': recipient_role,
+            'email_purpose': email_purpose,
+            'background_info': background_info,
+            'special_instructions': special_instructions,
+            'writing_style': writing_style,
+            'email_length': email_length,
+            'uploaded_files': list(st.session_state.uploaded_files)
+        }
+
+    if fill_button:
+        # No model call, so this also works while the API is unavailable
+        with collect_stages() as stages:
+            draft = render_preset(template_preset, email_params, parse_slot_values(slot_text))
+            record = build_email_record(draft['text'], email_params, template_preset)
+            st.session_state.current_email_id = get_history_store().add(record, st.session_state.user_id)
+        elapsed = sum(sample['seconds'] for sample in stages if sample['stage'] == "render_template")
+        st.session_state.generated_email = draft['text']
+        st.session_state.generation_stats = {"source": "template", "time_to_first_token": elapsed, "total_time": elapsed}
+        st.session_state.stage_timings = stages
+        st.session_state.variants = None
+        st.session_state.edit_mode = False
+        st.session_state.template_draft = dict(
+            draft, params=email_params, preset=template_preset, email_id=st.session_state.current_email_id
+        )
+        st.rerun()
+
+    if generate_button or regenerate_button:
+        if not initialize_openai_client():
+            st.error("Failed to initialize OpenAI client. Please check your .env file.")
+            st.stop()
+
+        try:
+            # Generation runs on the background pool; the queue below follows it
+            st.session_state.followed_job_id = get_job_queue().submit(
+                email_params,
+                st.session_state.selected_model,
+                user_id=st.session_state.user_id,
+                preset_name=selected_preset_name,
+                stream=st.session_state.stream_output,
+                bypass_cache=regenerate_button or not st.session_state.use_completion_cache,
+                variants=variant_count
+            )
+        except Exception as e:
+            st.error(f"Error generating email: {str(e)}")
+
+    # --- Generation Queue ---
+    jobs = get_job_queue().list(st.session_state.user_id)
+    if jobs:
+        # Poll only while something is in flight; a full rerun restarts polling
+        active = any(job['status'] in PENDING_STATUSES for job in jobs)
+        st.fragment(generation_queue, run_every=JOB_POLL_SECONDS if active else None)()
 
     # --- Generated Email Display ---
     if 'generated_email' in st.session_state:
         st.success("Email generated successfully!")
+        if st.session_state.get('generation_stats'):
+            stats = st.session_state.generation_stats
+            if stats.get('source') in ("cache", "coalesced"):
+                st.caption(f"⚡ Served from the response cache in {stats['total_time']:.2f}s")
+            elif stats.get('source') == "template":
+                st.caption(f"⚡ Filled locally from the template in {stats['total_time'] * 1000:.2f} ms")
+            else:
+                st.caption(
+                    f"⏱️ First token in {stats['time_to_first_token']:.2f}s · "
+                    f"generated in {stats['total_time']:.2f}s"
+                )
+            if stats.get('tokens'):
+                tokens = stats['tokens']
+                compaction = tokens.get('compaction') or {}
+                saved = f"{compaction['tokens_saved']} saved by compaction · " if compaction.get('tokens_saved') else ""
+                st.caption(
+                    f"🔢 {tokens['prompt_tokens']} prompt tokens ({tokens['attachment_tokens']} from attachments"
+                    f"{', truncated' if tokens['attachments_truncated'] else ''}) · {saved}"
+                    f"{tokens['output_tokens']}/{tokens['max_output_tokens']} output tokens"
+                )
         
+        # A template draft with empty slots can be finished by the model
+        draft = st.session_state.get('template_draft')
+        if draft and draft['email_id'] == st.session_state.current_email_id:
+            empty_slots = [slot for slot in draft['unfilled'] if f"[{slot}]" in st.session_state.generated_email]
+            if empty_slots:
+                st.warning("Still to fill: " + ", ".join(f"[{slot}]" for slot in empty_slots))
+                if st.button("✨ Fill the Rest with AI", help="Send this draft to the model to fill the empty slots and polish it"):
+                    if not initialize_openai_client():
+                        st.error("Failed to initialize OpenAI client. Please check your .env file.")
+                    else:
+                        try:
+                            st.session_state.followed_job_id = get_job_queue().submit(
+                                dict(draft['params'], draft=st.session_state.generated_email),
+                                st.session_state.selected_model,
+                                user_id=st.session_state.user_id,
+                                preset_name=draft['preset'],
+                                stream=st.session_state.stream_output,
+                                bypass_cache=not st.session_state.use_completion_cache
+                            )
+                            st.session_state.template_draft = None
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Error generating email: {str(e)}")
+
+        # Drafts from one multi-variant request, best first
+        if st.session_state.get('variants'):
+            st.write("**Variants** (ranked by length, subject line and filled placeholders)")
+            variants = st.session_state.variants
+            for number, (column, variant) in enumerate(zip(st.columns(len(variants)), variants), start=1):
+                with column:
+                    issues = [] if variant['has_subject'] else ["no subject"]
+                    issues += [f"unfilled {placeholder}" for placeholder in variant['unfilled']]
+                    issues += [f"missing {name}" for name in variant['missing_names']]
+                    st.caption(
+                        f"#{number} · score {variant['score']:.2f} · {variant['words']} words"
+                        + (f" · {', '.join(issues)}" if issues else "")
+                    )
+                    st.code(variant['email'], language="text", wrap_lines=True)
+                    in_use = variant['email'] == st.session_state.generated_email
+                    if st.button("✅ In use" if in_use else "Use this", key=f"use_variant_{number}", disabled=in_use):
+                        if variant.get('email_id') is None:
+                            # Only the best draft was saved when the job finished
+                            variant['email_id'] = get_history_store().add(variant['record'], st.session_state.user_id)
+                        st.session_state.generated_email = variant['email']
+                        st.session_state.current_email_id = variant['email_id']
+                        st.session_state.edit_mode = False
+                        st.rerun()
+
         # Show attachments if any
         if st.session_state.uploaded_files:
             with st.expander("📎 Attachments", expanded=False):
@@ -621,133 +593,302 @@ with tab1:
                     st.session_state.edit_mode = True
                     st.rerun()
         
+        # Downloads are served as files by Streamlit rather than inline data: URLs
+        file_stem = f"email_to_{recipient_name.replace(' ', '_')}"
         with col2:
-            if st.button("📝 Save as txt", key="save_email_text"):
-                txt_filename = f"email_to_{recipient_name.replace(' ', '_')}.txt"
-                st.markdown(
-                    create_download_link_txt(
-                        st.session_state.generated_email,
-                        filename=txt_filename,
-                        link_text="📥 Download as Text"
-                    ),
-                    unsafe_allow_html=True
-                )
+            st.download_button(
+                "📝 Save as txt",
+                data=st.session_state.generated_email,
+                file_name=f"{file_stem}.txt",
+                mime="text/plain",
+                on_click="ignore",
+                key="save_email_text"
+            )
         
         with col3:
-            if st.button("📄 Save as PDF", key="save_email_pdf"):
-                
-                # Generate the PDF
-                pdf_buffer = generate_pdf(
-                    st.session_state.generated_email,
-                    title=f"Email to {recipient_name}"
-                )
-                
-                # Create the download link
-                if pdf_buffer:
-                    st.markdown(
-                        create_download_link_pdf(
-                            pdf_buffer,
-                            filename=f"email_to_{recipient_name.replace(' ', '_')}.pdf",
-                            link_text="📥 Download as PDF"
-                        ),
-                        unsafe_allow_html=True
-                    )
+            # The PDF is rendered on click, and only once per email content and title
+            email_content = st.session_state.generated_email
+            pdf_title = f"Email to {recipient_name}"
+            st.download_button(
+                "📄 Save as PDF",
+                data=lambda: get_pdf_cache().get_or_render(email_content, pdf_title),
+                file_name=f"{file_stem}.pdf",
+                mime="application/pdf",
+                on_click="ignore",
+                key="save_email_pdf"
+            )
         
         with col4:
-            current_email_index = next(
-                (i for i, email in enumerate(st.session_state.history) 
-                if email['content'] == st.session_state.generated_email
-            ), None)
+            current_email = None
+            if st.session_state.current_email_id is not None:
+                current_email = get_history_store().get(st.session_state.current_email_id, st.session_state.user_id)
             
-            if current_email_index is not None:
-                is_favorite = st.session_state.history[current_email_index]['favorite']
+            if current_email is not None:
+                is_favorite = current_email['favorite']
                 fav_label = "❤️ Remove Favorite" if is_favorite else "♡ Add Favorite"
                 if st.button(
                     fav_label, 
                     use_container_width=True,
-                    key=f"fav_toggle_{current_email_index}"
+                    key=f"fav_toggle_{current_email['id']}"
                 ):
-                    st.session_state.history[current_email_index]['favorite'] = not is_favorite
+                    get_history_store().set_favorite(current_email['id'], not is_favorite, st.session_state.user_id)
                     st.rerun()
 
 with tab2:
     # --- History & Favorites Interface ---
     # st.title("📚 Email History & Favorites")
+    history_store = get_history_store()
     
     # Clear All History Button
-    if st.session_state.history:
+    if history_store.count(st.session_state.user_id):
         if st.button("🗑️ Clear All History", type="primary"):
-            st.session_state.history = []
-            st.session_state.favorites = []
+            history_store.clear(st.session_state.user_id)
+            st.session_state.current_email_id = None
             st.rerun()
     
+    # Search Section
+    search_query = st.text_input(
+        "🔎 Search emails:",
+        placeholder="e.g. follow-up Acme",
+        help="Matches subject, recipient, purpose and body; results are ranked by relevance",
+        key="history_query"
+    )
+    with st.expander("Filters"):
+        filter_col1, filter_col2 = st.columns(2)
+        with filter_col1:
+            search_tone = st.selectbox(
+                "Tone:",
+                ["Any", "Professional", "Friendly", "Casual", "Persuasive", "Sympathetic"],
+                key="history_tone"
+            )
+            search_preset = st.selectbox("Template:", ["Any"] + list(EMAIL_PRESETS.keys()), key="history_preset")
+            search_language = st.selectbox(
+                "Language:", ["Any", "English", "Spanish", "French", "German", "Chinese"], key="history_language"
+            )
+        with filter_col2:
+            search_from = st.date_input("From:", value=None, key="history_from")
+            search_to = st.date_input("To:", value=None, key="history_to")
+    search_filters = {
+        'query': search_query.strip(),
+        'tone': None if search_tone == "Any" else search_tone,
+        'preset': None if search_preset == "Any" else search_preset,
+        'language': None if search_language == "Any" else search_language,
+        'date_from': search_from,
+        'date_to': search_to,
+    }
+
+    # Bulk Export Section
+    with st.expander("📦 Bulk Export"):
+        export_formats = st.multiselect("Formats:", ["pdf", "txt"], default=["pdf", "txt"], key="export_formats")
+        export_total = history_store.search_count(st.session_state.user_id, **search_filters)
+        st.caption(f"Exports the {export_total} emails matching the search and filters above, with a manifest.jsonl of their metadata.")
+        if st.button("📦 Export to ZIP", key="run_export", disabled=not (export_total and export_formats)):
+            export_path = os.path.join(
+                EXPORT_OUTPUT_DIR,
+                f"history_{st.session_state.user_id}_{time.strftime('%Y%m%d_%H%M%S')}.zip"
+            )
+            export_progress = st.progress(0.0, text="Starting export...")
+
+            def show_export_progress(summary):
+                export_progress.progress(
+                    summary['done'] / max(summary['total'], 1),
+                    text=f"{summary['done']}/{summary['total']} emails"
+                )
+
+            export_summary = export_history_zip(
+                export_path,
+                user_id=st.session_state.user_id,
+                formats=export_formats,
+                on_progress=show_export_progress,
+                **search_filters
+            )
+            export_progress.progress(1.0, text="Export complete")
+            if export_summary['error']:
+                st.warning(f"{export_summary['error']} PDFs failed to render; see manifest.jsonl for details.")
+            # Keep only this session's latest export, and drop ones abandoned by earlier sessions
+            previous_export = st.session_state.get('export_path')
+            if previous_export and previous_export != export_path and os.path.exists(previous_export):
+                os.remove(previous_export)
+            prune_exports(EXPORT_OUTPUT_DIR)
+            st.session_state.export_path = export_path
+
+        last_export = st.session_state.get('export_path')
+        if last_export and os.path.exists(last_export):
+            def read_last_export():
+                with open(last_export, 'rb') as f:
+                    return f.read()
+
+            st.download_button(
+                f"📥 Download {os.path.basename(last_export)}",
+                data=read_last_export,
+                file_name=os.path.basename(last_export),
+                mime="application/zip",
+                on_click="ignore",
+                key="download_export"
+            )
+
     # History Section
-    st.header("📜 Email History")
-    if not st.session_state.history:
-        st.info("No email history yet. Generate some emails to see them here!")
+    # Only the current page is queried, without the email bodies
+    if any(value for value in search_filters.values()):
+        st.header("🔎 Search Results")
+        results_total = history_store.search_count(st.session_state.user_id, **search_filters)
+        if not results_total:
+            st.info("No emails match your search.")
+        else:
+            st.caption(f"{results_total} matching emails")
+            offset = history_page("search_page", results_total)
+            for email in history_store.search(st.session_state.user_id, offset=offset, **search_filters):
+                if email.get('snippet'):
+                    st.caption(email['snippet'])
+                render_history_email(email, "search")
     else:
-        for idx, email in enumerate(reversed(st.session_state.history)):
-            with st.expander(
-                f"{email['timestamp']} - {email['metadata']['subject']}",
-                expanded=False
-            ):
-                col1, col2 = st.columns([4,1])
-                with col1:
-                    st.write(f"**Tone:** {email['metadata']['tone']}| **Writing Style:** {email['metadata']['writing_style']}| **Email Length:** {email['metadata']['email_length']}")
-                    if email['metadata'].get('preset'):
-                        st.write(f"**Template:** {email['metadata']['preset']}")
-                    st.code(email['content'], language="text")
-                with col2:
-                    # Favorite toggle
-                    is_favorite = email['favorite']
-                    fav_label = "❤️ Remove" if is_favorite else "♡ Add"
-                    if st.button(fav_label, key=f"hist_fav_{idx}"):
-                        original_idx = len(st.session_state.history) - 1 - idx
-                        st.session_state.history[original_idx]['favorite'] = not is_favorite
-                        st.rerun()
-                    
-                    # Load button
-                    if st.button("📝 Load", key=f"hist_load_{idx}"):
-                        st.session_state.generated_email = email['content']
-                        st.session_state.edit_mode = False
-                        st.session_state.current_tab = "📧 Email Generator"
-                        st.rerun()
-                    
-                    # Delete button
-                    if st.button("🗑️ Delete", key=f"hist_delete_{idx}"):
-                        original_idx = len(st.session_state.history) - 1 - idx
-                        st.session_state.history.pop(original_idx)
-                        st.rerun()
+        st.header("📜 Email History")
+        history_total = history_store.count(st.session_state.user_id)
+        if not history_total:
+            st.info("No email history yet. Generate some emails to see them here!")
+        else:
+            offset = history_page("history_page", history_total)
+            for email in history_store.list(st.session_state.user_id, offset=offset, include_content=False):
+                render_history_email(email, "hist")
     
     # Favorites Section
     st.header("❤️ Favorite Emails")
-    favorite_emails = [email for email in st.session_state.history if email['favorite']]
+    favorites_total = history_store.count(st.session_state.user_id, favorites_only=True)
     
-    if not favorite_emails:
+    if not favorites_total:
         st.info("No favorite emails yet. Add some by clicking the heart icon!")
     else:
-        for idx, email in enumerate(reversed(favorite_emails)):
-            with st.expander(
-                f"{email['timestamp']} - {email['metadata']['subject']}",
-                expanded=False
-            ):
-                col1, col2 = st.columns([4,1])
-                with col1:
-                    st.write(f"**Tone:** {email['metadata']['tone']}| **Writing Style:** {email['metadata']['writing_style']}| **Email Length:** {email['metadata']['email_length']}")
-                    if email['metadata'].get('preset'):
-                        st.write(f"**Template:** {email['metadata']['preset']}")
-                    st.code(email['content'], language="text")
-                with col2:
-                    if st.button("❤️ Remove", key=f"fav_remove_{idx}"):
-                        original_idx = len(st.session_state.history) - 1 - next(
-                            i for i, e in enumerate(reversed(st.session_state.history)) 
-                            if e['timestamp'] == email['timestamp']
-                        )
-                        st.session_state.history[original_idx]['favorite'] = False
-                        st.rerun()
-                    
-                    if st.button("📝 Load", key=f"fav_load_{idx}"):
-                        st.session_state.generated_email = email['content']
-                        st.session_state.edit_mode = False
-                        st.session_state.current_tab = "📧 Email Generator"
-                        st.rerun()
\ No newline at end of file
+        offset = history_page("favorites_page", favorites_total)
+        for email in history_store.list(
+            st.session_state.user_id, offset=offset, favorites_only=True, include_content=False
+        ):
+            render_history_email(email, "fav", show_delete=False)
+
+with tab3:
+    # --- Batch Mail-Merge Interface ---
+    st.header("📬 Batch Mail-Merge")
+    st.caption(
+        "Generate one email per row of a CSV/XLSX sheet. Columns such as recipient_name, "
+        "recipient_role and background_info override the shared settings below."
+    )
+
+    batch_sheet = st.file_uploader(
+        "Recipient sheet:",
+        type=['csv', 'xlsx'],
+        help="One row per recipient",
+        key="batch_sheet"
+    )
+
+    batch_col1, batch_col2 = st.columns(2)
+    with batch_col1:
+        batch_preset_name = st.selectbox(
+            "Template:",
+            ["Custom Email"] + list(EMAIL_PRESETS.keys()),
+            key="batch_preset"
+        )
+        batch_preset = EMAIL_PRESETS.get(batch_preset_name)
+        batch_user_name = st.text_input("Your Name:", key="batch_user_name")
+        batch_user_role = st.text_input("Your Role/Position:", key="batch_user_role")
+        batch_tone = st.selectbox(
+            "Tone:",
+            ["Professional", "Friendly", "Casual", "Persuasive", "Sympathetic"],
+            index=["Professional", "Friendly", "Casual", "Persuasive", "Sympathetic"].index(
+                batch_preset["tone"] if batch_preset else "Professional"
+            ),
+            key="batch_tone"
+        )
+    with batch_col2:
+        batch_language = st.selectbox(
+            "Language:", ["English", "Spanish", "French", "German", "Chinese"], key="batch_language"
+        )
+        batch_length = st.selectbox("Email Length:", ["Short", "Medium", "Detailed"], key="batch_length")
+        batch_style = st.selectbox(
+            "Writing Style:", ["Direct", "Descriptive", "Storytelling", "Technical"], key="batch_style"
+        )
+        batch_format = st.selectbox("Output Format:", ["jsonl", "csv"], key="batch_format")
+
+    batch_purpose = st.text_area(
+        "Purpose of the Emails:",
+        value=batch_preset["purpose"] if batch_preset else "",
+        max_chars=200,
+        key="batch_purpose"
+    )
+
+    with st.expander("🚦 Throughput Limits", expanded=False):
+        batch_concurrency = st.slider(
+            "Concurrent requests:", 1, BATCH_MAX_CONCURRENCY, BATCH_DEFAULT_CONCURRENCY, key="batch_concurrency"
+        )
+        batch_rpm = st.number_input("Requests per minute:", 1, 100_000, BATCH_DEFAULT_RPM, key="batch_rpm")
+        batch_tpm = st.number_input("Tokens per minute:", 1_000, 100_000_000, BATCH_DEFAULT_TPM, key="batch_tpm")
+        batch_resume = st.checkbox(
+            "Resume previous run",
+            value=True,
+            help="Skip rows that already succeeded in the existing output file",
+            key="batch_resume"
+        )
+
+    if batch_sheet is not None:
+        batch_rows = read_batch_rows(batch_sheet)
+        batch_output_path = os.path.join(
+            BATCH_OUTPUT_DIR,
+            f"{os.path.splitext(batch_sheet.name)[0]}.{batch_format}"
+        )
+        st.write(f"**Rows:** {len(batch_rows)} · **Output:** `{batch_output_path}`")
+
+        if st.button("🚀 Run Batch", key="run_batch"):
+            if not os.getenv("OPENAI_API_KEY"):
+                st.error("OPENAI_API_KEY not found in .env file")
+                st.stop()
+
+            batch_defaults = {
+                'tone': batch_tone,
+                'language': batch_language,
+                'user_name': batch_user_name,
+                'user_role': batch_user_role,
+                'recipient_name': "",
+                'recipient_role': "",
+                'email_purpose': batch_purpose,
+                'background_info': "",
+                'special_instructions': "",
+                'writing_style': batch_style,
+                'email_length': batch_length,
+            }
+            batch_jobs = [
+                build_batch_job(row, build_batch_params(row, batch_defaults), st.session_state.selected_model)
+                for row in batch_rows
+            ]
+
+            progress_bar = st.progress(0.0, text="Starting batch...")
+
+            def show_batch_progress(summary):
+                done = summary['skipped'] + summary['ok'] + summary['error']
+                progress_bar.progress(
+                    done / max(summary['total'], 1),
+                    text=f"{done}/{summary['total']} rows · {summary['error']} failed"
+                )
+
+            batch_summary = asyncio.run(run_batch(
+                batch_jobs,
+                batch_output_path,
+                st.session_state.selected_model,
+                concurrency=batch_concurrency,
+                requests_per_minute=batch_rpm,
+                tokens_per_minute=batch_tpm,
+                resume=batch_resume,
+                on_progress=show_batch_progress
+            ))
+            progress_bar.progress(1.0, text="Batch complete")
+            st.success(
+                f"Generated {batch_summary['ok']} emails, {batch_summary['error']} failed, "
+                f"{batch_summary['skipped']} already done."
+            )
+
+        if os.path.exists(batch_output_path):
+            with open(batch_output_path, 'rb') as f:
+                st.download_button(
+                    "📥 Download Results",
+                    data=f.read(),
+                    file_name=os.path.basename(batch_output_path),
+                    mime="text/csv" if batch_output_path.endswith('.csv') else "application/jsonl",
+                    key="download_batch"
+                )
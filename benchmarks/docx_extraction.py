@@ -0,0 +1,90 @@
+"""DOCX extraction benchmark: streaming XML parser vs the python-docx object model.
+
+Builds a synthetic proposal (paragraphs interleaved with tables) with
+python-docx, then times, over several runs:
+  - python_docx: Document() + paragraph text, the previous extractor,
+  - streaming_full: iter_text_from_docx read to the end,
+  - streaming_budget: iter_text_from_docx stopped by take_text at --limit characters.
+
+Usage:
+    python benchmarks/docx_extraction.py
+    python benchmarks/docx_extraction.py --sections 2000 --limit 3000 --repeat 5
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_generator.extraction import iter_text_from_docx, take_text  # noqa: E402
+
+def build_document(sections, rows):
+    """Return the bytes of a .docx with a heading, two paragraphs and a table per section."""
+    from docx import Document
+
+    doc = Document()
+    for number in range(sections):
+        doc.add_heading(f"Section {number}", level=2)
+        doc.add_paragraph(f"Scope item {number}: deliverables, milestones and acceptance criteria. " * 3)
+        doc.add_paragraph(f"Assumptions for item {number} are listed in the table below.")
+        table = doc.add_table(rows=rows, cols=3)
+        for r, row in enumerate(table.rows):
+            row.cells[0].text = f"Line {number}.{r}"
+            row.cells[1].text = f"{(number * rows + r) * 125} EUR"
+            row.cells[2].text = "Included in fixed price"
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+def python_docx_text(data):
+    """The python-docx extractor this benchmark replaces: paragraphs only, tables dropped."""
+    from docx import Document
+
+    doc = Document(io.BytesIO(data))
+    return '\n'.join(para.text for para in doc.paragraphs if para.text.strip())
+
+def time_runs(function, repeat):
+    """Return the median wall time of function() in seconds and its last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+def run_benchmark(sections, rows, limit, repeat):
+    data = build_document(sections, rows)
+    baseline_s, baseline = time_runs(lambda: python_docx_text(data), repeat)
+    full_s, (full, _) = time_runs(lambda: take_text(iter_text_from_docx(io.BytesIO(data))), repeat)
+    budget_s, (budgeted, _) = time_runs(lambda: take_text(iter_text_from_docx(io.BytesIO(data)), limit), repeat)
+    table_cell = "Included in fixed price"
+    return {
+        "document_bytes": len(data),
+        "python_docx_s": baseline_s,
+        "streaming_full_s": full_s,
+        "streaming_budget_s": budget_s,
+        "speedup_full": baseline_s / full_s,
+        "speedup_budget": baseline_s / budget_s,
+        "python_docx_chars": len(baseline),
+        "streaming_full_chars": len(full),
+        "python_docx_has_tables": table_cell in baseline,
+        "streaming_has_tables": table_cell in full,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=500, help="Heading/paragraph/table sections in the document")
+    parser.add_argument("--rows", type=int, default=8, help="Rows per table")
+    parser.add_argument("--limit", type=int, default=3000, help="Character budget for the early-stop run")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (median is reported)")
+    args = parser.parse_args(argv)
+    print(json.dumps(run_benchmark(args.sections, args.rows, args.limit, args.repeat), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
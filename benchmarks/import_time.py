@@ -0,0 +1,124 @@
+"""Import-time and rerun latency benchmark.
+
+Measures, each in a fresh interpreter:
+  - the cumulative import time of the email_generator package (via -X importtime)
+    and which heavy dependencies it pulls in eagerly,
+  - the first paint of app.py (cold script run) and the latency of a rerun,
+    using Streamlit's AppTest harness.
+
+Usage:
+    python benchmarks/import_time.py                      # print a JSON report
+    python benchmarks/import_time.py --save baseline.json
+    python benchmarks/import_time.py --baseline baseline.json --tolerance 0.25
+
+With --baseline, the script exits with status 1 when any metric is slower than
+the baseline by more than the tolerance, or when a heavy dependency is
+imported eagerly, so it can gate CI.
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported on the code paths that need them
+HEAVY_MODULES = ["PyPDF2", "docx", "pandas", "openai", "reportlab"]
+
+APP_TEST_SNIPPET = """
+import json, time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=60).run()
+first_paint = time.perf_counter() - start
+reruns = []
+for _ in range({reruns}):
+    start = time.perf_counter()
+    at.run()
+    reruns.append(time.perf_counter() - start)
+print(json.dumps({{"first_paint": first_paint, "reruns": reruns, "exception": bool(at.exception)}}))
+"""
+
+def run_python(args, code=None):
+    """Run a fresh interpreter in the repository root and return the completed process."""
+    command = [sys.executable] + args + (["-c", code] if code else [])
+    return subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+
+def measure_package_import():
+    """Return the cumulative import time of email_generator (seconds) and the heavy modules it loads."""
+    code = f"import sys, json, email_generator; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    result = run_python(["-X", "importtime"], code)
+    cumulative = None
+    for line in result.stderr.splitlines():
+        # Format: "import time: self [us] | cumulative | imported package"
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) == 3 and parts[2] == "email_generator":
+            cumulative = int(parts[1]) / 1e6
+    return cumulative, json.loads(result.stdout.strip().splitlines()[-1])
+
+def measure_app(reruns):
+    """Return first-paint and median rerun latency of app.py in seconds."""
+    result = run_python([], APP_TEST_SNIPPET.format(reruns=reruns))
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    if data["exception"]:
+        raise RuntimeError("app.py raised an exception under AppTest")
+    return data["first_paint"], statistics.median(data["reruns"])
+
+def run_benchmark(repeat, reruns):
+    """Collect the median of each metric over `repeat` cold runs."""
+    imports, first_paints, rerun_times = [], [], []
+    eager = set()
+    for _ in range(repeat):
+        cumulative, loaded = measure_package_import()
+        imports.append(cumulative)
+        eager.update(loaded)
+        first_paint, rerun = measure_app(reruns)
+        first_paints.append(first_paint)
+        rerun_times.append(rerun)
+    return {
+        "package_import_s": statistics.median(imports),
+        "first_paint_s": statistics.median(first_paints),
+        "rerun_s": statistics.median(rerun_times),
+        "eager_heavy_modules": sorted(eager),
+    }
+
+def compare(report, baseline, tolerance):
+    """Return a list of regression messages against a baseline report."""
+    problems = []
+    for metric in ["package_import_s", "first_paint_s", "rerun_s"]:
+        if metric in baseline and report[metric] > baseline[metric] * (1 + tolerance):
+            problems.append(
+                f"{metric}: {report[metric]:.3f}s vs baseline {baseline[metric]:.3f}s (+{tolerance:.0%} allowed)"
+            )
+    if report["eager_heavy_modules"]:
+        problems.append(f"heavy modules imported eagerly: {', '.join(report['eager_heavy_modules'])}")
+    return problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Cold runs per metric (median is reported)")
+    parser.add_argument("--reruns", type=int, default=5, help="Reruns timed per app run")
+    parser.add_argument("--save", help="Write the report to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a previously saved report")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.repeat, args.reruns)
+    print(json.dumps(report, indent=2))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""Local OpenAI-compatible chat completions server for benchmarks.
+
+Answers POST /v1/chat/completions without a network connection or API key,
+either as one JSON response or as a server-sent event stream ending with a
+usage chunk. Latency, streaming speed and rate-limit errors are
+configurable:
+  - latency: seconds before the response (or the first streamed token),
+  - token_delay: seconds between streamed tokens,
+  - error_rate: share of requests answered with 429 and a Retry-After-Ms header.
+
+Usage:
+    python benchmarks/openai_stub.py --port 8001 --latency 0.2 --error-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub streamlit run app.py
+
+From Python, start_stub() runs the server on a background thread.
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = "thank you for the update on the proposal we reviewed the figures and agree on next steps".split()
+
+class StubConfig:
+    """Behaviour of the stub, shared by all request threads."""
+
+    def __init__(self, latency=0.0, token_delay=0.0, error_rate=0.0, retry_after_ms=100, seed=None):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.retry_after_ms = retry_after_ms
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+
+    def next_request(self):
+        """Count a request and return (number, whether to answer it with 429)."""
+        with self.lock:
+            self.requests += 1
+            limited = self.random.random() < self.error_rate
+            if limited:
+                self.rate_limited += 1
+            return self.requests, limited
+
+    def stats(self):
+        with self.lock:
+            return {"requests": self.requests, "rate_limited": self.rate_limited}
+
+def completion_text(number, max_tokens, choice=0):
+    """Return a deterministic email of at most max_tokens words; number makes each reply unique.
+
+    Further choices of one request (n > 1) get shorter bodies.
+    """
+    body_words = max(1, (min(max_tokens, 400) - 12) // (choice + 1))
+    body = " ".join(WORDS[i % len(WORDS)] for i in range(body_words))
+    return f"Subject: Proposal follow-up #{number}\n\nDear Ada,\n\n{body}.\n\nBest regards,\nGrace"
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        config = self.server.config
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        number, limited = config.next_request()
+        if limited:
+            self.send_json(
+                429,
+                {"error": {"message": "Rate limit reached (stub)", "type": "rate_limit_exceeded"}},
+                {"Retry-After-Ms": str(config.retry_after_ms)}
+            )
+            return
+
+        time.sleep(config.latency)
+        model = body.get("model", "stub")
+        prompt = "".join(message.get("content", "") for message in body.get("messages", []))
+        texts = [completion_text(number, body.get("max_tokens") or 400, choice) for choice in range(body.get("n") or 1)]
+        completion_tokens = sum(len(text.split(" ")) for text in texts)
+        usage = {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": completion_tokens,
+            "total_tokens": len(prompt) // 4 + completion_tokens,
+        }
+        base = {"id": f"chatcmpl-stub-{number}", "created": int(time.time()), "model": model}
+
+        if not body.get("stream"):
+            self.send_json(200, dict(
+                base,
+                object="chat.completion",
+                choices=[
+                    {"index": index, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+                    for index, text in enumerate(texts)
+                ],
+                usage=usage
+            ))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_event(payload):
+            data = f"data: {payload}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        chunk = dict(base, object="chat.completion.chunk")
+        for index, text in enumerate(texts):
+            for i, token in enumerate(text.split(" ")):
+                if (index or i) and config.token_delay:
+                    time.sleep(config.token_delay)
+                delta = {"content": token if i == 0 else " " + token}
+                send_event(json.dumps(dict(chunk, choices=[{"index": index, "delta": delta, "finish_reason": None}])))
+            send_event(json.dumps(dict(chunk, choices=[{"index": index, "delta": {}, "finish_reason": "stop"}])))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            send_event(json.dumps(dict(chunk, choices=[], usage=usage)))
+        send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+def start_stub(config=None, host="127.0.0.1", port=0):
+    """Serve the stub on a daemon thread; returns (server, base_url). Stop it with server.shutdown()."""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.config = config or StubConfig()
+    threading.Thread(target=server.serve_forever, name="openai-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the response or first token")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--retry-after-ms", type=int, default=100, help="Retry-After-Ms sent with 429 responses")
+    args = parser.parse_args(argv)
+
+    config = StubConfig(args.latency, args.token_delay, args.error_rate, args.retry_after_ms)
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    server.config = config
+    print(f"OpenAI stub listening on http://{args.host}:{args.port}/v1", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(config.stats()), file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+"""End-to-end pipeline benchmark against a local OpenAI-compatible stub.
+
+Generates a synthetic corpus (PDF, DOCX, XLSX and TXT of configurable size),
+starts benchmarks/openai_stub.py on a free port and drives the full pipeline
+for every request: attachment extraction, build_email_request (which
+build_email_prompt wraps), generation through the shared client, rate limiter
+and retries, extract_subject and generate_pdf. No API key or network access
+is needed.
+
+The report holds throughput, end-to-end and time-to-first-token
+percentiles, the per-stage percentiles recorded by email_generator.metrics,
+and the stub's request and 429 counts. It is printed as sorted JSON, so two
+saved reports diff cleanly.
+
+Usage:
+    python benchmarks/pipeline.py                                   # print a JSON report
+    python benchmarks/pipeline.py --requests 200 --concurrency 8 --latency 0.3 --error-rate 0.05
+    python benchmarks/pipeline.py --pdf-pages 100 --xlsx-rows 50000 --save pipeline.json
+    python benchmarks/pipeline.py --baseline pipeline.json --tolerance 0.25
+
+With --cache cold (the default) every request gets attachments with unique
+bytes, so the extraction cache never hits; --cache warm reuses the same
+files. With --baseline, the script exits with status 1 when throughput drops
+or a p95 latency grows by more than the tolerance.
+"""
+
+import io
+import os
+import sys
+import json
+import math
+import time
+import random
+import zipfile
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.openai_stub import StubConfig, start_stub  # noqa: E402
+
+VOCABULARY = (
+    "proposal budget timeline migration onboarding security audit revenue pipeline renewal pricing "
+    "contract milestone deliverable stakeholder integration support training rollout forecast risk "
+    "scope invoice quarter region customer partner review approval schedule capacity"
+).split()
+
+DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="word/document.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+
+BASE_PARAMS = {
+    'tone': "Professional",
+    'language': "English",
+    'user_name': "Grace Hopper",
+    'user_role': "Account Manager",
+    'recipient_role': "Head of Operations",
+    'email_purpose': "Follow up on the renewal proposal and the migration timeline",
+    'background_info': "The customer asked about pricing, security review and rollout capacity",
+    'special_instructions': "Mention the next milestone",
+    'writing_style': "Direct",
+    'email_length': "Medium",
+}
+
+def sentence(rng, words=14):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words)).capitalize() + "."
+
+def build_pdf(pages, rng):
+    """Return a PDF with a repeated header and footer and about 40 lines of text per page."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    for page in range(pages):
+        pdf.drawString(50, 760, "Northwind Traders - Renewal Proposal - Confidential")
+        for line in range(40):
+            pdf.drawString(50, 730 - line * 16, sentence(rng, 12))
+        pdf.drawString(50, 40, f"Page {page + 1} of {pages}")
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+def build_docx(sections, rng):
+    """Return a minimal .docx with a heading, two paragraphs and a four-row table per section."""
+    def paragraph(text):
+        return f"<w:p><w:r><w:t>{escape(text)}</w:t></w:r></w:p>"
+
+    body = []
+    for number in range(sections):
+        body.append(paragraph(f"Section {number + 1}: {rng.choice(VOCABULARY).title()}"))
+        body.append(paragraph(" ".join(sentence(rng) for _ in range(4))))
+        body.append(paragraph(sentence(rng)))
+        rows = "".join(
+            "<w:tr>" + "".join(
+                f"<w:tc>{paragraph(value)}</w:tc>"
+                for value in (f"Item {number}.{row}", f"{rng.randint(1, 500) * 100} EUR", rng.choice(VOCABULARY))
+            ) + "</w:tr>"
+            for row in range(4)
+        )
+        body.append(f"<w:tbl>{rows}</w:tbl>")
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f'<w:body>{"".join(body)}</w:body></w:document>'
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", DOCX_CONTENT_TYPES)
+        archive.writestr("_rels/.rels", DOCX_RELS)
+        archive.writestr("word/document.xml", document)
+    return buffer.getvalue()
+
+def build_xlsx(rows, rng):
+    """Return a workbook with an orders sheet of the given size and a small contacts sheet."""
+    import datetime
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    orders = workbook.create_sheet("Orders")
+    orders.append(["order_id", "customer", "region", "amount", "ordered_on", "status"])
+    start = datetime.date(2024, 1, 1)
+    for row in range(rows):
+        orders.append([
+            row + 1,
+            f"Customer {rng.randint(1, 200)}",
+            rng.choice(["EMEA", "AMER", "APAC"]),
+            round(rng.uniform(100, 20000), 2),
+            start + datetime.timedelta(days=row % 365),
+            rng.choice(["open", "shipped", "invoiced"]),
+        ])
+    contacts = workbook.create_sheet("Contacts")
+    contacts.append(["name", "role"])
+    for name, role in [("Ada", "CTO"), ("Linus", "Procurement"), ("Barbara", "Security")]:
+        contacts.append([name, role])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+def build_txt(kilobytes, rng):
+    lines = []
+    size = 0
+    while size < kilobytes * 1024:
+        line = " ".join(sentence(rng) for _ in range(3))
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines).encode("utf-8")
+
+def build_corpus(args):
+    """Return {file name: bytes} for the requested formats."""
+    rng = random.Random(args.seed)
+    builders = {
+        "pdf": ("proposal.pdf", lambda: build_pdf(args.pdf_pages, rng)),
+        "docx": ("proposal.docx", lambda: build_docx(args.docx_sections, rng)),
+        "xlsx": ("orders.xlsx", lambda: build_xlsx(args.xlsx_rows, rng)),
+        "txt": ("notes.txt", lambda: build_txt(args.txt_kb, rng)),
+    }
+    return {name: build() for fmt, (name, build) in builders.items() if fmt in args.formats}
+
+def unique_copy(name, data, number):
+    """Return the bytes of a file changed so its cache key is unique but its text is not."""
+    marker = f"benchmark request {number}".encode()
+    if name.endswith((".docx", ".xlsx")):
+        buffer = io.BytesIO(data)
+        with zipfile.ZipFile(buffer, "a") as archive:
+            archive.comment = marker
+        return buffer.getvalue()
+    if name.endswith(".pdf"):
+        return data + b"\n%" + marker + b"\n"
+    return data + b"\n" + marker
+
+def percentiles(values):
+    """Return the mean, nearest-rank p50/p95/p99 and max of a list of seconds."""
+    if not values:
+        return {}
+    values = sorted(values)
+    report = {"mean": statistics.fmean(values), "max": values[-1]}
+    for q in (50, 95, 99):
+        report[f"p{q}"] = values[max(0, math.ceil(len(values) * q / 100) - 1)]
+    return report
+
+def run_benchmark(args):
+    """Start the stub, run the requests and return the report dict."""
+    config = StubConfig(args.latency, args.token_delay, args.error_rate, args.retry_after_ms, seed=args.seed)
+    server, base_url = start_stub(config)
+    os.environ.update({
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_REQUESTS_PER_MINUTE": str(args.rpm),
+        "OPENAI_TOKENS_PER_MINUTE": str(args.tpm),
+    })
+    # Measure the pipeline itself, not a cache left behind by earlier runs
+    os.environ.pop("EXTRACTION_CACHE_DIR", None)
+
+    # Imported after the environment is set: config reads it at import time
+    from email_generator.extraction import MemoryAttachment
+    from email_generator.prompt import build_email_request
+    from email_generator.generation import initialize_openai_client, generate_email_cached
+    from email_generator.history import extract_subject
+    from email_generator.export import generate_pdf
+    from email_generator.metrics import get_metrics
+
+    corpus = build_corpus(args)
+    client = initialize_openai_client()
+
+    def run_request(number):
+        files = [
+            MemoryAttachment(name, unique_copy(name, data, number) if args.cache == "cold" else data)
+            for name, data in corpus.items()
+        ]
+        params = dict(BASE_PARAMS, recipient_name=f"Recipient {number}", uploaded_files=files)
+        start = time.perf_counter()
+        request = build_email_request(params, args.model)
+        text, stats = generate_email_cached(
+            client,
+            request['prompt'],
+            args.model,
+            stream=args.stream,
+            bypass_cache=True,
+            max_tokens=request['max_tokens']
+        )
+        generate_pdf(text, title=extract_subject(text))
+        return time.perf_counter() - start, stats['time_to_first_token']
+
+    latencies, first_tokens, errors = [], [], []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for future in [executor.submit(run_request, number) for number in range(args.requests)]:
+            try:
+                latency, first_token = future.result()
+                latencies.append(latency)
+                first_tokens.append(first_token)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+    wall = time.perf_counter() - start
+    server.shutdown()
+
+    metrics = get_metrics()
+    tokens = {}
+    for (name, _labels), value in metrics.counters().items():
+        if name.endswith("_tokens"):
+            tokens[name] = tokens.get(name, 0) + value
+    return {
+        "config": {
+            key: getattr(args, key) for key in (
+                "requests", "concurrency", "formats", "pdf_pages", "docx_sections", "xlsx_rows", "txt_kb",
+                "cache", "stream", "latency", "token_delay", "error_rate", "model",
+            )
+        },
+        "corpus_bytes": {name: len(data) for name, data in corpus.items()},
+        "wall_s": wall,
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "end_to_end_s": percentiles(latencies),
+        "time_to_first_token_s": percentiles(first_tokens),
+        "stages": metrics.snapshot(),
+        "tokens": tokens,
+        "stub": config.stats(),
+    }
+
+def compare(report, baseline, tolerance):
+    """Return a list of regression messages against a baseline report."""
+    problems = []
+    if report["throughput_rps"] < baseline.get("throughput_rps", 0) * (1 - tolerance):
+        problems.append(
+            f"throughput_rps: {report['throughput_rps']:.2f} vs baseline {baseline['throughput_rps']:.2f}"
+        )
+    pairs = [("end_to_end_s", report["end_to_end_s"], baseline.get("end_to_end_s", {}))]
+    pairs += [
+        (f"stages.{stage}", entry, baseline.get("stages", {}).get(stage, {}))
+        for stage, entry in report["stages"].items()
+    ]
+    for name, current, previous in pairs:
+        if "p95" in previous and current.get("p95", 0) > previous["p95"] * (1 + tolerance):
+            problems.append(
+                f"{name} p95: {current['p95']:.4f}s vs baseline {previous['p95']:.4f}s (+{tolerance:.0%} allowed)"
+            )
+    if report["errors"] > baseline.get("errors", 0):
+        problems.append(f"errors: {report['errors']} vs baseline {baseline.get('errors', 0)}")
+    return problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    load = parser.add_argument_group("load")
+    load.add_argument("--requests", type=int, default=20, help="Emails generated end to end")
+    load.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once")
+    load.add_argument("--cache", choices=["cold", "warm"], default="cold", help="Unique or repeated attachment bytes")
+    load.add_argument("--no-stream", dest="stream", action="store_false", help="Request whole responses")
+    load.add_argument("--model", default="gpt-4o-mini", help="Model name sent to the stub")
+    load.add_argument("--rpm", type=int, default=1_000_000, help="Client-side request quota")
+    load.add_argument("--tpm", type=int, default=1_000_000_000, help="Client-side token quota")
+    corpus = parser.add_argument_group("corpus")
+    corpus.add_argument("--formats", type=lambda value: value.split(","), default=["pdf", "docx", "xlsx", "txt"],
+                        help="Comma-separated attachment formats (default: pdf,docx,xlsx,txt)")
+    corpus.add_argument("--pdf-pages", type=int, default=20)
+    corpus.add_argument("--docx-sections", type=int, default=200)
+    corpus.add_argument("--xlsx-rows", type=int, default=5000)
+    corpus.add_argument("--txt-kb", type=int, default=256)
+    corpus.add_argument("--seed", type=int, default=7)
+    stub = parser.add_argument_group("stub server")
+    stub.add_argument("--latency", type=float, default=0.2, help="Seconds before the response or first token")
+    stub.add_argument("--token-delay", type=float, default=0.002, help="Seconds between streamed tokens")
+    stub.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    stub.add_argument("--retry-after-ms", type=int, default=100, help="Retry-After-Ms sent with 429 responses")
+    parser.add_argument("--save", help="Write the report to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a previously saved report")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args)
+    print(json.dumps(report, indent=2, sort_keys=True))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
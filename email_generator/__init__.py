@@ -0,0 +1,85 @@
+"""Headless core of the AI Email Generator.
+
+Everything the Streamlit app does besides rendering lives here, so prompt
+building, attachment extraction, generation, PDF export and history records
+can be used from scripts, workers and the command line.
+"""
+
+from .config import EMAIL_PRESETS, DEFAULT_MODEL, MODEL_OPTIONS
+from .extraction import (
+    LocalAttachment,
+    MemoryAttachment,
+    validate_file,
+    extract_text_from_file,
+    extract_attachments,
+    get_extraction_cache,
+)
+from .prompt import build_email_prompt, build_email_request
+from .tokens import count_tokens, context_window
+from .compaction import compact_texts
+from .generation import (
+    initialize_openai_client,
+    generate_email,
+    generate_email_cached,
+    generate_variants,
+    generate_variants_cached,
+    get_completion_cache,
+)
+from .variants import score_variant, rank_variants
+from .templates import CompiledTemplate, compile_template, get_preset_template, render_preset
+from .history import extract_subject, build_email_record, HistoryStore, get_history_store
+from .export import (
+    render_pdf,
+    generate_pdf,
+    get_pdf_cache,
+    export_history_zip,
+    prune_exports,
+)
+from .pipeline import generate_record
+from .batch import read_batch_rows, build_batch_params, build_batch_job, run_batch
+from .jobs import JobQueue, get_job_queue
+
+__all__ = [
+    "EMAIL_PRESETS",
+    "DEFAULT_MODEL",
+    "MODEL_OPTIONS",
+    "LocalAttachment",
+    "MemoryAttachment",
+    "validate_file",
+    "extract_text_from_file",
+    "extract_attachments",
+    "get_extraction_cache",
+    "build_email_prompt",
+    "build_email_request",
+    "count_tokens",
+    "context_window",
+    "compact_texts",
+    "initialize_openai_client",
+    "generate_email",
+    "generate_email_cached",
+    "generate_variants",
+    "generate_variants_cached",
+    "score_variant",
+    "rank_variants",
+    "CompiledTemplate",
+    "compile_template",
+    "get_preset_template",
+    "render_preset",
+    "get_completion_cache",
+    "extract_subject",
+    "build_email_record",
+    "HistoryStore",
+    "get_history_store",
+    "render_pdf",
+    "generate_pdf",
+    "get_pdf_cache",
+    "export_history_zip",
+    "prune_exports",
+    "generate_record",
+    "read_batch_rows",
+    "build_batch_params",
+    "build_batch_job",
+    "run_batch",
+    "JobQueue",
+    "get_job_queue",
+]
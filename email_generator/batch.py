@@ -0,0 +1,204 @@
+"""Batch mail-merge: one generated email per row of a recipient sheet."""
+
+import os
+import sys
+import csv
+import json
+import asyncio
+from datetime import datetime
+
+from .config import (
+    GENERATION_TEMPERATURE,
+    GENERATION_MAX_TOKENS,
+    BATCH_DEFAULT_CONCURRENCY,
+    BATCH_DEFAULT_RPM,
+    BATCH_DEFAULT_TPM,
+)
+from .history import extract_subject
+from .prompt import build_email_request
+from .ratelimit import AsyncRateLimiter, async_call_with_retries, estimate_request_tokens
+from .metrics import timed, record_usage
+
+BATCH_COLUMN_ALIASES = {
+    "name": "recipient_name",
+    "recipient": "recipient_name",
+    "role": "recipient_role",
+    "title": "recipient_role",
+    "background": "background_info",
+    "purpose": "email_purpose",
+    "instructions": "special_instructions",
+    "id": "row_id",
+}
+
+BATCH_OUTPUT_FIELDS = ["row_id", "status", "recipient_name", "subject", "email", "error", "generated_at"]
+
+def read_batch_rows(file):
+    """Read a CSV/XLSX recipient sheet into a list of row dicts with normalized column names.
+
+    Rows without a row_id column are numbered from 1 in sheet order, which
+    keeps the ids stable when an interrupted batch is resumed.
+    """
+    import pandas as pd
+
+    if file.name.lower().endswith('.csv'):
+        df = pd.read_csv(file, dtype=str, keep_default_na=False)
+    else:
+        df = pd.read_excel(file, dtype=str).fillna("")
+
+    columns = []
+    for column in df.columns:
+        normalized = str(column).strip().lower().replace(' ', '_').replace("'", "")
+        columns.append(BATCH_COLUMN_ALIASES.get(normalized, normalized))
+    df.columns = columns
+
+    rows = []
+    for number, record in enumerate(df.to_dict(orient='records'), start=1):
+        row = {key: str(value).strip() for key, value in record.items()}
+        row['row_id'] = row.get('row_id') or str(number)
+        rows.append(row)
+    return rows
+
+def build_batch_params(row, defaults):
+    """Merge one sheet row over the shared batch settings into build_email_prompt params."""
+    params = dict(defaults)
+    for key in ['user_name', 'user_role', 'recipient_name', 'recipient_role', 'email_purpose',
+                'background_info', 'special_instructions', 'tone', 'language',
+                'writing_style', 'email_length']:
+        if row.get(key):
+            params[key] = row[key]
+    params['uploaded_files'] = []
+    return params
+
+def build_batch_job(row, params, model):
+    """Return the (row, prompt, max_tokens) job for one email within the model's token budget."""
+    request = build_email_request(params, model)
+    return row, request['prompt'], request['max_tokens']
+
+def load_completed_row_ids(output_path):
+    """Return the row ids already generated successfully in an existing batch output file."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, encoding='utf-8', newline='') as f:
+        if output_path.endswith('.csv'):
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for record in records:
+            if record.get('status') == 'ok':
+                completed.add(str(record['row_id']))
+    return completed
+
+class BatchWriter:
+    """Append batch results to a JSONL or CSV file, flushing after every row.
+
+    An output_path of "-" writes JSONL to stdout.
+    """
+
+    def __init__(self, output_path, append=True):
+        self.output_path = output_path
+        self.is_csv = output_path.endswith('.csv')
+        if output_path == '-':
+            self._file = sys.stdout
+            return
+        exists = append and os.path.exists(output_path) and os.path.getsize(output_path) > 0
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        self._file = open(output_path, 'a' if append else 'w', encoding='utf-8', newline='')
+        if self.is_csv:
+            self._writer = csv.DictWriter(self._file, fieldnames=BATCH_OUTPUT_FIELDS)
+            if not exists:
+                self._writer.writeheader()
+
+    def write(self, record):
+        if self.is_csv:
+            self._writer.writerow({field: record.get(field, "") for field in BATCH_OUTPUT_FIELDS})
+        else:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+def create_async_client():
+    """Return an AsyncOpenAI client for run_batch; retries go through async_call_with_retries."""
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+
+async def run_batch(jobs, output_path, model, concurrency=BATCH_DEFAULT_CONCURRENCY,
+                    requests_per_minute=BATCH_DEFAULT_RPM, tokens_per_minute=BATCH_DEFAULT_TPM,
+                    resume=True, on_progress=None, client=None, on_result=None, limiter=None):
+    """Generate one email per job and stream the results to output_path.
+
+    Jobs are (row, prompt) or (row, prompt, max_tokens) tuples; max_tokens
+    defaults to GENERATION_MAX_TOKENS.
+
+    At most `concurrency` requests are in flight at once, subject to the rate
+    limiter, and transient API errors are retried with backoff. Each result
+    is written as soon as it arrives. With resume=True, rows already marked
+    "ok" in an existing output file are skipped, so an interrupted batch
+    picks up where it stopped. With output_path None
+    nothing is written and results only go to on_result, which is called
+    with each record as it arrives. A long-lived caller passes its own client
+    and AsyncRateLimiter to share connections and quota across batches;
+    otherwise the batch gets its own, with the given per-minute quotas.
+    Returns a summary dict.
+    """
+    completed = load_completed_row_ids(output_path) if resume and output_path else set()
+    pending = [
+        (row, prompt, rest[0] if rest else GENERATION_MAX_TOKENS)
+        for row, prompt, *rest in jobs if row['row_id'] not in completed
+    ]
+    summary = {"total": len(jobs), "skipped": len(jobs) - len(pending), "ok": 0, "error": 0}
+
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = limiter or AsyncRateLimiter(requests_per_minute, tokens_per_minute)
+    writer = BatchWriter(output_path, append=resume) if output_path else None
+
+    async def generate_row(row, prompt, max_tokens):
+        async with semaphore:
+            record = {"row_id": row['row_id'], "recipient_name": row.get('recipient_name', "")}
+            try:
+                with timed("completion", model=model, batch=True) as details:
+                    response = await async_call_with_retries(
+                        lambda: client.chat.completions.create(
+                            model=model,
+                            messages=[{"role": "user", "content": prompt}],
+                            temperature=GENERATION_TEMPERATURE,
+                            max_tokens=max_tokens
+                        ),
+                        estimate_request_tokens(prompt, max_tokens),
+                        limiter
+                    )
+                    record_usage(details, getattr(response, "usage", None), model)
+                email = response.choices[0].message.content.strip()
+                record.update(status="ok", subject=extract_subject(email), email=email, error="")
+            except Exception as e:
+                record.update(status="error", subject="", email="", error=str(e))
+            record["generated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M")
+            return record
+
+    owns_client = client is None
+    if owns_client:
+        client = create_async_client()
+    tasks = []
+    try:
+        tasks = [asyncio.create_task(generate_row(*job)) for job in pending]
+        for finished in asyncio.as_completed(tasks):
+            record = await finished
+            if writer:
+                writer.write(record)
+            if on_result:
+                on_result(record)
+            summary[record['status']] += 1
+            if on_progress:
+                on_progress(summary)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if writer:
+            writer.close()
+        if owns_client:
+            # Close the connection pool while this event loop is still running
+            await client.close()
+    return summary
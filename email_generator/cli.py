@@ -0,0 +1,366 @@
+"""Command-line entry point for generating emails without the Streamlit UI.
+
+Examples:
+    python -m email_generator generate --recipient-name "Ada" --purpose "Intro call"
+    python -m email_generator generate --params request.json --output email.txt --pdf email.pdf
+    python -m email_generator generate --preset "Follow-Up Email" --template --slot "topic=the Q3 roadmap"
+    python -m email_generator generate --params requests.jsonl --output results.jsonl
+    python -m email_generator batch recipients.csv --preset "Sales Pitch" --output results.csv
+    python -m email_generator export history.zip --from 2024-06-01 --to 2024-06-30
+    python -m email_generator serve --port 8000
+"""
+
+import os
+import sys
+import json
+import asyncio
+import argparse
+from datetime import date
+
+from .config import (
+    DEFAULT_MODEL,
+    EMAIL_PRESETS,
+    BATCH_OUTPUT_DIR,
+    BATCH_DEFAULT_CONCURRENCY,
+    BATCH_DEFAULT_RPM,
+    BATCH_DEFAULT_TPM,
+    HISTORY_USER,
+    EXPORT_WORKERS,
+    MAX_VARIANTS,
+    SERVICE_HOST,
+    SERVICE_PORT,
+    SERVICE_MAX_CONCURRENCY,
+    SERVICE_MAX_WAITING,
+)
+from .extraction import LocalAttachment
+from .history import build_email_record, get_history_store
+from .pipeline import generate_record
+from .export import generate_pdf, export_history_zip
+from .templates import render_preset, parse_slot_values
+from .batch import read_batch_rows, build_batch_params, build_batch_job, run_batch
+from .metrics import get_metrics, collect_stages
+
+# Flag name -> build_email_request parameter
+PARAM_FLAGS = {
+    "tone": "tone",
+    "language": "language",
+    "user_name": "user_name",
+    "user_role": "user_role",
+    "recipient_name": "recipient_name",
+    "recipient_role": "recipient_role",
+    "purpose": "email_purpose",
+    "background": "background_info",
+    "instructions": "special_instructions",
+    "style": "writing_style",
+    "length": "email_length",
+}
+
+DEFAULT_PARAMS = {
+    'tone': "Professional",
+    'language': "English",
+    'user_name': "",
+    'user_role': "",
+    'recipient_name': "",
+    'recipient_role': "",
+    'email_purpose': "",
+    'background_info': "",
+    'special_instructions': "",
+    'writing_style': "Direct",
+    'email_length': "Medium",
+}
+
+def add_param_arguments(parser):
+    """Add the email parameter flags shared by every subcommand."""
+    group = parser.add_argument_group("email parameters")
+    group.add_argument("--preset", choices=list(EMAIL_PRESETS.keys()), help="Template supplying tone and purpose")
+    group.add_argument("--tone", help="Professional, Friendly, Casual, Persuasive or Sympathetic")
+    group.add_argument("--language", help="Output language")
+    group.add_argument("--user-name", help="Your full name")
+    group.add_argument("--user-role", help="Your job title or position")
+    group.add_argument("--recipient-name", help="Who will receive the email")
+    group.add_argument("--recipient-role", help="Their job title or position")
+    group.add_argument("--purpose", help="What the email is about")
+    group.add_argument("--background", help="Relevant context")
+    group.add_argument("--instructions", help="Special instructions")
+    group.add_argument("--style", help="Direct, Descriptive, Storytelling or Technical")
+    group.add_argument("--length", help="Short, Medium or Detailed")
+    group.add_argument("--model", default=DEFAULT_MODEL, help=f"Model to use (default: {DEFAULT_MODEL})")
+
+def params_from_args(args):
+    """Build the shared parameter defaults from a preset and command-line flags."""
+    params = dict(DEFAULT_PARAMS)
+    if args.preset:
+        params['tone'] = EMAIL_PRESETS[args.preset]['tone']
+        params['email_purpose'] = EMAIL_PRESETS[args.preset]['purpose']
+    for flag, key in PARAM_FLAGS.items():
+        value = getattr(args, flag)
+        if value is not None:
+            params[key] = value
+    return params
+
+def params_from_request(request, defaults):
+    """Merge one JSON request over the defaults, resolving its preset and attachment paths."""
+    params = dict(defaults)
+    preset = EMAIL_PRESETS.get(request.get('preset'))
+    if preset:
+        params['tone'] = preset['tone']
+        params['email_purpose'] = preset['purpose']
+    for key in DEFAULT_PARAMS:
+        if request.get(key) is not None:
+            params[key] = request[key]
+    params['uploaded_files'] = [LocalAttachment(path) for path in request.get('attachments', [])]
+    return params
+
+def read_requests(path):
+    """Read parameter dicts from a JSON file (object or list) or a JSONL file."""
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            return [json.loads(line) for line in f if line.strip()]
+        data = json.load(f)
+    return data if isinstance(data, list) else [data]
+
+def write_output(text, output):
+    """Write text to a file, or to stdout when output is None or "-"."""
+    if output in (None, '-'):
+        sys.stdout.write(text + '\n')
+    else:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+def run_many(requests, defaults, args):
+    """Generate several emails concurrently, streaming JSONL records to the output."""
+    jobs = []
+    for number, request in enumerate(requests, start=1):
+        params = params_from_request(request, defaults)
+        row = {'row_id': str(request.get('row_id', number)), 'recipient_name': params['recipient_name']}
+        jobs.append(build_batch_job(row, params, args.model))
+    summary = asyncio.run(run_batch(
+        jobs,
+        args.output or '-',
+        args.model,
+        concurrency=args.concurrency,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        resume=not args.no_resume
+    ))
+    print(json.dumps(summary), file=sys.stderr)
+    return 0 if summary['error'] == 0 else 1
+
+def cmd_generate(args):
+    """Generate one email from flags/JSON, or many from a JSON list or JSONL file."""
+    defaults = params_from_args(args)
+    requests = read_requests(args.params) if args.params else [{}]
+    for request in requests:
+        request.setdefault('attachments', [])
+    if args.attach:
+        for request in requests:
+            request['attachments'] = list(request['attachments']) + args.attach
+
+    if len(requests) > 1:
+        single_only = [flag for flag, used in (
+            ("--variants", args.variants > 1),
+            ("--template", args.template),
+            ("--slot", args.slot),
+            ("--local-only", args.local_only),
+            ("--pdf", args.pdf),
+            ("--json", args.json),
+            ("--save-history", args.save_history),
+        ) if used]
+        if single_only:
+            args.parser.error(f"{', '.join(single_only)}: only for a single email, "
+                              f"but --params holds {len(requests)} requests")
+        return run_many(requests, defaults, args)
+
+    params = params_from_request(requests[0], defaults)
+    preset_name = requests[0].get('preset') or args.preset
+
+    def print_token(text):
+        sys.stdout.write(text[print_token.written:])
+        sys.stdout.flush()
+        print_token.written = len(text)
+    print_token.written = 0
+
+    stream = args.stream and args.output in (None, '-') and not args.json and args.variants == 1
+    user_id = args.user if args.save_history else None
+    draft = None
+    with collect_stages() as stages:
+        if args.template:
+            if preset_name not in EMAIL_PRESETS:
+                raise ValueError("--template needs a --preset (or a preset in the parameter file)")
+            draft = render_preset(preset_name, params, parse_slot_values('\n'.join(args.slot or [])))
+
+    if draft and (args.local_only or not draft['unfilled']):
+        # Filled locally: no model call
+        elapsed = stages[-1]['seconds']
+        record = build_email_record(draft['text'], params, preset_name)
+        if user_id is not None:
+            record['id'] = get_history_store().add(record, user_id)
+        record['stats'] = {
+            "time_to_first_token": elapsed, "total_time": elapsed, "source": "template", "stages": stages
+        }
+        if draft['unfilled']:
+            print("Unfilled slots: " + ", ".join(f"[{slot}]" for slot in draft['unfilled']), file=sys.stderr)
+    else:
+        if draft:
+            # Only the slots left empty need the model
+            params['draft'] = draft['text']
+        record = generate_record(
+            params,
+            args.model,
+            preset_name,
+            stream=stream,
+            on_token=print_token if stream else None,
+            bypass_cache=args.no_cache,
+            variants=args.variants,
+            user_id=user_id
+        )
+        record['stats']['stages'] = stages + record['stats']['stages']
+    generated_email = record['content']
+
+    if args.json:
+        write_output(json.dumps(record, ensure_ascii=False, indent=2), args.output)
+    elif stream and record['stats']['source'] == "computed":
+        sys.stdout.write('\n')
+    else:
+        write_output(generated_email, args.output)
+
+    if args.pdf:
+        title = f"Email to {params['recipient_name']}" if params['recipient_name'] else "Generated Email"
+        with open(args.pdf, 'wb') as f:
+            f.write(generate_pdf(generated_email, title=title).getvalue())
+    return 0
+
+def cmd_batch(args):
+    """Generate one email per row of a CSV/XLSX recipient sheet."""
+    defaults = params_from_args(args)
+    with open(args.sheet, 'rb') as f:
+        rows = read_batch_rows(f)
+    jobs = [build_batch_job(row, build_batch_params(row, defaults), args.model) for row in rows]
+    output = args.output or os.path.join(
+        BATCH_OUTPUT_DIR, f"{os.path.splitext(os.path.basename(args.sheet))[0]}.jsonl"
+    )
+    summary = asyncio.run(run_batch(
+        jobs,
+        output,
+        args.model,
+        concurrency=args.concurrency,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        resume=not args.no_resume
+    ))
+    print(json.dumps(summary), file=sys.stderr)
+    return 0 if summary['error'] == 0 else 1
+
+def cmd_export(args):
+    """Export the history, or the emails matching the filters, to a ZIP archive."""
+    formats = [fmt.strip() for fmt in args.format.split(',') if fmt.strip()]
+    if not formats or set(formats) - {"pdf", "txt"}:
+        raise ValueError("--format must be pdf, txt or pdf,txt")
+
+    def show_progress(summary):
+        print(f"\r{summary['done']}/{summary['total']} emails", end="", file=sys.stderr, flush=True)
+
+    summary = export_history_zip(
+        args.output,
+        user_id=args.user,
+        formats=formats,
+        workers=args.workers,
+        on_progress=show_progress,
+        query=args.query,
+        tone=args.tone,
+        preset=args.preset,
+        language=args.language,
+        date_from=args.date_from,
+        date_to=args.date_to,
+        favorites_only=args.favorites
+    )
+    print(file=sys.stderr)
+    print(json.dumps(summary), file=sys.stderr)
+    return 0 if summary['error'] == 0 else 1
+
+def cmd_serve(args):
+    """Serve the HTTP API (see email_generator.service) with uvicorn."""
+    import uvicorn
+    from .service import create_app
+
+    app = create_app(concurrency=args.concurrency, max_waiting=args.max_waiting)
+    uvicorn.run(app, host=args.host, port=args.port, log_level=args.log_level)
+    return 0
+
+def add_throughput_arguments(parser):
+    """Add the concurrency and rate-limit flags used for multi-email runs."""
+    group = parser.add_argument_group("throughput")
+    group.add_argument("--concurrency", type=int, default=BATCH_DEFAULT_CONCURRENCY, help="Requests in flight at once")
+    group.add_argument("--rpm", type=int, default=BATCH_DEFAULT_RPM, help="Requests per minute")
+    group.add_argument("--tpm", type=int, default=BATCH_DEFAULT_TPM, help="Tokens per minute")
+    group.add_argument("--no-resume", action="store_true", help="Overwrite the output instead of resuming it")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="email_generator", description="Generate professional emails with OpenAI.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser("generate", help="Generate emails from flags or a JSON/JSONL parameter file")
+    add_param_arguments(generate)
+    generate.add_argument("--params", help="JSON object/list or JSONL file of build_email_prompt parameters")
+    generate.add_argument("--attach", action="append", help="Attachment path (repeatable)")
+    generate.add_argument("--output", "-o", help="Output file (default: stdout)")
+    generate.add_argument("--pdf", help="Also save a single email as PDF")
+    generate.add_argument("--json", action="store_true", help="Print the full history record as JSON")
+    generate.add_argument("--stream", action="store_true", help="Print tokens as they arrive")
+    generate.add_argument("--no-cache", action="store_true", help="Bypass the completion cache")
+    generate.add_argument("--template", action="store_true",
+                          help="Fill the preset's template locally; call the model only for slots left empty")
+    generate.add_argument("--slot", action="append", metavar="NAME=VALUE",
+                          help="Value for a template slot, e.g. 'Company Name=Acme' (repeatable)")
+    generate.add_argument("--local-only", action="store_true",
+                          help="With --template, never call the model; unfilled slots are reported")
+    generate.add_argument("--variants", type=int, default=1, choices=range(1, MAX_VARIANTS + 1), metavar="N",
+                          help=f"Ask for N drafts in one request (1-{MAX_VARIANTS}) and keep the best ranked")
+    generate.add_argument("--save-history", action="store_true", help="Store a single email in the history database")
+    generate.add_argument("--user", default=HISTORY_USER, help="History owner for --save-history")
+    add_throughput_arguments(generate)
+    generate.set_defaults(func=cmd_generate, parser=generate)
+
+    batch = subparsers.add_parser("batch", help="Generate one email per row of a CSV/XLSX sheet")
+    batch.add_argument("sheet", help="CSV/XLSX file with one row per recipient")
+    add_param_arguments(batch)
+    batch.add_argument("--output", "-o", help=f"JSONL/CSV results file (default: {BATCH_OUTPUT_DIR}/<sheet>.jsonl)")
+    add_throughput_arguments(batch)
+    batch.set_defaults(func=cmd_batch)
+
+    export = subparsers.add_parser("export", help="Export the email history to a ZIP of PDF/TXT files")
+    export.add_argument("output", help="ZIP file to write")
+    export.add_argument("--user", default=HISTORY_USER, help="History owner to export")
+    export.add_argument("--format", default="pdf,txt", help="Comma-separated file formats: pdf, txt")
+    export.add_argument("--workers", type=int, default=EXPORT_WORKERS, help="Processes rendering PDFs")
+    filters = export.add_argument_group("filters")
+    filters.add_argument("--query", default="", help="Full-text search over subject, recipient, purpose and body")
+    filters.add_argument("--tone", help="Only emails with this tone")
+    filters.add_argument("--preset", help="Only emails generated from this template")
+    filters.add_argument("--language", help="Only emails in this language")
+    filters.add_argument("--from", dest="date_from", type=date.fromisoformat, help="First day (YYYY-MM-DD)")
+    filters.add_argument("--to", dest="date_to", type=date.fromisoformat, help="Last day (YYYY-MM-DD)")
+    filters.add_argument("--favorites", action="store_true", help="Only favorite emails")
+    export.set_defaults(func=cmd_export)
+
+    serve = subparsers.add_parser("serve", help="Serve the HTTP API for other services")
+    serve.add_argument("--host", default=SERVICE_HOST, help=f"Interface to listen on (default: {SERVICE_HOST})")
+    serve.add_argument("--port", type=int, default=SERVICE_PORT, help=f"Port to listen on (default: {SERVICE_PORT})")
+    serve.add_argument("--concurrency", type=int, default=SERVICE_MAX_CONCURRENCY, help="Generations running at once")
+    serve.add_argument("--max-waiting", type=int, default=SERVICE_MAX_WAITING, help="Requests queued before 503")
+    serve.add_argument("--log-level", default="info", help="uvicorn log level")
+    serve.set_defaults(func=cmd_serve)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        get_metrics().flush()
+
+if __name__ == "__main__":
+    sys.exit(main())
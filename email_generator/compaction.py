@@ -0,0 +1,156 @@
+"""Attachment compaction before prompt assembly.
+
+Attachments often repeat themselves: the same resume as PDF and DOCX,
+several versions of one proposal, or a company header on every PDF page.
+Compaction normalizes whitespace, drops page headers and footers, and drops
+lines whose text already appeared in a previous attachment, so the budget
+is spent on distinct content.
+"""
+
+import re
+import math
+
+from .config import (
+    COMPACTION_EDGE_LINES,
+    COMPACTION_BOILERPLATE_SHARE,
+    COMPACTION_SHINGLE_WORDS,
+    COMPACTION_DUPLICATE_THRESHOLD,
+)
+from .extraction import PAGE_BREAK
+from .retrieval import chunk_terms
+
+DUPLICATE_NOTE = "[Repeated content omitted]"
+
+_SPACES = re.compile(r"[ \t\u00a0]+")
+_DIGITS = re.compile(r"\d+")
+
+def normalize_whitespace(text):
+    """Collapse runs of spaces, strip line ends and keep at most one blank line in a row."""
+    lines = []
+    blank = False
+    for line in text.split('\n'):
+        line = _SPACES.sub(' ', line).strip()
+        if line or not blank:
+            lines.append(line)
+        blank = not line
+    return '\n'.join(lines).strip()
+
+def _edge_lines(lines):
+    """Return the indexes of the non-empty lines at the top and bottom of a page."""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return set(filled[:COMPACTION_EDGE_LINES] + filled[-COMPACTION_EDGE_LINES:])
+
+def _boilerplate_key(line):
+    # Page numbers differ from page to page
+    return _DIGITS.sub('#', _SPACES.sub(' ', line).strip().lower())
+
+def strip_boilerplate(text):
+    """Remove header and footer lines repeated across the pages of a document.
+
+    A line counts as a header or footer when, ignoring digits, it appears at
+    the top or bottom of at least COMPACTION_BOILERPLATE_SHARE of the pages
+    (and of three or more). Its first occurrence is kept. Text without
+    PAGE_BREAK separators is returned unchanged. Returns (text, removed lines).
+    """
+    if PAGE_BREAK not in text:
+        return text, []
+    pages = [page.split('\n') for page in text.split(PAGE_BREAK)]
+    edges = [_edge_lines(lines) for lines in pages]
+    page_counts = {}
+    for lines, edge in zip(pages, edges):
+        for key in {_boilerplate_key(lines[i]) for i in edge}:
+            page_counts[key] = page_counts.get(key, 0) + 1
+
+    needed = max(3, math.ceil(len(pages) * COMPACTION_BOILERPLATE_SHARE))
+    boilerplate = {key for key, count in page_counts.items() if count >= needed}
+    if not boilerplate:
+        return text.replace(PAGE_BREAK, ''), []
+
+    seen = set()
+    removed = []
+    kept_pages = []
+    for lines, edge in zip(pages, edges):
+        kept = []
+        for i, line in enumerate(lines):
+            key = _boilerplate_key(line) if i in edge else None
+            if key in boilerplate:
+                if key in seen:
+                    removed.append(line)
+                    continue
+                seen.add(key)
+            kept.append(line)
+        kept_pages.append('\n'.join(kept))
+    return '\n'.join(kept_pages), removed
+
+def shingles(words, size=COMPACTION_SHINGLE_WORDS):
+    """Return the hashed word n-grams of a list of words, in order."""
+    return [hash(tuple(words[i:i + size])) for i in range(len(words) - size + 1)]
+
+def drop_repeated_lines(text, seen, size=COMPACTION_SHINGLE_WORDS):
+    """Replace lines whose words were already seen with DUPLICATE_NOTE.
+
+    seen is a set of shingle hashes from earlier texts. A word is covered
+    when it belongs to a shingle of this text that is in seen; a line is
+    dropped when at least COMPACTION_DUPLICATE_THRESHOLD of its words are
+    covered. Working on the word stream rather than on paragraphs makes the
+    comparison independent of where each format wraps its lines. This text's
+    shingles are added to seen afterwards. Returns (text, dropped lines).
+    """
+    lines = text.split('\n')
+    line_words = [chunk_terms(line) for line in lines]
+    words = [word for terms in line_words for word in terms]
+    hashes = shingles(words, size)
+    covered = [False] * len(words)
+    for i, shingle in enumerate(hashes):
+        if shingle in seen:
+            covered[i:i + size] = [True] * size
+    seen.update(hashes)
+
+    kept = []
+    dropped = []
+    position = 0
+    for line, terms in zip(lines, line_words):
+        hits = sum(covered[position:position + len(terms)])
+        position += len(terms)
+        if not terms or hits < COMPACTION_DUPLICATE_THRESHOLD * len(terms):
+            kept.append(line)
+            continue
+        dropped.append(line)
+        if kept[-2:] == [DUPLICATE_NOTE, ""]:
+            # Merge with the previous note across a blank line
+            kept.pop()
+        elif kept[-1:] != [DUPLICATE_NOTE]:
+            kept.append(DUPLICATE_NOTE)
+    return '\n'.join(kept), dropped
+
+def compact_texts(texts, count_tokens=None):
+    """Compact several attachment texts together, earlier texts taking precedence.
+
+    Each text is stripped of page headers and footers and whitespace-normalized,
+    then lines repeating earlier attachments are dropped (drop_repeated_lines).
+    count_tokens, a function returning the token count of a string, is used
+    to report the tokens of the removed lines; whitespace is not counted.
+
+    Returns (texts, stats) where stats holds chars_before, chars_after,
+    chars_saved, tokens_saved, boilerplate_lines and duplicate_lines.
+    """
+    seen = set()
+    compacted = []
+    stats = {
+        "chars_before": sum(len(text) for text in texts),
+        "tokens_saved": 0,
+        "boilerplate_lines": 0,
+        "duplicate_lines": 0,
+    }
+    for text in texts:
+        text, removed = strip_boilerplate(text)
+        text, dropped = drop_repeated_lines(normalize_whitespace(text), seen)
+        stats["boilerplate_lines"] += len(removed)
+        stats["duplicate_lines"] += len(dropped)
+        if count_tokens is not None and (removed or dropped):
+            stats["tokens_saved"] += count_tokens('\n'.join(removed + dropped))
+        compacted.append(text)
+
+    stats["chars_after"] = sum(len(text) for text in compacted)
+    stats["chars_saved"] = stats["chars_before"] - stats["chars_after"]
+    return compacted, stats
@@ -0,0 +1,230 @@
+"""Configuration constants and email presets shared by the UI, CLI and batch jobs."""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()  # Load environment variables
+
+# --- Constants ---
+DEFAULT_MODEL = "gpt-4o-mini"  # Updated default model
+MODEL_OPTIONS = ["gpt-4o", "gpt-4o-mini", "o1-mini", "o3-mini"]  # Current model options
+MAX_HISTORY_ITEMS = 20  # History items shown per page
+MAX_FILE_SIZE_MB = 5  # Maximum file size for attachments in MB
+MAX_RETRIES = 3  # Maximum API retry attempts
+
+# Attachment extraction cache
+EXTRACTOR_VERSION = "5"  # Bump whenever extractor output changes to invalidate cached text
+EXTRACTION_CACHE_MAX_BYTES = 64 * 1024 * 1024  # In-process LRU tier size cap
+EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR")  # Optional on-disk tier shared across sessions
+
+# Parallel attachment extraction
+EXTRACTION_EXECUTOR = os.getenv("EXTRACTION_EXECUTOR", "thread")  # "thread" or "process"
+EXTRACTION_WORKERS = 4  # Number of extraction workers
+EXTRACTION_TIMEOUT_SECONDS = 30  # Per-file extraction timeout, counted from when the file's first task starts
+EXTRACTION_QUEUE_POLL_SECONDS = 0.05  # How often a queued extraction task is checked for having started
+PDF_PAGES_PER_TASK = 20  # Pages of a single PDF handled by one worker task
+DOCX_READ_BYTES = 64 * 1024  # Bytes of document XML fed to the DOCX parser per step
+EXCEL_HEAD_ROWS = 20  # Rows shown per sheet; larger sheets are summarized per column
+EXCEL_MAX_COLUMNS = 50  # Columns read per sheet
+EXCEL_TOP_VALUES = 3  # Most frequent values listed per column
+EXCEL_TOP_VALUES_TRACKED = 32  # Counters kept per column to find the most frequent values
+
+# Token budgeting
+MAX_ATTACHMENT_TOKENS = 1000  # Tokens of attachment text allowed in a prompt
+MODEL_CONTEXT_WINDOWS = {  # Context window per model, in tokens
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "o1-mini": 128000,
+    "o3-mini": 200000,
+}
+DEFAULT_CONTEXT_WINDOW = 8192  # Assumed for models missing from MODEL_CONTEXT_WINDOWS
+OUTPUT_TOKENS_BY_LENGTH = {"Short": 400, "Medium": 800, "Detailed": 1500}  # max_tokens per email length
+CONTEXT_SAFETY_MARGIN = 256  # Tokens left free for message framing and tokenizer differences
+CHARS_PER_TOKEN_CEILING = 6  # Characters extracted per budgeted token before exact trimming
+
+# Attachment relevance ranking
+RETRIEVAL_SCAN_FACTOR = 8  # Attachment text extracted and ranked when over budget, as a multiple of the budget
+RETRIEVAL_SCAN_CHARS = 1_000_000  # Upper bound on the attachment characters extracted for ranking
+RETRIEVAL_CHUNK_CHARS = 800  # Size of the chunks ranked against the email purpose
+RETRIEVAL_FIT_ATTEMPTS = 8  # Chunks tried after one no longer fits the remaining budget
+BM25_K1 = 1.5  # BM25 term-frequency saturation
+BM25_B = 0.75  # BM25 chunk-length normalization
+
+# Attachment compaction before prompt assembly
+COMPACTION_EDGE_LINES = 2  # Lines at the top and bottom of each page checked for headers/footers
+COMPACTION_BOILERPLATE_SHARE = 0.5  # Share of pages (at least 3) a header/footer line must repeat on
+COMPACTION_SHINGLE_WORDS = 5  # Words per shingle when comparing attachments
+COMPACTION_DUPLICATE_THRESHOLD = 0.8  # Share of a line's words seen in earlier attachments for it to be dropped
+
+# Local template filling for EMAIL_PRESETS
+TEMPLATE_FIELD_SLOTS = {  # Form field -> template slots it fills
+    "user_name": ["Your Name"],
+    "user_role": ["Your Position", "your current position/student status"],
+    "recipient_name": ["Recipient's Name", "Hiring Manager's Name"],
+}
+TEMPLATE_SECTION_PREFIXES = ("If", "For", "When")  # "[If applicable: ...]" marks an optional section
+
+# Generation settings and completion cache
+GENERATION_TEMPERATURE = 0.7  # Sampling temperature for email generation
+GENERATION_MAX_TOKENS = 1500  # Output tokens when no email length is given
+COMPLETION_CACHE_TTL_SECONDS = 60 * 60  # How long a cached completion stays valid
+COMPLETION_CACHE_MAX_ENTRIES = 256  # Completions kept before the oldest are evicted
+
+# Multi-variant generation
+MAX_VARIANTS = 4  # Drafts requested from one prompt submission (the API's n)
+VARIANT_LENGTH_WORDS = {"Short": (50, 150), "Medium": (150, 300), "Detailed": (300, 600)}  # Word range per email length
+VARIANT_SCORE_WEIGHTS = {"length": 1.0, "subject": 1.0, "placeholders": 2.0}  # Weight of each ranking check
+
+# Export
+PDF_CACHE_MAX_ENTRIES = 32  # Rendered PDFs kept in memory for repeated downloads
+EXPORT_OUTPUT_DIR = os.getenv("EXPORT_OUTPUT_DIR", "exports")  # Where bulk history exports are written
+EXPORT_RETENTION_HOURS = 24  # ZIPs the app leaves in EXPORT_OUTPUT_DIR are deleted after this long
+EXPORT_WORKERS = 4  # Processes rendering PDFs for a bulk export
+EXPORT_TASKS_PER_WORKER = 2  # Renders queued per worker, bounding memory held by pending PDFs
+
+# Background generation jobs
+JOB_WORKERS = 4  # Emails generated at once by the background pool
+JOB_MAX_PENDING_PER_USER = 5  # Queued or running jobs allowed per user
+JOB_MAX_FINISHED = 50  # Finished jobs kept in memory for the queue panel
+JOB_POLL_SECONDS = 0.5  # How often the app refreshes the queue while jobs are active
+
+# HTTP service
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")  # Interface the service listens on
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", 8000))  # Port the service listens on
+SERVICE_API_KEY = os.getenv("SERVICE_API_KEY")  # Bearer token required by the service when set
+SERVICE_MAX_CONCURRENCY = 16  # Generations and exports running at once
+SERVICE_MAX_WAITING = 64  # Requests waiting for a slot before new ones get 503
+SERVICE_MAX_BATCH_SIZE = 200  # Emails accepted in one batch request
+SERVICE_MAX_ATTACHMENTS = 10  # Files accepted in one generate request
+
+# Metrics
+METRICS_WINDOW = 1000  # Latest samples per stage used for the latency quantiles
+METRICS_QUANTILES = (0.5, 0.95, 0.99)  # Quantiles reported per stage
+METRICS_LOG_PATH = os.getenv("METRICS_LOG_PATH")  # Optional JSON-lines log of every timed stage
+METRICS_PROMETHEUS_PATH = os.getenv("METRICS_PROMETHEUS_PATH")  # Optional Prometheus text file to scrape
+
+# Batch mail-merge
+BATCH_OUTPUT_DIR = os.getenv("BATCH_OUTPUT_DIR", "batch_outputs")  # Where batch results are written
+BATCH_DEFAULT_CONCURRENCY = 8  # Requests in flight at once
+BATCH_MAX_CONCURRENCY = 32  # Upper bound offered in the UI
+BATCH_DEFAULT_RPM = 500  # Requests per minute
+BATCH_DEFAULT_TPM = 200_000  # Tokens per minute
+
+# OpenAI client pooling, rate limiting and retries
+OPENAI_MAX_CONNECTIONS = 20  # Pooled HTTP connections shared by all sessions
+OPENAI_TIMEOUT_SECONDS = 60  # Per-request HTTP timeout
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", 500))  # Client-side request quota
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", 200_000))  # Client-side token quota
+RETRY_BASE_DELAY = 1.0  # Seconds; exponential backoff starts here
+RETRY_MAX_DELAY = 60.0  # Upper bound on a single retry wait
+
+# Persistent history
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", "email_history.db")  # SQLite database for generated emails
+HISTORY_USER = os.getenv("HISTORY_USER", "default")  # Whose history the app reads and writes
+
+# Define email presets with templates and metadata
+EMAIL_PRESETS = {
+    "Job Application": {
+        "tone": "Professional",
+        "purpose": "Applying for a job position",
+        "template": """Subject: Application for [Position Name] at [Company Name]
+
+Dear [Hiring Manager's Name],
+
+I am excited to apply for the [Position Name] role at [Company Name]. With my background in [Relevant Field/Experience], I am confident in my ability to contribute effectively to your team.
+
+In my current role at [Current Company], I have [describe key achievement or responsibility]. This experience has equipped me with [specific skills] that align well with the requirements for this position.
+
+I am particularly drawn to [Company Name] because of [specific reason - company values, projects, etc.]. I would welcome the opportunity to bring my [specific skills] to your team.
+
+Please find my resume attached for your review. I would appreciate the chance to discuss how my skills and experiences align with your needs. I am available at [your phone number] or [your email] at your convenience.
+
+Thank you for your time and consideration. I look forward to the possibility of contributing to your team.
+
+Best regards,
+[Your Name]"""
+    },
+    "Follow-Up Email": {
+        "tone": "Professional",
+        "purpose": "Following up after a meeting or application",
+        "template": """Subject: Following Up on [Meeting/Application Topic]
+
+Dear [Recipient's Name],
+
+I hope this email finds you well. I wanted to follow up regarding our recent [meeting/conversation] about [topic] on [date]. 
+
+[If applicable: Thank you again for taking the time to [discuss/meet about] [topic]. I found our conversation particularly valuable because [specific reason].]
+
+[If waiting for response: I understand you're busy, but I wanted to check if there have been any updates regarding [specific question or next steps].]
+
+Please don't hesitate to let me know if you need any additional information from my side. I'm happy to provide further details or clarify anything about [subject].
+
+Looking forward to hearing from you.
+
+Best regards,
+[Your Name]"""
+    },
+    "Thank You Note": {
+        "tone": "Friendly",
+        "purpose": "Expressing gratitude after an interview or favor",
+        "template": """Subject: Thank You for [Specific Reason]
+
+Dear [Recipient's Name],
+
+I wanted to take a moment to sincerely thank you for [specific reason - interview, help, gift, etc.]. I truly appreciate the time and effort you took to [specific action].
+
+[For interviews: I particularly enjoyed learning about [something specific from the conversation]. Our discussion about [topic] reinforced my excitement about the opportunity to join [Company Name].]
+
+[If appropriate: Please don't hesitate to let me know if there's ever anything I can do to return the favor.]
+
+Thanks again for your [kindness/guidance/support]. It means a great deal to me.
+
+Warm regards,
+[Your Name]"""
+    },
+    "Sales Pitch": {
+        "tone": "Persuasive",
+        "purpose": "Introducing a product or service to potential clients",
+        "template": """Subject: [Product/Service] to Help You [Solve Problem]
+
+Dear [Recipient's Name],
+
+I hope you're doing well. I'm reaching out because I believe [Company Name]'s [Product/Service] could help you [solve specific problem or achieve specific goal].
+
+Many [industry] professionals like yourself are facing challenges with [specific pain point]. Our solution helps by [key benefit 1], [key benefit 2], and [key benefit 3].
+
+For example, we recently helped [Client Name] achieve [specific result] within [timeframe]. They were able to [specific outcome] while reducing [pain point] by [percentage].
+
+I'd love to schedule a quick call to discuss how we might be able to help you with [specific challenge]. Would [date/time] or [date/time] work for you?
+
+In the meantime, I've attached [relevant materials] that provide more details about our solution.
+
+Looking forward to the possibility of working together.
+
+Best regards,
+[Your Name]
+[Your Position]
+[Your Company]"""
+    },
+    "Networking Request": {
+        "tone": "Professional",
+        "purpose": "Requesting an informational interview or connection",
+        "template": """Subject: Request for [Informational Interview/Advice]
+
+Dear [Recipient's Name],
+
+I hope this message finds you well. My name is [Your Name], and I'm [your current position/student status] with a strong interest in [field/industry].
+
+I've been following your work at [Company/Organization] and particularly admire [specific aspect of their work]. I would greatly appreciate the opportunity to learn more about your experiences and insights in [specific area].
+
+Would you be available for a brief [15-20 minute] conversation in the coming weeks? I'm happy to accommodate your schedule and can meet in person or virtually, whichever is most convenient for you.
+
+I completely understand if you're unable to spare the time, but any advice you could share would be invaluable as I [your current goal - navigate my career path, learn about the industry, etc.].
+
+Thank you for considering this request. I look forward to the possibility of connecting.
+
+Best regards,
+[Your Name]
+[Your Contact Information]"""
+    }
+}
@@ -0,0 +1,242 @@
+"""Rendering generated emails to PDF and bulk history exports."""
+
+import io
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import zipfile
+import tempfile
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+from .config import (
+    PDF_CACHE_MAX_ENTRIES,
+    EXPORT_WORKERS,
+    EXPORT_TASKS_PER_WORKER,
+    EXPORT_RETENTION_HOURS,
+    HISTORY_USER,
+)
+from .history import get_history_store
+from .metrics import timed
+
+@lru_cache(maxsize=None)
+def get_pdf_styles():
+    """Return the reportlab stylesheet, built once per process."""
+    from reportlab.lib.styles import getSampleStyleSheet
+    return getSampleStyleSheet()
+
+def render_pdf(content, title="Generated Email"):
+    """Render email content to PDF bytes with proper formatting."""
+    # reportlab is only needed on export, so it is imported here rather than at startup
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+    buffer = io.BytesIO()
+    try:
+        doc = SimpleDocTemplate(buffer, pagesize=letter)
+        styles = get_pdf_styles()
+        
+        flowables = []
+        
+        # Add title
+        flowables.append(Paragraph(escape(title), styles['Title']))
+        flowables.append(Spacer(1, 12))
+        
+        # Process content
+        for line in content.split('\n'):
+            if line.strip():
+                # Paragraph parses markup, so "<" or "&" in the email must be escaped
+                text = escape(line)
+                if line.startswith('Subject:'):
+                    flowables.append(Paragraph(f"<b>{text}</b>", styles['Heading2']))
+                elif line.startswith('Dear'):
+                    flowables.append(Paragraph(text, styles['Heading3']))
+                elif any(line.startswith(prefix) for prefix in ['Best regards,', 'Sincerely,', 'Regards,']):
+                    flowables.append(Paragraph(text, styles['Heading3']))
+                else:
+                    flowables.append(Paragraph(text, styles['BodyText']))
+                
+                flowables.append(Spacer(1, 6))
+        
+        doc.build(flowables)
+        return buffer.getvalue()
+    except Exception as e:
+        raise Exception(f"Error generating PDF: {str(e)}")
+
+class PdfCache:
+    """Size-bounded LRU cache of rendered PDFs keyed by a hash of content and title."""
+
+    def __init__(self, max_entries=PDF_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> PDF bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(content, title):
+        digest = hashlib.sha256()
+        for part in (title, content):
+            digest.update(part.encode('utf-8'))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get_or_render(self, content, title="Generated Email"):
+        """Return the PDF bytes for content and title, rendering them only once.
+
+        Timed as the "generate_pdf" stage, with cached telling hits from renders.
+        """
+        with timed("generate_pdf") as details:
+            key = self.make_key(content, title)
+            with self._lock:
+                pdf = self._entries.get(key)
+                if pdf is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    details["cached"] = True
+                    return pdf
+                self.misses += 1
+            details["cached"] = False
+            pdf = render_pdf(content, title)
+            details["bytes"] = len(pdf)
+        with self._lock:
+            self._entries[key] = pdf
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return pdf
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": sum(len(pdf) for pdf in self._entries.values()),
+            }
+
+@lru_cache(maxsize=None)
+def get_pdf_cache():
+    """Return the process-wide PDF cache shared by all sessions."""
+    return PdfCache()
+
+def generate_pdf(content, title="Generated Email"):
+    """Generate PDF from email content with proper formatting.
+
+    Returns a BytesIO; identical content and title are rendered only once.
+    """
+    return io.BytesIO(get_pdf_cache().get_or_render(content, title))
+
+def pdf_title(record):
+    """Return the PDF title used for a history record."""
+    recipient = record['metadata'].get('recipient')
+    return f"Email to {recipient}" if recipient else "Generated Email"
+
+def _export_basename(record):
+    """Return the archive path (without extension) for a history record."""
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', record['metadata'].get('subject') or "").strip('_')[:40]
+    return f"emails/{record['id']:06d}_{slug or 'email'}"
+
+def export_history_zip(output_path, user_id=HISTORY_USER, formats=("pdf", "txt"), store=None,
+                       workers=EXPORT_WORKERS, executor=None, on_progress=None, **filters):
+    """Export a user's history, or the part matching search filters, to a ZIP archive.
+
+    Every email is written as emails/<id>_<subject>.pdf and/or .txt, and
+    manifest.jsonl holds one line of metadata per email. PDFs are rendered
+    in a process pool and written to the archive in order as they finish,
+    with at most workers * EXPORT_TASKS_PER_WORKER records in flight, so
+    memory stays bounded however large the export is. filters are passed
+    to HistoryStore.search_ids. on_progress is called with the running
+    summary after each email. Returns the summary dict.
+    """
+    store = store or get_history_store()
+    record_ids = store.search_ids(user_id, **filters)
+    summary = {"path": output_path, "total": len(record_ids), "done": 0, "error": 0}
+
+    parent = os.path.dirname(output_path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    partial_path = output_path + ".part"
+    own_executor = executor is None and "pdf" in formats
+    if own_executor:
+        # Spawned, not forked: the callers (Streamlit, the HTTP service) are multithreaded
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    try:
+        with zipfile.ZipFile(partial_path, "w", compression=zipfile.ZIP_DEFLATED) as archive, \
+                tempfile.TemporaryFile() as manifest:
+            pending = deque()
+
+            def write_next():
+                record, future = pending.popleft()
+                basename = _export_basename(record)
+                entry = {key: record[key] for key in ("id", "timestamp", "favorite", "metadata")}
+                entry["files"] = []
+                if "txt" in formats:
+                    archive.writestr(f"{basename}.txt", record["content"])
+                    entry["files"].append(f"{basename}.txt")
+                if future is not None:
+                    try:
+                        archive.writestr(f"{basename}.pdf", future.result())
+                        entry["files"].append(f"{basename}.pdf")
+                    except Exception as e:
+                        entry["error"] = str(e)
+                        summary["error"] += 1
+                manifest.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+                summary["done"] += 1
+                if on_progress:
+                    on_progress(summary)
+
+            for record_id in record_ids:
+                record = store.get(record_id, user_id)
+                if record is None:
+                    # Deleted since the export started
+                    summary["total"] -= 1
+                    continue
+                future = None
+                if "pdf" in formats:
+                    future = executor.submit(render_pdf, record["content"], pdf_title(record))
+                pending.append((record, future))
+                if len(pending) >= workers * EXPORT_TASKS_PER_WORKER:
+                    write_next()
+            while pending:
+                write_next()
+
+            manifest.seek(0)
+            with archive.open("manifest.jsonl", "w") as f:
+                shutil.copyfileobj(manifest, f)
+        os.replace(partial_path, output_path)
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return summary
+
+def prune_exports(directory, max_age_hours=EXPORT_RETENTION_HOURS):
+    """Delete export ZIPs in directory older than max_age_hours; returns how many were removed."""
+    removed = 0
+    cutoff = time.time() - max_age_hours * 3600
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        path = os.path.join(directory, name)
+        if not name.endswith(".zip"):
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            # Removed by another session meanwhile
+            pass
+    return removed
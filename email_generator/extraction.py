@@ -0,0 +1,780 @@
+"""Attachment validation, text extraction and the extraction cache."""
+
+import os
+import io
+import time
+import hashlib
+import tempfile
+import zipfile
+import threading
+from xml.etree import ElementTree
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import lru_cache
+from datetime import date, datetime, time as dt_time
+
+from .config import (
+    MAX_FILE_SIZE_MB,
+    EXTRACTOR_VERSION,
+    EXTRACTION_CACHE_MAX_BYTES,
+    EXTRACTION_CACHE_DIR,
+    EXTRACTION_EXECUTOR,
+    EXTRACTION_WORKERS,
+    EXTRACTION_TIMEOUT_SECONDS,
+    EXTRACTION_QUEUE_POLL_SECONDS,
+    PDF_PAGES_PER_TASK,
+    DOCX_READ_BYTES,
+    EXCEL_HEAD_ROWS,
+    EXCEL_MAX_COLUMNS,
+    EXCEL_TOP_VALUES,
+    EXCEL_TOP_VALUES_TRACKED,
+)
+from .metrics import get_metrics
+
+# Separates PDF pages in extracted text so page headers and footers can be recognized
+PAGE_BREAK = "\f"
+
+# WordprocessingML tags handled by DocxTextTarget
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_P, _W_T, _W_TBL, _W_TR, _W_TC = _W + "p", _W + "t", _W + "tbl", _W + "tr", _W + "tc"
+_DOCX_BREAKS = {_W + "tab": "\t", _W + "br": "\n", _W + "cr": "\n"}
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+def validate_file(file):
+    """Validate uploaded file size and type."""
+    valid_types = ['pdf', 'docx', 'xlsx', 'txt', 'jpg', 'png', 'jpeg']
+    file_type = file.name.split('.')[-1].lower()
+    
+    if file_type not in valid_types:
+        raise ValueError(f"Unsupported file type: {file_type}")
+    if file.size > MAX_FILE_SIZE_MB * 1024 * 1024:
+        raise ValueError(f"File size exceeds {MAX_FILE_SIZE_MB}MB limit")
+    return True
+
+class LocalAttachment:
+    """A file on disk exposed with the same interface as a Streamlit upload."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.size = os.path.getsize(path)
+
+    def getvalue(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+class MemoryAttachment:
+    """Uploaded bytes held in memory, with the same interface as a Streamlit upload."""
+
+    def __init__(self, name, data):
+        self.name = name
+        self.size = len(data)
+        self._data = data
+
+    def getvalue(self):
+        return self._data
+
+class ExtractionCache:
+    """Content-addressed cache for extracted attachment text.
+
+    Entries are keyed by a hash of the file bytes and EXTRACTOR_VERSION. Hot
+    entries live in an in-process LRU capped at max_bytes; when cache_dir is
+    set, entries are also written to disk so other sessions and restarts reuse them.
+    Budgeted extraction may only produce a prefix of a document, so each entry
+    records whether its text is complete.
+    """
+
+    def __init__(self, max_bytes=EXTRACTION_CACHE_MAX_BYTES, cache_dir=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(data, file_type):
+        """Build the cache key for a file's raw bytes."""
+        digest = hashlib.sha256()
+        digest.update(f"{EXTRACTOR_VERSION}:{file_type}:".encode())
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    @staticmethod
+    def _satisfies(entry, min_chars):
+        text, complete = entry
+        return complete or (min_chars is not None and len(text) >= min_chars)
+
+    def get(self, key, min_chars=None):
+        """Return a cached (text, complete) pair for key, or None on a miss.
+
+        A partial entry only counts as a hit when it holds at least min_chars
+        characters; min_chars=None asks for the complete text.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._satisfies(entry, min_chars):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        if self.cache_dir:
+            try:
+                with open(self._disk_path(key), encoding='utf-8', newline='') as f:
+                    flag = f.read(2)
+                    entry = (f.read(), flag == "1\n")
+            except OSError:
+                entry = None
+            if entry is not None and self._satisfies(entry, min_chars):
+                self._remember(key, entry)
+                with self._lock:
+                    self.disk_hits += 1
+                return entry
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, text, complete=True):
+        """Store extracted text in memory and, if enabled, on disk.
+
+        A partial entry never replaces a longer or complete one.
+        """
+        with self._lock:
+            existing = self._entries.get(key)
+        if existing is not None and (existing[1] or len(existing[0]) >= len(text)) and not complete:
+            return
+        self._remember(key, (text, complete))
+        if self.cache_dir:
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Write to a temp file first so concurrent readers never see a partial entry
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+                with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+                    f.write("1\n" if complete else "0\n")
+                    f.write(text)
+                os.replace(tmp_path, path)
+            except OSError:
+                pass  # The disk tier is best-effort
+
+    def _remember(self, key, entry):
+        size = len(entry[0].encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key)[0].encode('utf-8'))
+            self._entries[key] = entry
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted[0].encode('utf-8'))
+                self.evictions += 1
+
+    def stats(self):
+        """Return hit/miss counters and current memory usage."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+@lru_cache(maxsize=None)
+def get_extraction_cache():
+    """Return the process-wide extraction cache shared by all sessions."""
+    return ExtractionCache(EXTRACTION_CACHE_MAX_BYTES, EXTRACTION_CACHE_DIR)
+
+def extract_text_from_file(file):
+    """Extract text content from various file types with error handling."""
+    try:
+        validate_file(file)
+        file_type = file.name.split('.')[-1].lower()
+        if file_type in ['jpg', 'png', 'jpeg']:
+            return "[Image content - description not extracted]"
+
+        data = file.getvalue()
+        cache = get_extraction_cache()
+        key = ExtractionCache.make_key(data, file_type)
+        entry = cache.get(key)
+        if entry is None:
+            text = extract_text_from_bytes(data, file_type)
+            cache.put(key, text)
+            return text
+        return entry[0]
+    except Exception as e:
+        return f"[Error processing {file.name}: {str(e)}]"
+
+def iter_text_from_bytes(data, file_type):
+    """Yield text chunks from raw file bytes using the extractor for their file type."""
+    file = io.BytesIO(data)
+    if file_type == 'pdf':
+        return iter_text_from_pdf(file)
+    elif file_type == 'docx':
+        return iter_text_from_docx(file)
+    elif file_type == 'xlsx':
+        return iter_text_from_excel(file)
+    elif file_type == 'txt':
+        return iter_text_from_txt(file)
+    else:
+        return iter([f"[Unsupported file format: {file_type}]"])
+
+def take_text(chunks, limit=None):
+    """Join text chunks with newlines, stopping as soon as limit characters are collected.
+
+    Returns a (text, complete) pair; complete is False when the source may hold
+    more text than was consumed. The chunk generator is closed early so the
+    extractor does no further work.
+    """
+    parts = []
+    length = -1
+    complete = True
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            length += len(chunk) + 1
+            if limit is not None and length >= limit:
+                complete = False
+                break
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+    text = '\n'.join(parts).strip()
+    if limit is not None:
+        text = text[:limit]
+    return text, complete
+
+def extract_text_limited(data, file_type, limit=None):
+    """Extract at most limit characters from raw file bytes (worker task).
+
+    Returns a (text, complete) pair.
+    """
+    return take_text(iter_text_from_bytes(data, file_type), limit)
+
+def extract_text_from_bytes(data, file_type):
+    """Extract the full text from raw file bytes."""
+    return extract_text_limited(data, file_type)[0]
+
+_EXECUTOR_LOCK = threading.Lock()
+
+class _StuckTask(TimeoutError):
+    """A task still running after the timeout; its worker stays busy until the task returns."""
+
+@lru_cache(maxsize=None)
+def get_extraction_executor():
+    """Return the process-wide executor used for attachment extraction."""
+    if EXTRACTION_EXECUTOR == "process":
+        return ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS)
+    return ThreadPoolExecutor(max_workers=EXTRACTION_WORKERS, thread_name_prefix="extract")
+
+def _count_pdf_pages(data):
+    """Return the number of pages in a PDF (worker task)."""
+    import PyPDF2
+    return len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+
+def _extract_pdf_page_range(data, start, stop):
+    """Return the non-empty page texts for pages [start, stop) of a PDF (worker task)."""
+    import PyPDF2
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(data))
+    page_texts = []
+    for page in pdf_reader.pages[start:stop]:
+        page_text = page.extract_text()
+        if page_text:
+            page_texts.append(page_text)
+    return page_texts
+
+def _submit(executor, function, *args):
+    """Submit a task to executor, or to the process-wide pool when executor is None."""
+    if executor is not None:
+        return executor.submit(function, *args)
+    try:
+        return get_extraction_executor().submit(function, *args)
+    except RuntimeError:
+        # Another request retired the pool between the lookup and the submit
+        return get_extraction_executor().submit(function, *args)
+
+def _retire_extraction_executor(executor):
+    """Replace the process-wide pool after one of its tasks ran past the timeout.
+
+    A running thread cannot be stopped, so the stuck task keeps its worker
+    until it returns. The retired pool finishes the tasks already queued and
+    its workers then exit; new extractions get a fresh pool with all workers
+    free.
+    """
+    with _EXECUTOR_LOCK:
+        if get_extraction_executor.cache_info().currsize and get_extraction_executor() is executor:
+            get_extraction_executor.cache_clear()
+            executor.shutdown(wait=False)
+
+def _wait_for(future, started, timeout):
+    """Wait for a task of one file, allowing timeout seconds from when the file's first task started.
+
+    started holds that start time (None while every task of the file is
+    still queued), so time spent waiting behind other files does not count.
+    On timeout the task is cancelled if it has not started; a running task
+    that overran takes its pool out of service (see _retire_extraction_executor).
+    """
+    while True:
+        if started[0] is None and (future.running() or future.done()):
+            started[0] = time.monotonic()
+        wait = EXTRACTION_QUEUE_POLL_SECONDS if started[0] is None else started[0] + timeout - time.monotonic()
+        try:
+            return future.result(timeout=max(0, wait))
+        except FutureTimeoutError:
+            if started[0] is None or future.done():
+                continue
+            if future.cancel():
+                raise TimeoutError(f"extraction timed out after {timeout}s")
+            raise _StuckTask(f"extraction timed out after {timeout}s")
+
+def _more_page_ranges(length, pages_read, limit):
+    """Return how many more page-range tasks should fill the rest of limit, judging by the pages read so far."""
+    chars_per_page = max(1.0, length / max(1, pages_read))
+    pages_needed = (limit - length) / chars_per_page
+    return max(1, -(-int(pages_needed) // PDF_PAGES_PER_TASK))
+
+def _run_extraction_round(jobs, executor, timeout):
+    """Run one round of extraction tasks in parallel.
+
+    jobs maps an attachment index to (file_type, data, limit). PDFs are split
+    into page-range tasks: all at once without a limit, otherwise only as
+    many as the pages read so far suggest are needed to fill it. Everything
+    else is a single task that stops at its limit. Each file has timeout
+    seconds from when its first task starts. Returns index -> (text,
+    complete), or the exception raised for that attachment.
+    """
+    futures = {}
+    started = {i: [None] for i in jobs}  # index -> [when the file's first task started running]
+    pool = executor or get_extraction_executor()
+    submitted = time.perf_counter()
+    finished = {}  # index -> when the latest of its tasks completed, for the per-extractor timings
+
+    def mark_finished(i):
+        return lambda future: finished.__setitem__(i, max(finished.get(i, 0.0), time.perf_counter()))
+
+    def submit_pages(i, data, start):
+        future = _submit(executor, _extract_pdf_page_range, data, start, start + PDF_PAGES_PER_TASK)
+        future.add_done_callback(mark_finished(i))
+        return future
+
+    for i, (file_type, data, limit) in jobs.items():
+        if file_type == 'pdf':
+            futures[i] = _submit(executor, _count_pdf_pages, data)
+        else:
+            futures[i] = _submit(executor, extract_text_limited, data, file_type, limit)
+        futures[i].add_done_callback(mark_finished(i))
+
+    # Fan PDFs out into page-range tasks once their page counts are known
+    page_tasks = {}  # index -> (page count, futures of the ranges submitted so far)
+    outcomes = {}
+    for i, (file_type, data, limit) in jobs.items():
+        if file_type != 'pdf':
+            continue
+        try:
+            page_count = _wait_for(futures[i], started[i], timeout)
+            starts = range(0, page_count, PDF_PAGES_PER_TASK)
+            first = starts if limit is None else starts[:1]
+            page_tasks[i] = (page_count, [submit_pages(i, data, start) for start in first])
+        except Exception as e:
+            outcomes[i] = e
+
+    for i, (file_type, data, limit) in jobs.items():
+        if i in outcomes:
+            continue
+        try:
+            if i in page_tasks:
+                page_count, page_futures = page_tasks[i]
+                page_texts = []
+                length = -1
+                read = 0
+                try:
+                    while read < len(page_futures):
+                        for page_text in _wait_for(page_futures[read], started[i], timeout):
+                            page_texts.append(page_text)
+                            length += len(page_text) + len(PAGE_BREAK) + 1
+                        read += 1
+                        if limit is not None and length >= limit:
+                            break
+                        pages_read = read * PDF_PAGES_PER_TASK
+                        if read == len(page_futures) and pages_read < page_count:
+                            # Read the rest of the share in parallel, sized by the text per page so far
+                            starts = range(pages_read, page_count, PDF_PAGES_PER_TASK)
+                            more = _more_page_ranges(max(0, length), pages_read, limit)
+                            page_futures.extend(submit_pages(i, data, start) for start in starts[:more])
+                finally:
+                    for page_future in page_futures:
+                        page_future.cancel()
+                text = ("\n" + PAGE_BREAK).join(page_texts).strip()
+                complete = read * PDF_PAGES_PER_TASK >= page_count and (limit is None or len(text) <= limit)
+                outcomes[i] = (text if limit is None else text[:limit], complete)
+            else:
+                outcomes[i] = _wait_for(futures[i], started[i], timeout)
+        except Exception as e:
+            outcomes[i] = e
+
+    if executor is None and any(isinstance(outcome, _StuckTask) for outcome in outcomes.values()):
+        _retire_extraction_executor(pool)
+
+    metrics = get_metrics()
+    now = time.perf_counter()
+    for i, outcome in outcomes.items():
+        file_type, data, limit = jobs[i]
+        if isinstance(outcome, Exception):
+            details = {"error": type(outcome).__name__}
+        else:
+            details = {"chars": len(outcome[0]), "complete": outcome[1]}
+        metrics.observe(f"extract_{file_type}", finished.get(i, now) - submitted, bytes=len(data), **details)
+    return outcomes
+
+def extract_attachments(files, budget=None, executor=None, timeout=EXTRACTION_TIMEOUT_SECONDS):
+    """Extract text from several attachments concurrently.
+
+    Returns one (text, complete) pair per file, in the same order as files.
+    When budget is given, the attachments share that many characters fairly:
+    each starts with an equal share, and whatever a short file leaves unused
+    is redistributed to the files that still have more text. Extractors stop
+    as soon as their share is filled. A file that fails or exceeds the timeout
+    yields an error placeholder instead of blocking the others; the timeout
+    runs from when the file's extraction starts, not while it waits for a
+    worker. Without an executor the process-wide pool is used, and replaced
+    when one of its tasks overruns.
+    """
+    cache = get_extraction_cache()
+    results = [None] * len(files)
+    sources = {}  # index -> (file_type, data, cache key)
+
+    for i, file in enumerate(files):
+        try:
+            validate_file(file)
+            file_type = file.name.split('.')[-1].lower()
+            if file_type in ['jpg', 'png', 'jpeg']:
+                results[i] = ("[Image content - description not extracted]", True)
+                continue
+            data = file.getvalue()
+            sources[i] = (file_type, data, ExtractionCache.make_key(data, file_type))
+        except Exception as e:
+            results[i] = (f"[Error processing {file.name}: {str(e)}]", True)
+
+    active = set(sources)
+    partial = {}  # index -> longest text extracted so far for files still being filled
+
+    while active:
+        if budget is None:
+            limit = None
+        else:
+            used = sum(len(results[i][0]) for i in range(len(files)) if results[i] is not None)
+            limit = max(0, budget - used) // len(active)
+
+        jobs = {}
+        for i in sorted(active):
+            file_type, data, key = sources[i]
+            if i in partial and limit is not None and len(partial[i]) >= limit:
+                continue
+            entry = cache.get(key, min_chars=limit)
+            if entry is not None:
+                partial[i] = entry[0]
+                # A complete entry longer than the share still has to be cut down to it
+                if entry[1] and (limit is None or len(entry[0]) <= limit):
+                    results[i] = entry
+            else:
+                jobs[i] = (file_type, data, limit)
+
+        for i, outcome in _run_extraction_round(jobs, executor, timeout).items():
+            file_type, data, key = sources[i]
+            if isinstance(outcome, Exception):
+                results[i] = (f"[Error processing {files[i].name}: {str(outcome)}]", True)
+                continue
+            text, complete = outcome
+            cache.put(key, text, complete)
+            partial[i] = text
+            if complete:
+                results[i] = (text, True)
+
+        finished = {i for i in active if results[i] is not None}
+        if not finished:
+            # Every remaining file fills its equal share; nothing is left to redistribute
+            for i in active:
+                results[i] = (partial[i][:limit] if limit is not None else partial[i], False)
+            break
+        active -= finished
+
+    return results
+
+def iter_text_from_pdf(file):
+    """Yield the text of each non-empty PDF page, parsing pages only as they are consumed.
+
+    Pages after the first start with PAGE_BREAK.
+    """
+    try:
+        import PyPDF2
+        pdf_reader = PyPDF2.PdfReader(file)
+        first = True
+        for page in pdf_reader.pages:
+            page_text = page.extract_text()
+            if page_text:
+                yield page_text if first else PAGE_BREAK + page_text
+                first = False
+    except Exception as e:
+        raise Exception(f"PDF extraction error: {str(e)}")
+
+class DocxTextTarget:
+    """XMLParser target turning WordprocessingML into paragraph and table-row lines.
+
+    expat calls start/end/data directly and no element tree is built. Finished
+    lines collect in self.lines for the caller to drain between feeds.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.paragraphs = []  # text pieces of each open paragraph; text boxes nest paragraphs
+        self.cells = []  # cell texts of the current top-level table row
+        self.cell = []  # paragraph texts of the current cell
+        self.tables = 0
+        self.fallbacks = 0  # inside mc:Fallback, which repeats the text of mc:Choice
+        self.in_text = False
+
+    def start(self, tag, attrib):
+        if tag == _W_T:
+            self.in_text = bool(self.paragraphs) and not self.fallbacks
+        elif tag == _W_P:
+            self.paragraphs.append([])
+        elif tag in _DOCX_BREAKS:
+            if self.paragraphs and not self.fallbacks:
+                self.paragraphs[-1].append(_DOCX_BREAKS[tag])
+        elif tag == _W_TBL:
+            self.tables += 1
+        elif tag == _MC_FALLBACK:
+            self.fallbacks += 1
+
+    def data(self, text):
+        if self.in_text:
+            self.paragraphs[-1].append(text)
+
+    def end(self, tag):
+        if tag == _W_T:
+            self.in_text = False
+        elif tag == _W_P:
+            text = "".join(self.paragraphs.pop())
+            if not text.strip() or self.fallbacks:
+                return
+            if self.paragraphs:
+                self.paragraphs[-1].append("\n" + text)
+            elif self.tables:
+                self.cell.append(text.strip())
+            else:
+                self.lines.append(text)
+        elif tag == _W_TC and self.tables == 1:
+            self.cells.append(" ".join(self.cell))
+            self.cell = []
+        elif tag == _W_TR and self.tables == 1:
+            if any(self.cells):
+                self.lines.append(" | ".join(self.cells))
+            self.cells = []
+        elif tag == _W_TBL:
+            self.tables -= 1
+        elif tag == _MC_FALLBACK:
+            self.fallbacks -= 1
+
+    def close(self):
+        return None
+
+def iter_text_from_docx(file):
+    """Yield the paragraphs and table rows of a Word document in document order.
+
+    word/document.xml is fed from the archive to an XML parser a block at a
+    time, so a consumer that stops early (see take_text) leaves the rest of
+    the document unread. Table rows come out as their cell texts joined by
+    " | "; nested tables are folded into the enclosing cell.
+    """
+    try:
+        target = DocxTextTarget()
+        parser = ElementTree.XMLParser(target=target)
+        with zipfile.ZipFile(file) as archive, archive.open('word/document.xml') as xml:
+            while True:
+                block = xml.read(DOCX_READ_BYTES)
+                if block:
+                    parser.feed(block)
+                else:
+                    parser.close()
+                yield from target.lines
+                target.lines.clear()
+                if not block:
+                    break
+    except Exception as e:
+        raise Exception(f"DOCX extraction error: {str(e)}")
+
+def _format_cell(value):
+    """Render a cell value compactly: integral floats without ".0", midnight datetimes as dates."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == dt_time() else value.isoformat(sep=' ')
+    if isinstance(value, (date, dt_time)):
+        return value.isoformat()
+    return str(value).replace('\n', ' ').strip()
+
+class ColumnSummary:
+    """Constant-memory summary of one spreadsheet column, updated a value at a time.
+
+    Numbers, dates and booleans keep a count and their min/max; other values
+    feed a Misra-Gries heavy-hitters sketch of EXCEL_TOP_VALUES_TRACKED
+    counters, so the most frequent values are found without storing them all.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.empty = 0
+        self.counts = {}  # kind -> number of values
+        self.bounds = {}  # kind -> [min, max]
+        self.top = {}  # value -> approximate count
+
+    def add(self, value):
+        if value is None or value == "":
+            self.empty += 1
+            return
+        if isinstance(value, bool):
+            kind = "boolean"
+        elif isinstance(value, (int, float)):
+            kind = "number"
+        elif isinstance(value, (datetime, date, dt_time)):
+            kind = "date"
+        else:
+            kind = "text"
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        if kind in ("number", "date"):
+            bounds = self.bounds.get(kind)
+            if bounds is None:
+                self.bounds[kind] = [value, value]
+            else:
+                try:
+                    if value < bounds[0]:
+                        bounds[0] = value
+                    if value > bounds[1]:
+                        bounds[1] = value
+                except TypeError:
+                    pass  # date and time values do not compare
+        else:
+            self._count_top(_format_cell(value))
+
+    def _count_top(self, value):
+        if value in self.top:
+            self.top[value] += 1
+        elif len(self.top) < EXCEL_TOP_VALUES_TRACKED:
+            self.top[value] = 1
+        else:
+            for key in list(self.top):
+                self.top[key] -= 1
+                if not self.top[key]:
+                    del self.top[key]
+
+    def describe(self):
+        kinds = sorted(self.counts, key=self.counts.get, reverse=True)
+        parts = [f"{'/'.join(kinds) or 'empty'}, {sum(self.counts.values())} values"]
+        if self.empty:
+            parts[0] += f" ({self.empty} empty)"
+        for kind in ("number", "date"):
+            if kind in self.bounds:
+                low, high = self.bounds[kind]
+                parts.append(f"{kind} range {_format_cell(low)} to {_format_cell(high)}")
+        top = sorted(self.top.items(), key=lambda item: item[1], reverse=True)[:EXCEL_TOP_VALUES]
+        if top:
+            parts.append("top: " + ", ".join(f"{value} (~{count})" for value, count in top))
+        return f"- {self.name}: " + "; ".join(parts)
+
+def iter_text_from_excel(file):
+    """Yield every sheet of a workbook as compact text, streaming rows in read-only mode.
+
+    Each sheet's rows are read once. Sheets with at most EXCEL_HEAD_ROWS data
+    rows are emitted whole; larger ones are emitted as column summaries
+    (types, counts, min/max, top values) followed by their first rows. All
+    summaries come before the head rows, so a small budget still covers every
+    sheet. Memory stays bounded by the head rows and one summary per column.
+    """
+    try:
+        import openpyxl
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    except Exception as e:
+        raise Exception(f"Excel extraction error: {str(e)}")
+
+    heads = []
+    try:
+        for sheet in workbook.worksheets:
+            rows = sheet.iter_rows(values_only=True)
+            header = None
+            head = []
+            columns = []
+            total = 0
+            for row in rows:
+                if not any(value is not None and value != "" for value in row):
+                    continue
+                row = row[:EXCEL_MAX_COLUMNS]
+                if header is None:
+                    if all(value is None or isinstance(value, str) for value in row):
+                        header = [_format_cell(value) or f"Column {i + 1}" for i, value in enumerate(row)]
+                        continue
+                    header = [f"Column {i + 1}" for i in range(len(row))]
+                while len(columns) < len(row):
+                    name = header[len(columns)] if len(columns) < len(header) else f"Column {len(columns) + 1}"
+                    columns.append(ColumnSummary(name))
+                for column, value in zip(columns, row):
+                    column.add(value)
+                total += 1
+                if len(head) < EXCEL_HEAD_ROWS:
+                    head.append(" | ".join(_format_cell(value) for value in row))
+
+            title = f"## Sheet: {sheet.title}"
+            if header is None:
+                yield f"{title} (empty)"
+                continue
+            header_line = " | ".join(header)
+            if total <= EXCEL_HEAD_ROWS:
+                yield f"{title} ({total} rows)"
+                yield header_line
+                yield from head
+                continue
+            yield f"{title} ({total} rows x {len(columns)} columns)"
+            yield "Columns:"
+            for column in columns:
+                yield column.describe()
+            heads.append((sheet.title, header_line, head))
+
+        for title, header_line, head in heads:
+            yield f"## Sheet: {title}, first {len(head)} rows"
+            yield header_line
+            yield from head
+    except Exception as e:
+        raise Exception(f"Excel extraction error: {str(e)}")
+    finally:
+        workbook.close()
+
+def iter_text_from_txt(file):
+    """Yield the lines of a UTF-8 text file."""
+    for line in io.TextIOWrapper(file, encoding='utf-8', newline=''):
+        yield line[:-1] if line.endswith('\n') else line
+
+def extract_text_from_pdf(file):
+    """Extract text from PDF files."""
+    return take_text(iter_text_from_pdf(file))[0]
+
+def extract_text_from_docx(file):
+    """Extract text from Word documents."""
+    return take_text(iter_text_from_docx(file))[0]
+
+def extract_text_from_excel(file):
+    """Extract text from Excel files."""
+    return take_text(iter_text_from_excel(file))[0]
@@ -0,0 +1,271 @@
+"""OpenAI client setup, email generation and the completion cache."""
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from .config import (
+    MAX_RETRIES,
+    GENERATION_TEMPERATURE,
+    GENERATION_MAX_TOKENS,
+    COMPLETION_CACHE_TTL_SECONDS,
+    COMPLETION_CACHE_MAX_ENTRIES,
+    OPENAI_MAX_CONNECTIONS,
+    OPENAI_TIMEOUT_SECONDS,
+)
+from .ratelimit import call_with_retries, estimate_request_tokens
+from .metrics import timed, record_usage, get_metrics
+
+@lru_cache(maxsize=None)
+def _create_openai_client(api_key):
+    """Build an OpenAI client on a pooled HTTP transport (one per API key)."""
+    import httpx
+    from openai import OpenAI
+
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_CONNECTIONS
+        ),
+        timeout=OPENAI_TIMEOUT_SECONDS
+    )
+    # Retries are handled by call_with_retries so they share the rate limiter
+    return OpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+
+def initialize_openai_client():
+    """Return the process-wide OpenAI client using API key from .env
+
+    The client and its keep-alive connections are shared across sessions.
+    Raises ValueError when the key is missing.
+    """
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY not found in .env file")
+    return _create_openai_client(api_key)
+
+def generate_email(client, prompt, model, stream=False, on_token=None, max_retries=MAX_RETRIES,
+                   max_tokens=GENERATION_MAX_TOKENS):
+    """Generate an email, optionally streaming tokens as they arrive.
+
+    on_token is called with the text received so far after each streamed
+    delta. The request goes through the shared rate limiter and transient
+    failures are retried with backoff before any token is received. Returns
+    the generated text and a dict with time_to_first_token and total_time in
+    seconds. The call is timed as the "completion" stage with its token usage.
+    """
+    with timed("completion", model=model, stream=stream) as details:
+        text, stats = _complete(client, prompt, model, stream, on_token, max_retries, max_tokens, details)
+        details["time_to_first_token"] = round(stats["time_to_first_token"], 6)
+    return text, stats
+
+def _complete(client, prompt, model, stream, on_token, max_retries, max_tokens, details):
+    """Run the chat completion for generate_email, recording token usage in details."""
+    start = time.perf_counter()
+    request = dict(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=GENERATION_TEMPERATURE,
+        max_tokens=max_tokens
+    )
+
+    tokens = estimate_request_tokens(prompt, max_tokens)
+
+    if not stream:
+        response = call_with_retries(lambda: client.chat.completions.create(**request), tokens, max_retries=max_retries)
+        record_usage(details, getattr(response, "usage", None), model)
+        total_time = time.perf_counter() - start
+        stats = {"time_to_first_token": total_time, "total_time": total_time}
+        return response.choices[0].message.content.strip(), stats
+
+    parts = []
+    time_to_first_token = None
+    response = call_with_retries(
+        lambda: client.chat.completions.create(
+            stream=True, stream_options={"include_usage": True}, **request
+        ),
+        tokens,
+        max_retries=max_retries
+    )
+    for chunk in response:
+        if not chunk.choices:
+            # With include_usage the last chunk carries the token counts and no choices
+            record_usage(details, getattr(chunk, "usage", None), model)
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if time_to_first_token is None:
+                time_to_first_token = time.perf_counter() - start
+            parts.append(delta)
+            if on_token:
+                on_token("".join(parts))
+
+    total_time = time.perf_counter() - start
+    stats = {
+        "time_to_first_token": time_to_first_token if time_to_first_token is not None else total_time,
+        "total_time": total_time
+    }
+    return "".join(parts).strip(), stats
+
+def generate_variants(client, prompt, model, n, max_retries=MAX_RETRIES, max_tokens=GENERATION_MAX_TOKENS):
+    """Generate n drafts from one prompt submission using the API's n parameter.
+
+    The prompt, attachments included, is paid for once; max_tokens applies
+    to each draft. Returns the drafts in the API's order and the same stats
+    dict as generate_email.
+    """
+    start = time.perf_counter()
+    with timed("completion", model=model, stream=False, variants=n) as details:
+        response = call_with_retries(
+            lambda: client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=GENERATION_TEMPERATURE,
+                max_tokens=max_tokens,
+                n=n
+            ),
+            estimate_request_tokens(prompt, max_tokens * n),
+            max_retries=max_retries
+        )
+        record_usage(details, getattr(response, "usage", None), model)
+    total_time = time.perf_counter() - start
+    choices = sorted(response.choices, key=lambda choice: choice.index)
+    texts = [(choice.message.content or "").strip() for choice in choices]
+    return texts, {"time_to_first_token": total_time, "total_time": total_time}
+
+class CompletionCache:
+    """TTL and size bounded cache of generated emails with in-flight coalescing.
+
+    Concurrent requests for the same key share a single computation: the
+    first caller runs it and the others wait for its result, so a double
+    click triggers only one API call.
+    """
+
+    def __init__(self, max_entries=COMPLETION_CACHE_MAX_ENTRIES, ttl_seconds=COMPLETION_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._inflight = {}  # key -> (threading.Event, result holder)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(prompt, model, temperature, max_tokens, n=1):
+        """Build the cache key for a fully built prompt and its generation settings."""
+        normalized = '\n'.join(line.strip() for line in prompt.strip().splitlines())
+        parts = [model, repr(temperature), repr(max_tokens), normalized]
+        if n != 1:
+            # Single completions keep the keys they had before variants existed
+            parts.append(f"n={n}")
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode('utf-8'))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get_or_compute(self, key, compute, bypass=False):
+        """Return (value, source) for key, calling compute() only when needed.
+
+        source is "cache", "coalesced" or "computed". With bypass=True the
+        cached value is ignored and replaced, but an identical request that
+        is already in flight is still shared.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and not bypass:
+                    value, expires_at = entry
+                    if expires_at > time.monotonic():
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        return value, "cache"
+                    del self._entries[key]
+
+                inflight = self._inflight.get(key)
+                if inflight is None:
+                    inflight = (threading.Event(), {})
+                    self._inflight[key] = inflight
+                    self.misses += 1
+                    break
+                self.coalesced += 1
+
+            done, holder = inflight
+            done.wait()
+            if 'value' in holder:
+                return holder['value'], "coalesced"
+            if 'error' in holder:
+                raise holder['error']
+            # The leader was interrupted (e.g. by a Streamlit rerun); try again ourselves
+
+        done, holder = inflight
+        try:
+            value = compute()
+            holder['value'] = value
+        except Exception as e:
+            holder['error'] = e
+            raise
+        else:
+            with self._lock:
+                self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            done.set()
+        return value, "computed"
+
+    def stats(self):
+        """Return hit/miss/coalesced counters and the current entry count."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": len(self._entries),
+            }
+
+@lru_cache(maxsize=None)
+def get_completion_cache():
+    """Return the process-wide completion cache shared by all sessions."""
+    return CompletionCache(COMPLETION_CACHE_MAX_ENTRIES, COMPLETION_CACHE_TTL_SECONDS)
+
+def generate_email_cached(client, prompt, model, stream=False, on_token=None, bypass_cache=False,
+                          max_tokens=GENERATION_MAX_TOKENS):
+    """Generate an email through the completion cache.
+
+    Returns the same (text, stats) pair as generate_email; stats also records
+    where the text came from under "source".
+    """
+    start = time.perf_counter()
+    key = CompletionCache.make_key(prompt, model, GENERATION_TEMPERATURE, max_tokens)
+    (text, stats), source = get_completion_cache().get_or_compute(
+        key,
+        lambda: generate_email(client, prompt, model, stream=stream, on_token=on_token, max_tokens=max_tokens),
+        bypass=bypass_cache
+    )
+    get_metrics().increment("completions", source=source, model=model)
+    if source != "computed":
+        elapsed = time.perf_counter() - start
+        stats = {"time_to_first_token": elapsed, "total_time": elapsed}
+    return text, dict(stats, source=source)
+
+def generate_variants_cached(client, prompt, model, n, bypass_cache=False, max_tokens=GENERATION_MAX_TOKENS):
+    """generate_variants through the completion cache; stats also record the source."""
+    start = time.perf_counter()
+    key = CompletionCache.make_key(prompt, model, GENERATION_TEMPERATURE, max_tokens, n=n)
+    (texts, stats), source = get_completion_cache().get_or_compute(
+        key,
+        lambda: generate_variants(client, prompt, model, n, max_tokens=max_tokens),
+        bypass=bypass_cache
+    )
+    get_metrics().increment("completions", source=source, model=model)
+    if source != "computed":
+        elapsed = time.perf_counter() - start
+        stats = {"time_to_first_token": elapsed, "total_time": elapsed}
+    return texts, dict(stats, source=source)
@@ -0,0 +1,294 @@
+"""Building and maintaining the generated email history."""
+
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+from .config import MAX_HISTORY_ITEMS, HISTORY_DB_PATH
+from .metrics import timed
+
+def extract_subject(email_content):
+    """Extract subject line from email content"""
+    with timed("extract_subject"):
+        for line in email_content.split('\n'):
+            if line.startswith('Subject:'):
+                return line.replace('Subject:', '').strip()
+        return "No Subject"
+
+def build_email_record(generated_email, params, preset_name=None, token_counts=None):
+    """Build the history record for a generated email from its prompt parameters.
+
+    token_counts, as returned by build_email_request (optionally with
+    output_tokens), is stored under metadata["tokens"].
+    """
+    record = {
+        "content": generated_email,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
+        "favorite": False,
+        "metadata": {
+            "tone": params['tone'],
+            "recipient": params['recipient_name'],
+            "language": params['language'],
+            "writing_style": params['writing_style'],
+            "email_length": params['email_length'],
+            "subject": extract_subject(generated_email),
+            "purpose": params['email_purpose'][:50],
+            "preset": preset_name if preset_name != "Custom Email" else None
+        }
+    }
+    if token_counts:
+        record["metadata"]["tokens"] = token_counts
+    return record
+
+def _day_start(day):
+    """Return the local epoch time at which a datetime.date begins."""
+    return datetime(day.year, day.month, day.day).timestamp()
+
+class HistoryStore:
+    """SQLite-backed email history with stable record IDs.
+
+    Records keep the same shape as build_email_record plus an "id". The
+    columns used for lookups (timestamp, favorite, preset, recipient, tone,
+    language) are indexed per user, so listing a page or the favorites never
+    scans the whole table and fetching a record by ID is a primary-key
+    lookup. An FTS5 index over subject, recipient, purpose and body backs
+    search().
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS emails (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            favorite INTEGER NOT NULL DEFAULT 0,
+            subject TEXT,
+            recipient TEXT,
+            tone TEXT,
+            language TEXT,
+            preset TEXT,
+            metadata TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_emails_user_created ON emails (user_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_emails_user_favorite ON emails (user_id, favorite, created_at);
+        CREATE INDEX IF NOT EXISTS idx_emails_user_preset ON emails (user_id, preset, created_at);
+        CREATE INDEX IF NOT EXISTS idx_emails_user_recipient ON emails (user_id, recipient, created_at);
+        CREATE INDEX IF NOT EXISTS idx_emails_user_tone ON emails (user_id, tone, created_at);
+        CREATE INDEX IF NOT EXISTS idx_emails_user_language ON emails (user_id, language, created_at);
+    """
+
+    # Full-text index over subject, recipient, purpose and body, kept in sync by triggers
+    SEARCH_SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts USING fts5(
+            subject, recipient, purpose, content, tokenize = 'unicode61 remove_diacritics 2'
+        );
+        CREATE TRIGGER IF NOT EXISTS emails_fts_insert AFTER INSERT ON emails BEGIN
+            INSERT INTO emails_fts (rowid, subject, recipient, purpose, content)
+            VALUES (new.id, new.subject, new.recipient, json_extract(new.metadata, '$.purpose'), new.content);
+        END;
+        CREATE TRIGGER IF NOT EXISTS emails_fts_delete AFTER DELETE ON emails BEGIN
+            DELETE FROM emails_fts WHERE rowid = old.id;
+        END;
+    """
+
+    # bm25 column weights: a match in the subject counts most, the body least
+    SEARCH_WEIGHTS = (10.0, 5.0, 3.0, 1.0)
+
+    def __init__(self, path=HISTORY_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            # WAL lets the CLI and workers read while the app writes
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        has_search_index = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'emails_fts'"
+        ).fetchone()
+        self._conn.executescript(self.SEARCH_SCHEMA)
+        if not has_search_index:
+            # Index the records of a database created before search existed
+            self._conn.execute(
+                """INSERT INTO emails_fts (rowid, subject, recipient, purpose, content)
+                   SELECT id, subject, recipient, json_extract(metadata, '$.purpose'), content FROM emails"""
+            )
+        self._conn.commit()
+
+    @staticmethod
+    def _to_record(row):
+        record = {
+            "id": row["id"],
+            "timestamp": row["timestamp"],
+            "favorite": bool(row["favorite"]),
+            "metadata": json.loads(row["metadata"]),
+        }
+        if "content" in row.keys():
+            record["content"] = row["content"]
+        return record
+
+    def add(self, record, user_id="default"):
+        """Insert a record built by build_email_record and return its ID."""
+        metadata = record["metadata"]
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                """INSERT INTO emails (user_id, content, timestamp, created_at, favorite,
+                                       subject, recipient, tone, language, preset, metadata)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    user_id, record["content"], record["timestamp"], time.time(),
+                    int(record.get("favorite", False)), metadata.get("subject"),
+                    metadata.get("recipient"), metadata.get("tone"), metadata.get("language"),
+                    metadata.get("preset"), json.dumps(metadata, ensure_ascii=False),
+                )
+            )
+            return cursor.lastrowid
+
+    def get(self, record_id, user_id="default"):
+        """Return a user's record with this ID, or None if there is none or it belongs to someone else."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM emails WHERE id = ? AND user_id = ?", (record_id, user_id)
+            ).fetchone()
+        return self._to_record(row) if row else None
+
+    def list(self, user_id="default", limit=MAX_HISTORY_ITEMS, offset=0, favorites_only=False,
+             include_content=True):
+        """Return a page of a user's records, newest first.
+
+        With include_content=False the email bodies are not read, which keeps
+        listing a page cheap; fetch a body with get() when it is needed.
+        """
+        columns = "*" if include_content else "id, timestamp, favorite, metadata"
+        query = f"SELECT {columns} FROM emails WHERE user_id = ?"
+        if favorites_only:
+            query += " AND favorite = 1"
+        query += " ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._conn.execute(query, (user_id, limit, offset)).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    def count(self, user_id="default", favorites_only=False):
+        """Return how many records a user has (optionally only favorites)."""
+        query = "SELECT COUNT(*) FROM emails WHERE user_id = ?"
+        if favorites_only:
+            query += " AND favorite = 1"
+        with self._lock:
+            return self._conn.execute(query, (user_id,)).fetchone()[0]
+
+    @staticmethod
+    def _match_expression(query):
+        """Turn free text into an FTS5 query: every word must match, the last one as a prefix."""
+        terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+        if terms:
+            terms[-1] += "*"
+        return " ".join(terms)
+
+    def _search_filters(self, user_id, query, tone, preset, language, date_from, date_to, favorites_only):
+        """Build the FROM/WHERE clause and parameters shared by search and search_count."""
+        clauses, params = ["e.user_id = ?"], [user_id]
+        match = self._match_expression(query or "")
+        source = "emails AS e"
+        if match:
+            # CROSS JOIN makes SQLite drive the query from the full-text matches
+            source = "emails_fts CROSS JOIN emails AS e ON e.id = emails_fts.rowid"
+            clauses.append("emails_fts MATCH ?")
+            params.append(match)
+        for column, value in (("tone", tone), ("preset", preset), ("language", language)):
+            if value:
+                clauses.append(f"e.{column} = ?")
+                params.append(value)
+        if date_from is not None:
+            clauses.append("e.created_at >= ?")
+            params.append(_day_start(date_from))
+        if date_to is not None:
+            clauses.append("e.created_at < ?")
+            params.append(_day_start(date_to) + 86400)
+        if favorites_only:
+            clauses.append("e.favorite = 1")
+        return f"FROM {source} WHERE {' AND '.join(clauses)}", params, bool(match)
+
+    def search(self, user_id="default", query="", tone=None, preset=None, language=None,
+               date_from=None, date_to=None, favorites_only=False, limit=MAX_HISTORY_ITEMS,
+               offset=0, include_content=False):
+        """Return a user's records matching a full-text query and filters.
+
+        The query is matched against subject, recipient, purpose and body and
+        results are ranked by BM25; without a query they are newest first.
+        date_from and date_to are inclusive datetime.date bounds. Each record
+        gets a "snippet" of the body around the matched words.
+        """
+        where, params, ranked = self._search_filters(
+            user_id, query, tone, preset, language, date_from, date_to, favorites_only
+        )
+        columns = "e.*" if include_content else "e.id, e.timestamp, e.favorite, e.metadata"
+        if ranked:
+            weights = ", ".join(str(weight) for weight in self.SEARCH_WEIGHTS)
+            columns += ", snippet(emails_fts, 3, '**', '**', '…', 12) AS snippet"
+            order = f"bm25(emails_fts, {weights}), e.created_at DESC"
+        else:
+            order = "e.created_at DESC, e.id DESC"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {columns} {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        records = []
+        for row in rows:
+            record = self._to_record(row)
+            if ranked:
+                record["snippet"] = row["snippet"]
+            records.append(record)
+        return records
+
+    def search_count(self, user_id="default", query="", tone=None, preset=None, language=None,
+                     date_from=None, date_to=None, favorites_only=False):
+        """Return how many records search() would match without a limit."""
+        where, params, _ = self._search_filters(
+            user_id, query, tone, preset, language, date_from, date_to, favorites_only
+        )
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) {where}", params).fetchone()[0]
+
+    def search_ids(self, user_id="default", query="", tone=None, preset=None, language=None,
+                   date_from=None, date_to=None, favorites_only=False):
+        """Return the IDs of every record search() would match, oldest first."""
+        where, params, _ = self._search_filters(
+            user_id, query, tone, preset, language, date_from, date_to, favorites_only
+        )
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT e.id {where} ORDER BY e.created_at, e.id", params
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def set_favorite(self, record_id, favorite, user_id="default"):
+        """Mark or unmark one of a user's records as favorite; returns whether it was found."""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "UPDATE emails SET favorite = ? WHERE id = ? AND user_id = ?", (int(favorite), record_id, user_id)
+            ).rowcount > 0
+
+    def delete(self, record_id, user_id="default"):
+        """Delete one of a user's records; returns whether it was found."""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM emails WHERE id = ? AND user_id = ?", (record_id, user_id)
+            ).rowcount > 0
+
+    def clear(self, user_id="default"):
+        """Delete all of a user's records."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM emails WHERE user_id = ?", (user_id,))
+
+    def close(self):
+        self._conn.close()
+
+@lru_cache(maxsize=None)
+def get_history_store(path=HISTORY_DB_PATH):
+    """Return the process-wide history store for a database path."""
+    return HistoryStore(path)
@@ -0,0 +1,155 @@
+"""Background generation jobs.
+
+Generation runs on a process-wide worker pool rather than inside the
+Streamlit script, so a rerun caused by a widget interaction no longer
+discards the request, and a user can queue several drafts while editing.
+A job moves from queued to running to done or failed; the worker writes
+finished emails to the history store and keeps the streamed text so far in
+the job's partial field for the UI to poll.
+"""
+
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from .config import JOB_WORKERS, JOB_MAX_PENDING_PER_USER, JOB_MAX_FINISHED
+from .pipeline import generate_record
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+PENDING_STATUSES = ("queued", "running")
+
+class JobQueue:
+    """Thread pool of email generations, tracked by job id."""
+
+    def __init__(self, workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING_PER_USER,
+                 max_finished=JOB_MAX_FINISHED, history_store=None):
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.history_store = history_store
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="email-job")
+        self._jobs = OrderedDict()  # job id -> job dict, oldest first
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, params, model, user_id, preset_name=None, stream=False, bypass_cache=False, variants=1):
+        """Queue one email for params on behalf of user_id and return its job id.
+
+        Jobs are only listed, opened, cancelled or dismissed by the user that
+        submitted them, and the pending limit is per user. With variants > 1
+        the job asks for that many drafts in one completion (not streamed),
+        saves the best-ranked one and keeps all of them, ranked, under
+        "variants". Raises ValueError when the user already has max_pending
+        jobs queued or running.
+        """
+        with self._lock:
+            pending = sum(
+                1 for job in self._jobs.values()
+                if job['user_id'] == user_id and job['status'] in PENDING_STATUSES
+            )
+            if pending >= self.max_pending:
+                raise ValueError(f"{pending} emails are already being generated; wait for one to finish")
+            job = {
+                'id': uuid.uuid4().hex,
+                'user_id': user_id,
+                'status': "queued",
+                'recipient_name': params.get('recipient_name', ''),
+                'email_purpose': params.get('email_purpose', ''),
+                'model': model,
+                'created_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'partial': "",
+                'email': None,
+                'email_id': None,
+                'stats': None,
+                'variants': None,
+                'error': None,
+            }
+            self._jobs[job['id']] = job
+            self._futures[job['id']] = self._executor.submit(
+                self._run, job['id'], params, model, user_id, preset_name, stream, bypass_cache, variants
+            )
+        return job['id']
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _run(self, job_id, params, model, user_id, preset_name, stream, bypass_cache, variants):
+        self._update(job_id, status="running", started_at=time.time())
+        try:
+            record = generate_record(
+                params,
+                model,
+                preset_name,
+                stream=stream,
+                on_token=lambda text: self._update(job_id, partial=text),
+                bypass_cache=bypass_cache,
+                variants=variants,
+                user_id=user_id,
+                store=self.history_store
+            )
+            self._update(
+                job_id,
+                status="done",
+                email=record['content'],
+                email_id=record['id'],
+                variants=record.get('variants'),
+                stats=record['stats'],
+                finished_at=time.time()
+            )
+        except Exception as e:
+            self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+        finally:
+            self._prune()
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond max_finished."""
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job['status'] not in PENDING_STATUSES]
+            for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[job_id]
+                self._futures.pop(job_id, None)
+
+    def _owned(self, job_id, user_id):
+        job = self._jobs.get(job_id)
+        return job if job and job['user_id'] == user_id else None
+
+    def get(self, job_id, user_id):
+        """Return a copy of a user's job, or None if it is unknown, was pruned or is someone else's."""
+        with self._lock:
+            job = self._owned(job_id, user_id)
+            return dict(job) if job else None
+
+    def list(self, user_id):
+        """Return copies of a user's jobs, newest first."""
+        with self._lock:
+            return [dict(job) for job in reversed(self._jobs.values()) if job['user_id'] == user_id]
+
+    def cancel(self, job_id, user_id):
+        """Cancel a user's job that has not started yet; returns whether it was cancelled."""
+        with self._lock:
+            future = self._futures.get(job_id) if self._owned(job_id, user_id) else None
+            if future is None or not future.cancel():
+                return False
+            self._jobs[job_id].update(status="failed", error="Cancelled", finished_at=time.time())
+            return True
+
+    def dismiss(self, job_id, user_id):
+        """Remove a user's finished job from the queue listing."""
+        with self._lock:
+            job = self._owned(job_id, user_id)
+            if job and job['status'] not in PENDING_STATUSES:
+                del self._jobs[job_id]
+                self._futures.pop(job_id, None)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+@lru_cache(maxsize=None)
+def get_job_queue():
+    """Return the process-wide job queue shared by all sessions."""
+    return JobQueue()
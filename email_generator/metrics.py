@@ -0,0 +1,172 @@
+"""Per-stage latency and token metrics.
+
+Pipeline stages (extraction, prompt building, the chat completion, subject
+extraction, PDF rendering) are timed with timed() and recorded in a
+process-wide registry. The registry keeps a sliding window of samples per
+stage for p50/p95/p99, cumulative counts and sums, and token counters. It
+can render Prometheus text, writes one JSON line per sample to
+METRICS_LOG_PATH, and writes the Prometheus text to METRICS_PROMETHEUS_PATH
+on flush(). collect_stages() gathers the samples of one request, e.g. for
+the sidebar breakdown.
+"""
+
+import os
+import math
+import json
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+
+from .config import METRICS_WINDOW, METRICS_QUANTILES, METRICS_LOG_PATH, METRICS_PROMETHEUS_PATH
+
+logger = logging.getLogger("email_generator.metrics")
+
+# Samples recorded for the current request, when collect_stages() is active
+_current_stages = contextvars.ContextVar("current_stages", default=None)
+
+def _quantile(sorted_values, q):
+    """Nearest-rank quantile of an already sorted list."""
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def _labels(labels):
+    return ",".join(f'{name}="{value}"' for name, value in sorted(labels.items()))
+
+class MetricsRegistry:
+    """Thread-safe store of stage latencies and counters."""
+
+    def __init__(self, window=METRICS_WINDOW, prometheus_path=METRICS_PROMETHEUS_PATH):
+        self.window = window
+        self.prometheus_path = prometheus_path
+        self._samples = {}  # stage -> deque of the latest durations
+        self._totals = {}  # stage -> [count, sum of seconds]
+        self._counters = {}  # (name, sorted label items) -> value
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds, **fields):
+        """Record one duration for a stage; fields go to the JSON log and the request breakdown."""
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+                self._totals[stage] = [0, 0.0]
+            samples.append(seconds)
+            totals = self._totals[stage]
+            totals[0] += 1
+            totals[1] += seconds
+
+        sample = dict(fields, stage=stage, seconds=round(seconds, 6))
+        stages = _current_stages.get()
+        if stages is not None:
+            stages.append(sample)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(dict(sample, ts=round(time.time(), 3)), ensure_ascii=False, default=str))
+
+    def increment(self, name, value=1, **labels):
+        """Add value to a counter, e.g. increment("completion_tokens", 812, model="gpt-4o")."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def snapshot(self):
+        """Return {stage: {count, sum, p50, p95, p99}} with quantiles over the sliding window."""
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items()}
+            totals = {stage: list(values) for stage, values in self._totals.items()}
+        report = {}
+        for stage, values in samples.items():
+            entry = {"count": totals[stage][0], "sum": totals[stage][1]}
+            for q in METRICS_QUANTILES:
+                entry[f"p{round(q * 100)}"] = _quantile(values, q)
+            report[stage] = entry
+        return report
+
+    def counters(self):
+        """Return {(name, labels tuple): value} for every counter."""
+        with self._lock:
+            return dict(self._counters)
+
+    def prometheus_text(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP email_generator_stage_seconds Wall-clock time per pipeline stage.",
+            "# TYPE email_generator_stage_seconds summary",
+        ]
+        for stage, entry in sorted(self.snapshot().items()):
+            for q in METRICS_QUANTILES:
+                labels = _labels({"stage": stage, "quantile": q})
+                lines.append(f"email_generator_stage_seconds{{{labels}}} {entry[f'p{round(q * 100)}']:.6f}")
+            lines.append(f'email_generator_stage_seconds_sum{{stage="{stage}"}} {entry["sum"]:.6f}')
+            lines.append(f'email_generator_stage_seconds_count{{stage="{stage}"}} {entry["count"]}')
+
+        typed = set()
+        for (name, labels), value in sorted(self.counters().items()):
+            metric = f"email_generator_{name}_total"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{{{_labels(dict(labels))}}} {value}" if labels else f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """Write the Prometheus text to prometheus_path (if set), replacing the file atomically."""
+        if not self.prometheus_path:
+            return
+        directory = os.path.dirname(self.prometheus_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.prometheus_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, self.prometheus_path)
+
+@lru_cache(maxsize=None)
+def get_metrics():
+    """Return the process-wide metrics registry, attaching the JSON log file on first use."""
+    if METRICS_LOG_PATH:
+        handler = logging.FileHandler(METRICS_LOG_PATH, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return MetricsRegistry()
+
+@contextmanager
+def timed(stage, **fields):
+    """Time the enclosed block as one sample of stage.
+
+    Yields a dict the block can add fields to (token counts, sizes, ...). A
+    block that raises is recorded with error set to the exception type.
+    """
+    details = dict(fields)
+    start = time.perf_counter()
+    try:
+        yield details
+    except BaseException as e:
+        details["error"] = type(e).__name__
+        raise
+    finally:
+        get_metrics().observe(stage, time.perf_counter() - start, **details)
+
+def record_usage(details, usage, model):
+    """Copy a completion's token usage into a timed() details dict and the token counters."""
+    if usage is None:
+        return
+    details.update(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+    metrics = get_metrics()
+    metrics.increment("prompt_tokens", usage.prompt_tokens, model=model)
+    metrics.increment("completion_tokens", usage.completion_tokens, model=model)
+
+@contextmanager
+def collect_stages():
+    """Collect the samples recorded in this context (thread) into the yielded list."""
+    stages = []
+    token = _current_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _current_stages.reset(token)
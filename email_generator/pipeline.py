@@ -0,0 +1,71 @@
+"""One email from parameters to a history record.
+
+The job queue, the HTTP service and the command line all generate through
+generate_record, so they build the request, rank variants, reject empty
+completions and save to the history in the same way.
+"""
+
+from .prompt import build_email_request
+from .tokens import count_tokens
+from .generation import initialize_openai_client, generate_email_cached, generate_variants_cached
+from .history import build_email_record, get_history_store
+from .variants import rank_variants
+from .metrics import get_metrics, collect_stages
+
+def generate_record(params, model, preset_name=None, stream=False, on_token=None, bypass_cache=False,
+                    variants=1, user_id=None, store=None):
+    """Run the pipeline for one email and return its history record with stats.
+
+    With variants > 1 one completion returns that many drafts (not
+    streamed); the best ranked becomes the email and all of them are listed
+    under "variants", each with a record to save if picked. The record is
+    saved to the history of user_id (in store, default the shared one)
+    unless user_id is None. Raises when the model returns an empty email.
+    """
+    ranked = None
+    try:
+        with collect_stages() as stages:
+            client = initialize_openai_client()
+            request = build_email_request(params, model)
+            if variants > 1:
+                texts, stats = generate_variants_cached(
+                    client,
+                    request['prompt'],
+                    model,
+                    variants,
+                    bypass_cache=bypass_cache,
+                    max_tokens=request['max_tokens']
+                )
+                ranked = rank_variants(texts, params)
+                email = ranked[0]['email']
+            else:
+                email, stats = generate_email_cached(
+                    client,
+                    request['prompt'],
+                    model,
+                    stream=stream,
+                    on_token=on_token,
+                    bypass_cache=bypass_cache,
+                    max_tokens=request['max_tokens']
+                )
+            if not email:
+                raise Exception("the model returned an empty email")
+            token_counts = dict(request['token_counts'], output_tokens=count_tokens(email, model))
+            record = build_email_record(email, params, preset_name, token_counts)
+            if ranked:
+                # Only the best draft is saved; the others keep a record to save if picked
+                for variant in ranked[1:]:
+                    variant['record'] = build_email_record(
+                        variant['email'], params, preset_name,
+                        dict(request['token_counts'], output_tokens=count_tokens(variant['email'], model))
+                    )
+        if user_id is not None:
+            record['id'] = (store or get_history_store()).add(record, user_id)
+            if ranked:
+                ranked[0]['email_id'] = record['id']
+        record['stats'] = dict(stats, tokens=token_counts, stages=stages)
+        if ranked:
+            record['variants'] = ranked
+        return record
+    finally:
+        get_metrics().flush()
@@ -0,0 +1,146 @@
+"""Prompt construction for email generation."""
+
+from .config import DEFAULT_MODEL, CHARS_PER_TOKEN_CEILING, RETRIEVAL_SCAN_FACTOR, RETRIEVAL_SCAN_CHARS
+from .extraction import extract_attachments
+from .tokens import count_tokens, truncate_to_tokens, fair_shares, plan_token_budget, tokenizer_name
+from .retrieval import query_terms, select_chunks, join_chunks
+from .compaction import compact_texts
+from .metrics import timed
+
+FILE_SECTION_INTRO = "Incorporate relevant information from these attached files:\n"
+TRUNCATION_NOTE = "\n[Content truncated]"
+DRAFT_SECTION = """
+    Start from this draft, filled in from a template. Keep the wording and the details it already
+    has, replace every remaining [placeholder] using the specifications above (leave out a
+    sentence when nothing fits it), and polish the result into a finished email:
+
+{draft}
+"""
+
+def render_email_prompt(params, file_section):
+    """Fill the email prompt template with the parameters and an attachment section.
+
+    When params has a "draft" (a locally filled preset template), the model
+    is asked to complete and polish it rather than write from scratch.
+    """
+    prompt = f"""
+    Compose a {params['tone'].lower()} email in {params['language']} with these specifications:
+    
+    - Sender: {params['user_name']} ({params['user_role']})
+    - Recipient: {params['recipient_name']} ({params['recipient_role']})
+    - Purpose: {params['email_purpose']}
+    - Background: {params['background_info']}
+    - Special instructions: {params['special_instructions']}
+    
+    {file_section}
+    
+    Structure:
+    1. Clear subject line
+    2. Appropriate greeting
+    3. Well-structured body
+    4. Professional closing
+    5. Mention of attachments if applicable
+    
+    Style Guidelines:
+    - Maintain {params['writing_style'].lower()} style
+    - Keep length {params['email_length'].lower()}
+    - Use proper business email formatting
+    - Highlight key points from file content when relevant
+    """
+    if params.get('draft'):
+        prompt += DRAFT_SECTION.format(draft=params['draft'])
+    return prompt
+
+def build_email_request(params, model=DEFAULT_MODEL):
+    """Construct the prompt for email generation within the model's token budget.
+
+    Attachment text is counted in tokens for the model: the attachments share
+    what the context window leaves after the instructions and the output
+    allowance for email_length. Attachments are compacted first (boilerplate
+    and content repeated across files removed). When they still do not fit,
+    the chunks most relevant to the purpose, background and instructions are
+    kept (BM25); without any of those, each file keeps a fair share from its
+    start. Returns a dict with "prompt", "max_tokens" (the output allowance)
+    and "token_counts". Timed as the "build_prompt" stage.
+    """
+    with timed("build_prompt", model=model) as details:
+        instruction_tokens = count_tokens(render_email_prompt(params, ""), model)
+        budget = plan_token_budget(model, instruction_tokens, params.get('email_length'))
+
+        file_contents = []
+        truncated = False
+        compaction = None
+        if params.get('uploaded_files'):
+            files = params['uploaded_files']
+            headers = [f"=== Content from {file.name} ===\n" for file in files]
+            # Reserve room for the framing so only attachment text draws on the budget
+            framing = count_tokens(FILE_SECTION_INTRO + ''.join(headers) + TRUNCATION_NOTE, model)
+            text_budget = max(0, budget['attachment_budget'] - framing)
+            prefix_chars = text_budget * CHARS_PER_TOKEN_CEILING
+            query = '\n'.join(
+                params.get(key) or "" for key in ('email_purpose', 'background_info', 'special_instructions')
+            )
+            ranked = bool(query_terms(query))
+            # With something to rank against, read a few budgets' worth so later sections can compete;
+            # with several files, so the budget freed by dropping repeated content can be refilled
+            scan_chars = prefix_chars
+            if ranked or len(files) > 1:
+                scan_chars = max(prefix_chars, min(prefix_chars * RETRIEVAL_SCAN_FACTOR, RETRIEVAL_SCAN_CHARS))
+            contents = extract_attachments(files, budget=scan_chars)
+            with timed("compaction") as compaction_details:
+                texts, compaction = compact_texts(
+                    [content for content, _ in contents], lambda text: count_tokens(text, model)
+                )
+                compaction_details.update(
+                    chars_saved=compaction['chars_saved'],
+                    tokens_saved=compaction['tokens_saved']
+                )
+            contents = [(text, complete) for text, (_, complete) in zip(texts, contents)]
+
+            total_chars = sum(len(text) for text in texts)
+            fits = total_chars <= prefix_chars and sum(count_tokens(text, model) for text in texts) <= text_budget
+            if fits or not ranked:
+                shares = fair_shares([count_tokens(text, model) for text in texts], text_budget)
+                for header, (content, complete), share in zip(headers, contents, shares):
+                    content, cut = truncate_to_tokens(content, share, model)
+                    file_contents.append(f"{header}{content}\n")
+                    truncated = truncated or cut or not complete
+            else:
+                # Keep the chunks most relevant to the email rather than the first ones
+                selections = select_chunks(texts, query, text_budget, lambda text: count_tokens(text, model))
+                for header, parts in zip(headers, selections):
+                    file_contents.append(f"{header}{join_chunks(parts)}\n")
+                truncated = True
+    
+        combined_content = '\n'.join(file_contents)
+        if truncated:
+            combined_content += TRUNCATION_NOTE
+
+        file_section = (
+            f"{FILE_SECTION_INTRO}{combined_content}"
+            if combined_content else "No file content available"
+        )
+        prompt = render_email_prompt(params, file_section)
+
+        request = {
+            "prompt": prompt,
+            "max_tokens": budget['max_output_tokens'],
+            "token_counts": {
+                "tokenizer": tokenizer_name(model),
+                "context_window": budget['context_window'],
+                "prompt_tokens": count_tokens(prompt, model),
+                "attachment_tokens": count_tokens(combined_content, model) if combined_content else 0,
+                "attachments_truncated": truncated,
+                "compaction": compaction,
+                "max_output_tokens": budget['max_output_tokens'],
+            },
+        }
+        details.update(
+            attachments=len(params.get('uploaded_files') or []),
+            prompt_tokens=request['token_counts']['prompt_tokens']
+        )
+    return request
+
+def build_email_prompt(params, model=DEFAULT_MODEL):
+    """Construct the prompt for email generation."""
+    return build_email_request(params, model)['prompt']
@@ -0,0 +1,156 @@
+"""Client-side rate limiting and retry backoff for OpenAI requests."""
+
+import time
+import random
+import asyncio
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+
+from .config import (
+    MAX_RETRIES,
+    GENERATION_MAX_TOKENS,
+    OPENAI_REQUESTS_PER_MINUTE,
+    OPENAI_TOKENS_PER_MINUTE,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+class RateLimiter:
+    """Thread-safe token buckets for requests-per-minute and tokens-per-minute quotas."""
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens):
+        """Take one request and `tokens` tokens if both are available.
+
+        Returns 0 on success, otherwise the number of seconds to wait before
+        trying again.
+        """
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+        tokens = min(tokens, self.tpm)
+        if self._requests >= 1 and self._tokens >= tokens:
+            self._requests -= 1
+            self._tokens -= tokens
+            return 0
+        return max(
+            (1 - self._requests) * 60 / self.rpm,
+            (tokens - self._tokens) * 60 / self.tpm,
+            0.01
+        )
+
+    def acquire(self, tokens):
+        """Block until one request and the given number of tokens fit within the quotas."""
+        while True:
+            with self._lock:
+                wait = self._reserve(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+class AsyncRateLimiter:
+    """Asyncio front end to a RateLimiter's buckets; waiters are served in arrival order.
+
+    Pass limiter=get_rate_limiter() to draw from the process-wide quota that
+    the threaded callers use, instead of separate buckets of its own.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, limiter=None):
+        self.limiter = limiter or RateLimiter(requests_per_minute, tokens_per_minute)
+        self._async_lock = asyncio.Lock()
+
+    async def acquire(self, tokens):
+        """Wait until one request and the given number of tokens fit within the quotas."""
+        async with self._async_lock:
+            while True:
+                with self.limiter._lock:
+                    wait = self.limiter._reserve(tokens)
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+
+@lru_cache(maxsize=None)
+def get_rate_limiter():
+    """Return the process-wide limiter shared by every session's API calls."""
+    return RateLimiter(OPENAI_REQUESTS_PER_MINUTE, OPENAI_TOKENS_PER_MINUTE)
+
+def estimate_request_tokens(prompt, max_tokens=GENERATION_MAX_TOKENS):
+    """Roughly estimate the tokens a request consumes for rate limiting (about 4 characters per token)."""
+    return len(prompt) // 4 + max_tokens
+
+def is_retryable(error):
+    """Return True for errors worth retrying: timeouts, connection errors, 408/409/429 and 5xx."""
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    import openai
+    return isinstance(error, openai.APIConnectionError)
+
+def retry_after_seconds(error):
+    """Return the server's requested wait from Retry-After(-ms) headers, or None."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        value = headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, retry_after=None):
+    """Seconds to wait before retry number `attempt` (0-based).
+
+    A server-provided Retry-After is honoured (stretched by up to 20% so
+    waiting clients do not retry in lockstep); otherwise exponential backoff
+    with full jitter is used. Both are capped at RETRY_MAX_DELAY.
+    """
+    if retry_after is not None:
+        return min(RETRY_MAX_DELAY, retry_after * random.uniform(1.0, 1.2))
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+def call_with_retries(call, tokens, limiter=None, max_retries=MAX_RETRIES):
+    """Run call() through the rate limiter, retrying transient failures.
+
+    max_retries is the total number of attempts.
+    """
+    limiter = limiter or get_rate_limiter()
+    for attempt in range(max_retries):
+        limiter.acquire(tokens)
+        try:
+            return call()
+        except Exception as e:
+            if attempt == max_retries - 1 or not is_retryable(e):
+                raise
+            time.sleep(backoff_delay(attempt, retry_after_seconds(e)))
+
+async def async_call_with_retries(call, tokens, limiter, max_retries=MAX_RETRIES):
+    """Async variant of call_with_retries; call() returns an awaitable."""
+    for attempt in range(max_retries):
+        await limiter.acquire(tokens)
+        try:
+            return await call()
+        except Exception as e:
+            if attempt == max_retries - 1 or not is_retryable(e):
+                raise
+            await asyncio.sleep(backoff_delay(attempt, retry_after_seconds(e)))
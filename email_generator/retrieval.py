@@ -0,0 +1,131 @@
+"""Offline relevance ranking of attachment text.
+
+When attachments do not fit the prompt budget, their text is split into
+chunks, the chunks are scored with BM25 against the email's purpose,
+background and instructions, and the best ones are packed into the budget.
+Everything runs locally; numpy is only imported when ranking is needed.
+"""
+
+import re
+import string
+
+from .config import RETRIEVAL_CHUNK_CHARS, RETRIEVAL_FIT_ATTEMPTS, BM25_K1, BM25_B
+from .tokens import CJK_CHARS
+
+# CJK text has no spaces, so each character is its own term
+_TERM = re.compile(rf"[{CJK_CHARS}]|[^\W_]+")
+_CJK = re.compile(rf"[{CJK_CHARS}]")
+_PUNCTUATION = str.maketrans({char: ' ' for char in string.punctuation + '‘’“”–—…•·«»'})
+
+# Common words that would otherwise dominate short queries
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have i in is it its me my of on or our so that the their
+them they this to us was we were will with you your about would should could please email
+""".split())
+
+def query_terms(text):
+    """Return the distinct search terms in a query, lowercased and without stopwords."""
+    return sorted(set(chunk_terms(text)) - STOPWORDS)
+
+def chunk_terms(chunk):
+    """Return the lowercased terms of a chunk.
+
+    Splitting on whitespace after blanking out ASCII punctuation is several
+    times faster than a regex scan; the regex is only used for CJK text.
+    """
+    text = chunk.lower()
+    if _CJK.search(text):
+        return _TERM.findall(text)
+    return text.translate(_PUNCTUATION).split()
+
+def split_chunks(text, chunk_chars=RETRIEVAL_CHUNK_CHARS):
+    """Split text into chunks of about chunk_chars characters, breaking at line ends where possible."""
+    chunks = []
+    current = []
+    size = 0
+    for line in text.split('\n'):
+        while len(line) > chunk_chars:
+            # Hard-split lines longer than a chunk
+            if current:
+                chunks.append('\n'.join(current))
+                current, size = [], 0
+            chunks.append(line[:chunk_chars])
+            line = line[chunk_chars:]
+        if size + len(line) > chunk_chars and current:
+            chunks.append('\n'.join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current and any(part.strip() for part in current):
+        chunks.append('\n'.join(current))
+    return chunks
+
+def bm25_scores(chunks, terms, k1=BM25_K1, b=BM25_B):
+    """Score every chunk against the query terms with BM25 and return a list of floats.
+
+    Term frequencies are collected into a chunk-by-term matrix so the
+    scoring itself is a handful of vectorized numpy operations.
+    """
+    import numpy as np
+
+    if not chunks or not terms:
+        return [0.0] * len(chunks)
+    term_ids = {term: i for i, term in enumerate(terms)}
+    term_set = set(terms)
+    lengths = np.empty(len(chunks))
+    tf = np.zeros((len(chunks), len(terms)))
+    for row, chunk in enumerate(chunks):
+        tokens = chunk_terms(chunk)
+        lengths[row] = len(tokens)
+        for term in term_set.intersection(tokens):
+            tf[row, term_ids[term]] = tokens.count(term)
+
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((len(chunks) - df + 0.5) / (df + 0.5))
+    norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1.0))
+    scores = (tf * (k1 + 1) / (tf + norm[:, None])) @ idf
+    return scores.tolist()
+
+def select_chunks(texts, query, budget, count_tokens):
+    """Pick the most relevant chunks of several texts that fit in budget tokens.
+
+    texts is a list of attachment texts and count_tokens a function returning
+    the token count of a string. Chunks are ranked across all texts together;
+    ties keep document order, so without matching terms this degrades to
+    taking each text from the start. Returns, per text, the selected chunks
+    in their original order as a list of (position, chunk) pairs.
+    """
+    chunks = [(t, position, chunk) for t, text in enumerate(texts)
+              for position, chunk in enumerate(split_chunks(text))]
+    scores = bm25_scores([chunk for _, _, chunk in chunks], query_terms(query))
+    order = sorted(range(len(chunks)), key=lambda i: (-scores[i], chunks[i][1], chunks[i][0]))
+
+    selected = [[] for _ in texts]
+    remaining = budget
+    misses = 0
+    for i in order:
+        t, position, chunk = chunks[i]
+        # One more token for the joining newline, two for a possible gap marker
+        cost = count_tokens(chunk) + 3
+        if cost <= remaining:
+            selected[t].append((position, chunk))
+            remaining -= cost
+        else:
+            # Once the budget is nearly full, stop probing for a chunk small enough to fit
+            misses += 1
+            if misses >= RETRIEVAL_FIT_ATTEMPTS:
+                break
+    return [sorted(parts) for parts in selected]
+
+def join_chunks(parts):
+    """Join selected (position, chunk) pairs, marking the gaps where chunks were skipped."""
+    if not parts:
+        return "[…]"
+    pieces = []
+    previous = -1
+    for position, chunk in parts:
+        if position != previous + 1:
+            pieces.append("[…]")
+        pieces.append(chunk)
+        previous = position
+    return '\n'.join(pieces)
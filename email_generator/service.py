@@ -0,0 +1,410 @@
+"""HTTP service exposing generation, batch generation, history and export.
+
+Other services call the generator here instead of driving the Streamlit
+form. Requests are handled on one asyncio event loop (Starlette, served by
+uvicorn; both come with Streamlit). Each generation runs the synchronous
+pipeline on a pool of SERVICE_MAX_CONCURRENCY threads, so many run at once
+in one process. At most SERVICE_MAX_WAITING more requests wait for a slot;
+beyond that the service answers 503 with Retry-After so callers back off.
+
+Endpoints:
+    POST /generate        JSON or multipart (attachments as files); ?stream=true for server-sent events
+    POST /batch           {"requests": [...], "defaults": {...}}; results come back as JSON
+    GET  /history         list or search a user's emails
+    GET  /history/{id}    one email with its body
+    DELETE /history/{id}  delete one email
+    POST /export          ZIP of PDF/TXT files for the matching emails
+    GET  /metrics         Prometheus text
+    GET  /health
+
+Run it with `python -m email_generator serve`.
+"""
+
+import os
+import json
+import shutil
+import asyncio
+import tempfile
+from datetime import date
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from .config import (
+    DEFAULT_MODEL,
+    MODEL_OPTIONS,
+    EMAIL_PRESETS,
+    MAX_FILE_SIZE_MB,
+    HISTORY_USER,
+    MAX_HISTORY_ITEMS,
+    BATCH_DEFAULT_CONCURRENCY,
+    BATCH_MAX_CONCURRENCY,
+    SERVICE_API_KEY,
+    SERVICE_MAX_CONCURRENCY,
+    SERVICE_MAX_WAITING,
+    SERVICE_MAX_BATCH_SIZE,
+    SERVICE_MAX_ATTACHMENTS,
+    MAX_VARIANTS,
+)
+from .extraction import MemoryAttachment, validate_file
+from .history import get_history_store
+from .pipeline import generate_record
+from .export import export_history_zip
+from .batch import build_batch_job, create_async_client, run_batch
+from .ratelimit import AsyncRateLimiter, get_rate_limiter
+from .metrics import get_metrics
+from .cli import DEFAULT_PARAMS, params_from_request
+
+TRUE_VALUES = {"1", "true", "yes", "on"}
+
+class AdmissionLimiter:
+    """Runs at most `concurrency` requests at once and lets `max_waiting` more queue.
+
+    Used from the event loop only, so the counters need no lock.
+    """
+
+    def __init__(self, concurrency=SERVICE_MAX_CONCURRENCY, max_waiting=SERVICE_MAX_WAITING):
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.admitted = 0  # running plus waiting
+        self.running = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def check(self):
+        """Raise 503 when no more requests can be admitted."""
+        if self.admitted >= self.concurrency + self.max_waiting:
+            raise HTTPException(503, "Too many requests in progress; retry shortly", headers={"Retry-After": "1"})
+
+    async def acquire(self):
+        """Wait in line for a concurrency slot; every successful acquire() needs one release()."""
+        self.check()
+        self.admitted += 1
+        try:
+            await self._semaphore.acquire()
+        except BaseException:
+            self.admitted -= 1
+            raise
+        self.running += 1
+
+    def release(self):
+        self.running -= 1
+        self.admitted -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the concurrency slots for the enclosed block, waiting in line if needed."""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+def is_true(value):
+    return value is True or str(value).lower() in TRUE_VALUES
+
+def params_from_fields(fields, attachments=()):
+    """Build build_email_prompt params from request fields.
+
+    Only the known parameter keys and "preset" are read: attachment paths
+    are a CLI feature and are never resolved for HTTP callers.
+    """
+    request = {}
+    for key in (*DEFAULT_PARAMS, "preset"):
+        value = fields.get(key)
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            raise HTTPException(400, f"{key} must be a string")
+        request[key] = value
+    if request.get("preset") and request["preset"] not in EMAIL_PRESETS:
+        raise HTTPException(400, f"Unknown preset: {request['preset']}")
+    params = params_from_request(request, DEFAULT_PARAMS)
+    params['uploaded_files'] = list(attachments)
+    return params
+
+def model_from_fields(fields):
+    model = fields.get("model") or DEFAULT_MODEL
+    if model not in MODEL_OPTIONS:
+        raise HTTPException(400, f"Unknown model: {model}; choose one of {', '.join(MODEL_OPTIONS)}")
+    return model
+
+async def read_fields(request):
+    """Return (fields, attachments) from a JSON body or a multipart form with "attachments" files."""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form(max_files=SERVICE_MAX_ATTACHMENTS, max_part_size=MAX_FILE_SIZE_MB * 1024 * 1024)
+        fields = {key: value for key, value in form.items() if isinstance(value, str)}
+        attachments = []
+        for upload in form.getlist("attachments"):
+            if isinstance(upload, str):
+                continue
+            attachment = MemoryAttachment(upload.filename or "attachment", await upload.read())
+            try:
+                validate_file(attachment)
+            except ValueError as e:
+                raise HTTPException(400, f"{attachment.name}: {str(e)}")
+            attachments.append(attachment)
+        await form.close()
+        return fields, attachments
+    try:
+        fields = await request.json()
+    except ValueError:
+        raise HTTPException(400, "Request body must be JSON or multipart/form-data")
+    if not isinstance(fields, dict):
+        raise HTTPException(400, "Request body must be a JSON object")
+    return fields, []
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def parse_filters(params):
+    """Read history search filters from query parameters or a JSON body."""
+    filters = {
+        "query": params.get("query") or "",
+        "tone": params.get("tone") or None,
+        "preset": params.get("preset") or None,
+        "language": params.get("language") or None,
+        "favorites_only": is_true(params.get("favorites", False)),
+    }
+    for name, key in (("from", "date_from"), ("to", "date_to")):
+        value = params.get(name)
+        try:
+            filters[key] = date.fromisoformat(value) if value else None
+        except (TypeError, ValueError):
+            raise HTTPException(400, f"{name} must be a date (YYYY-MM-DD)")
+    return filters
+
+def parse_int(params, name, default, minimum=0, maximum=None):
+    try:
+        value = int(params.get(name, default))
+    except (TypeError, ValueError):
+        raise HTTPException(400, f"{name} must be an integer")
+    if value < minimum or (maximum is not None and value > maximum):
+        raise HTTPException(400, f"{name} must be between {minimum} and {maximum}")
+    return value
+
+def create_app(concurrency=SERVICE_MAX_CONCURRENCY, max_waiting=SERVICE_MAX_WAITING, api_key=SERVICE_API_KEY):
+    """Build the Starlette application; serve it with uvicorn."""
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="email-service")
+    limiter = AdmissionLimiter(concurrency, max_waiting)
+    # Batches share one API client and the process-wide OpenAI quota with /generate
+    batch_limiter = AsyncRateLimiter(limiter=get_rate_limiter())
+    batch_clients = []
+
+    def authorize(request):
+        if api_key and request.headers.get("authorization") != f"Bearer {api_key}":
+            raise HTTPException(401, "Missing or invalid API key")
+
+    async def run_in_worker(function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, lambda: function(*args, **kwargs))
+
+    async def submit_admitted(function, *args, **kwargs):
+        """Start function on a worker once a concurrency slot is free and return its future.
+
+        The slot is released when the worker finishes, not when the request
+        ends: a client that disconnects must not free capacity while its
+        generation keeps running on the pool.
+        """
+        loop = asyncio.get_running_loop()
+        await limiter.acquire()
+        try:
+            future = executor.submit(function, *args, **kwargs)
+        except BaseException:
+            limiter.release()
+            raise
+
+        def release(_):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(limiter.release)
+
+        future.add_done_callback(release)
+        return future
+
+    async def run_admitted(function, *args, **kwargs):
+        return await asyncio.wrap_future(await submit_admitted(function, *args, **kwargs))
+
+    async def generate(request):
+        authorize(request)
+        fields, attachments = await read_fields(request)
+        options = dict(request.query_params, **fields)
+        params = params_from_fields(fields, attachments)
+        model = model_from_fields(fields)
+        user_id = options.get("user") or HISTORY_USER
+        variants = parse_int(options, "variants", 1, 1, MAX_VARIANTS)
+        if variants > 1 and is_true(options.get("stream", False)):
+            raise HTTPException(400, "variants cannot be streamed")
+        generation = dict(
+            preset_name=fields.get("preset"),
+            variants=variants,
+            bypass_cache=is_true(options.get("no_cache", False)),
+            user_id=user_id if is_true(options.get("save_history", True)) else None,
+        )
+
+        if not is_true(options.get("stream", False)):
+            try:
+                record = await run_admitted(generate_record, params, model, **generation)
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(502, f"Generation error: {str(e)}")
+            return JSONResponse(record)
+
+        limiter.check()
+        loop = asyncio.get_running_loop()
+        updates = asyncio.Queue()
+
+        def on_token(text):
+            loop.call_soon_threadsafe(updates.put_nowait, ("token", text))
+
+        def run():
+            try:
+                record = generate_record(params, model, stream=True, on_token=on_token, **generation)
+                loop.call_soon_threadsafe(updates.put_nowait, ("done", record))
+            except Exception as e:
+                loop.call_soon_threadsafe(updates.put_nowait, ("error", {"error": f"Generation error: {str(e)}"}))
+
+        async def events():
+            await submit_admitted(run)
+            sent = 0
+            while True:
+                event, payload = await updates.get()
+                if event == "token":
+                    # on_token reports the text so far; send only what is new
+                    yield sse_event("token", {"text": payload[sent:]})
+                    sent = len(payload)
+                    continue
+                yield sse_event(event, payload)
+                return
+
+        return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    async def batch(request):
+        authorize(request)
+        fields, _ = await read_fields(request)
+        requests = fields.get("requests")
+        if not isinstance(requests, list) or not requests:
+            raise HTTPException(400, "requests must be a non-empty list of parameter objects")
+        if len(requests) > SERVICE_MAX_BATCH_SIZE:
+            raise HTTPException(400, f"At most {SERVICE_MAX_BATCH_SIZE} requests per batch")
+        defaults = fields.get("defaults") or {}
+        if not isinstance(defaults, dict) or not all(isinstance(item, dict) for item in requests):
+            raise HTTPException(400, "defaults and every request must be JSON objects")
+        model = model_from_fields(fields)
+        concurrency = parse_int(fields, "concurrency", BATCH_DEFAULT_CONCURRENCY, 1, BATCH_MAX_CONCURRENCY)
+
+        jobs = []
+        for number, item in enumerate(requests, start=1):
+            params = params_from_fields(dict(defaults, **item))
+            row = {'row_id': str(item.get('row_id', number)), 'recipient_name': params['recipient_name']}
+            jobs.append((row, params))
+
+        results = []
+        # The batch runs on the event loop and is cancelled with the request, so the slot can follow the handler
+        async with limiter.slot():
+            # Prompt building may read presets and count tokens; keep it off the event loop
+            jobs = await run_in_worker(lambda: [build_batch_job(row, params, model) for row, params in jobs])
+            if not batch_clients:
+                batch_clients.append(create_async_client())
+            summary = await run_batch(
+                jobs, None, model, concurrency=concurrency, resume=False, on_result=results.append,
+                client=batch_clients[0], limiter=batch_limiter
+            )
+            get_metrics().flush()
+        order = {job[0]['row_id']: index for index, job in enumerate(jobs)}
+        results.sort(key=lambda record: order[record['row_id']])
+        return JSONResponse({"summary": summary, "results": results})
+
+    async def history(request):
+        authorize(request)
+        params = request.query_params
+        filters = parse_filters(params)
+        user_id = params.get("user") or HISTORY_USER
+        limit = parse_int(params, "limit", MAX_HISTORY_ITEMS, 1, 1000)
+        offset = parse_int(params, "offset", 0)
+        store = get_history_store()
+        emails, total = await run_in_worker(lambda: (
+            store.search(user_id, limit=limit, offset=offset, **filters),
+            store.search_count(user_id, **filters),
+        ))
+        return JSONResponse({"total": total, "emails": emails})
+
+    async def history_email(request):
+        authorize(request)
+        store = get_history_store()
+        email_id = request.path_params["email_id"]
+        user_id = request.query_params.get("user") or HISTORY_USER
+        if request.method == "DELETE":
+            if not await run_in_worker(store.delete, email_id, user_id):
+                raise HTTPException(404, f"No email with id {email_id}")
+            return JSONResponse({"deleted": email_id})
+        email = await run_in_worker(store.get, email_id, user_id)
+        if email is None:
+            raise HTTPException(404, f"No email with id {email_id}")
+        return JSONResponse(email)
+
+    async def export(request):
+        authorize(request)
+        fields, _ = await read_fields(request)
+        formats = [fmt.strip() for fmt in str(fields.get("format", "pdf,txt")).split(',') if fmt.strip()]
+        if not formats or set(formats) - {"pdf", "txt"}:
+            raise HTTPException(400, "format must be pdf, txt or pdf,txt")
+        filters = parse_filters(fields)
+        user_id = fields.get("user") or HISTORY_USER
+
+        directory = tempfile.mkdtemp(prefix="email-export-")
+        path = os.path.join(directory, "history.zip")
+        try:
+            summary = await run_admitted(export_history_zip, path, user_id=user_id, formats=formats, **filters)
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        return FileResponse(
+            path,
+            media_type="application/zip",
+            filename=f"history_{user_id}.zip",
+            headers={"X-Export-Summary": json.dumps({key: summary[key] for key in ("total", "done", "error")})},
+            background=BackgroundTask(shutil.rmtree, directory, ignore_errors=True)
+        )
+
+    async def metrics(request):
+        authorize(request)
+        return PlainTextResponse(get_metrics().prometheus_text(), media_type="text/plain; version=0.0.4")
+
+    async def health(request):
+        return JSONResponse({
+            "status": "ok",
+            "running": limiter.running,
+            "admitted": limiter.admitted,
+            "concurrency": limiter.concurrency,
+        })
+
+    async def http_error(request, exc):
+        return JSONResponse({"error": exc.detail}, status_code=exc.status_code, headers=exc.headers)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        executor.shutdown(wait=False, cancel_futures=True)
+        for client in batch_clients:
+            await client.close()
+
+    return Starlette(
+        routes=[
+            Route("/generate", generate, methods=["POST"]),
+            Route("/batch", batch, methods=["POST"]),
+            Route("/history", history, methods=["GET"]),
+            Route("/history/{email_id:int}", history_email, methods=["GET", "DELETE"]),
+            Route("/export", export, methods=["POST"]),
+            Route("/metrics", metrics, methods=["GET"]),
+            Route("/health", health, methods=["GET"]),
+        ],
+        exception_handlers={HTTPException: http_error},
+        lifespan=lifespan,
+    )
@@ -0,0 +1,157 @@
+"""Local filling of the EMAIL_PRESETS templates.
+
+Every preset template is a complete email with [Placeholder] slots and
+optional sections such as "[If applicable: ... [topic] ...]". A template is
+parsed once into a compiled form (literal text, slots and sections) and
+rendered from the form fields and user-supplied "Slot: value" pairs without
+calling the model. Slots left unfilled are reported, so only those need a
+model round trip (see the "draft" parameter of build_email_request).
+"""
+
+import re
+from functools import lru_cache
+
+from .config import EMAIL_PRESETS, TEMPLATE_FIELD_SLOTS, TEMPLATE_SECTION_PREFIXES
+from .metrics import timed
+
+OFF_VALUES = {"", "no", "false", "off", "0"}
+
+_SECTION = re.compile(
+    r"^\s*((?:%s)\b[^:\[\]\n]*):\s*" % "|".join(TEMPLATE_SECTION_PREFIXES), re.IGNORECASE
+)
+_BLANK_LINES = re.compile(r"\n[ \t]*\n(?:[ \t]*\n)+")
+
+def slot_key(name):
+    """Normalize a slot name or section label for matching: case and spacing are ignored."""
+    return " ".join(name.split()).lower()
+
+def _closing_bracket(text, start):
+    """Return the index of the "]" matching the "[" at start, or -1."""
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == "[":
+            depth += 1
+        elif text[i] == "]":
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+def _parse(text):
+    """Split template text into ("text", str), ("slot", name) and ("section", label, parts) parts."""
+    parts = []
+    position = 0
+    while True:
+        start = text.find("[", position)
+        end = _closing_bracket(text, start) if start != -1 else -1
+        if end == -1:
+            break
+        if start > position:
+            parts.append(("text", text[position:start]))
+        inner = text[start + 1:end]
+        section = _SECTION.match(inner)
+        if section:
+            parts.append(("section", section.group(1).strip(), _parse(inner[section.end():])))
+        else:
+            parts.append(("slot", " ".join(inner.split())))
+        position = end + 1
+    if position < len(text):
+        parts.append(("text", text[position:]))
+    return parts
+
+def _slots(parts):
+    for part in parts:
+        if part[0] == "slot":
+            yield part[1]
+        elif part[0] == "section":
+            yield from _slots(part[2])
+
+class CompiledTemplate:
+    """A parsed template; render() fills it without re-reading the template text."""
+
+    def __init__(self, template):
+        self.parts = _parse(template)
+        self.slots = list(dict.fromkeys(_slots(self.parts)))
+        self.sections = [part[1] for part in self.parts if part[0] == "section"]
+
+    def render(self, values):
+        """Fill the template from {slot name or section label: value}.
+
+        Unfilled slots stay in the text as [Slot]. An optional section is
+        kept when every slot in it is filled, or when its label is given a
+        value ("yes"/"no" turn it on or off); it is otherwise dropped with
+        its slots. Returns a dict with "text", "filled", "unfilled" and
+        "sections" ({label: included}).
+        """
+        values = {slot_key(key): str(value).strip() for key, value in values.items() if value is not None}
+        filled, unfilled, sections = [], [], {}
+
+        def fill(parts, out):
+            for part in parts:
+                if part[0] == "text":
+                    out.append(part[1])
+                elif part[0] == "slot":
+                    value = values.get(slot_key(part[1]))
+                    if value:
+                        out.append(value)
+                        filled.append(part[1])
+                    else:
+                        out.append(f"[{part[1]}]")
+                        unfilled.append(part[1])
+                else:
+                    label, inner = part[1], part[2]
+                    switch = values.get(slot_key(label))
+                    if switch is not None:
+                        include = switch.lower() not in OFF_VALUES
+                    else:
+                        names = list(_slots(inner))
+                        include = bool(names) and all(values.get(slot_key(name)) for name in names)
+                    sections[label] = include
+                    if include:
+                        fill(inner, out)
+
+        out = []
+        fill(self.parts, out)
+        # Dropped sections leave their surrounding blank lines behind
+        text = _BLANK_LINES.sub("\n\n", "".join(out)).strip()
+        return {
+            "text": text,
+            "filled": list(dict.fromkeys(filled)),
+            "unfilled": list(dict.fromkeys(unfilled)),
+            "sections": sections,
+        }
+
+@lru_cache(maxsize=None)
+def compile_template(template):
+    """Return the compiled form of a template string, parsing each distinct template once."""
+    return CompiledTemplate(template)
+
+def get_preset_template(preset_name):
+    """Return the compiled template of an EMAIL_PRESETS entry."""
+    return compile_template(EMAIL_PRESETS[preset_name]['template'])
+
+def parse_slot_values(text):
+    """Parse "Slot: value" or "Slot = value" lines into a dict; other lines are ignored."""
+    values = {}
+    for line in text.splitlines():
+        match = re.match(r"\s*\[?([^:=\]]+?)\]?\s*[:=]\s*(.*)$", line)
+        if match and match.group(2).strip():
+            values[match.group(1).strip()] = match.group(2).strip()
+    return values
+
+def template_values(params, slot_values=None):
+    """Map form fields onto slots (TEMPLATE_FIELD_SLOTS), then apply explicit slot values over them."""
+    values = {}
+    for field, slots in TEMPLATE_FIELD_SLOTS.items():
+        if params.get(field):
+            for slot in slots:
+                values[slot] = params[field]
+    values.update(slot_values or {})
+    return values
+
+def render_preset(preset_name, params, slot_values=None):
+    """Fill a preset's template locally; returns CompiledTemplate.render's dict. Timed as "render_template"."""
+    with timed("render_template", preset=preset_name) as details:
+        result = get_preset_template(preset_name).render(template_values(params, slot_values))
+        details.update(filled=len(result['filled']), unfilled=len(result['unfilled']))
+    return result
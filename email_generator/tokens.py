@@ -0,0 +1,119 @@
+"""Token counting and per-model prompt budgets.
+
+Counts use tiktoken when it is installed. Otherwise a local approximation
+splits text the way BPE tokenizers roughly do: CJK characters and runs of
+up to three digits count as one token each, and words count as one token
+per few letters. The approximation errs on the high side so prompts stay
+inside the context window.
+"""
+
+import re
+import math
+from functools import lru_cache
+
+from .config import (
+    DEFAULT_MODEL,
+    GENERATION_MAX_TOKENS,
+    MAX_ATTACHMENT_TOKENS,
+    MODEL_CONTEXT_WINDOWS,
+    DEFAULT_CONTEXT_WINDOW,
+    OUTPUT_TOKENS_BY_LENGTH,
+    CONTEXT_SAFETY_MARGIN,
+)
+
+# Kana, CJK ideographs and Hangul: roughly one token per character
+CJK_CHARS = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+
+_TOKEN_PIECE = re.compile(
+    rf"(?P<cjk>[{CJK_CHARS}])"
+    r"|(?P<ascii>[A-Za-z]+)"
+    r"|(?P<word>[^\W\d_]+)"
+    r"|(?P<digits>\d{1,3})"
+    r"|(?P<newlines>\n+)"
+    r"|(?P<symbol>[^\w\s]|_)"
+)
+
+def _piece_tokens(match):
+    """Approximate the tokens in one regex piece of text."""
+    kind = match.lastgroup
+    if kind == "ascii":
+        return math.ceil(len(match.group()) / 6)
+    if kind == "word":
+        # Non-Latin alphabets (Cyrillic, Greek, ...) split into shorter tokens
+        return math.ceil(len(match.group()) / 3)
+    return 1
+
+@lru_cache(maxsize=None)
+def get_encoding(model=DEFAULT_MODEL):
+    """Return the tiktoken encoding for a model, or None when tiktoken is unavailable."""
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # Not installed, or its vocabulary could not be downloaded (e.g. offline)
+        return None
+
+def tokenizer_name(model=DEFAULT_MODEL):
+    """Return the name of the tokenizer count_tokens uses for a model."""
+    encoding = get_encoding(model)
+    return encoding.name if encoding is not None else "approximate"
+
+def count_tokens(text, model=DEFAULT_MODEL):
+    """Return the number of tokens in text for a model."""
+    encoding = get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum(_piece_tokens(match) for match in _TOKEN_PIECE.finditer(text))
+
+def truncate_to_tokens(text, max_tokens, model=DEFAULT_MODEL):
+    """Return (text, truncated), keeping at most max_tokens tokens of text."""
+    encoding = get_encoding(model)
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text, False
+        return encoding.decode(tokens[:max_tokens]), True
+    used = 0
+    for match in _TOKEN_PIECE.finditer(text):
+        used += _piece_tokens(match)
+        if used > max_tokens:
+            return text[:match.start()].rstrip(), True
+    return text, False
+
+def fair_shares(sizes, budget):
+    """Split a budget max-min fairly: small items get what they need, the rest share the remainder."""
+    shares = [0] * len(sizes)
+    remaining = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    while remaining:
+        share = budget // len(remaining)
+        i = remaining[0]
+        if sizes[i] > share:
+            for i in remaining:
+                shares[i] = share
+            break
+        shares[i] = sizes[i]
+        budget -= sizes[i]
+        remaining.pop(0)
+    return shares
+
+def context_window(model=DEFAULT_MODEL):
+    """Return the context window of a model in tokens."""
+    return MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+def plan_token_budget(model, instruction_tokens, email_length=None):
+    """Split a model's context window between instructions, attachments and output.
+
+    The output gets the allowance for email_length, the instructions what
+    they need, and attachments what is left, capped at MAX_ATTACHMENT_TOKENS.
+    """
+    window = context_window(model)
+    output_tokens = OUTPUT_TOKENS_BY_LENGTH.get(email_length, GENERATION_MAX_TOKENS)
+    available = window - instruction_tokens - output_tokens - CONTEXT_SAFETY_MARGIN
+    return {
+        "context_window": window,
+        "max_output_tokens": output_tokens,
+        "attachment_budget": max(0, min(MAX_ATTACHMENT_TOKENS, available)),
+    }
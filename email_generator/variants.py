@@ -0,0 +1,58 @@
+"""Local ranking of several drafts generated from one prompt.
+
+Drafts are compared with cheap checks instead of another model call: a
+subject line, no unfilled [placeholders] or missing sender/recipient names,
+and a word count in the range that suits the requested email length.
+"""
+
+import re
+
+from .config import VARIANT_LENGTH_WORDS, VARIANT_SCORE_WEIGHTS
+from .history import extract_subject
+
+_PLACEHOLDER = re.compile(r"\[[^\[\]\n]{1,60}\]")
+
+def unfilled_placeholders(email):
+    """Return the distinct [placeholders] left in an email, in order."""
+    return list(dict.fromkeys(_PLACEHOLDER.findall(email)))
+
+def length_fit(words, email_length):
+    """Return 1.0 inside the word range for email_length, falling off proportionally outside it."""
+    low, high = VARIANT_LENGTH_WORDS.get(email_length, VARIANT_LENGTH_WORDS["Medium"])
+    if words < low:
+        return words / low
+    if words > high:
+        return high / words
+    return 1.0
+
+def score_variant(email, params):
+    """Return the ranking checks for one draft; a higher score is better."""
+    words = len(email.split())
+    fit = length_fit(words, params.get('email_length'))
+    has_subject = extract_subject(email) != "No Subject"
+    unfilled = unfilled_placeholders(email)
+    lowered = email.lower()
+    # The first name is enough: "Dear Ada," fills the recipient
+    missing_names = []
+    for name in (params.get('user_name'), params.get('recipient_name')):
+        parts = (name or "").split()
+        if parts and parts[0].lower() not in lowered:
+            missing_names.append(name)
+    score = (
+        VARIANT_SCORE_WEIGHTS["length"] * fit
+        + VARIANT_SCORE_WEIGHTS["subject"] * has_subject
+        + VARIANT_SCORE_WEIGHTS["placeholders"] / (1 + len(unfilled) + len(missing_names))
+    )
+    return {
+        "score": round(score, 3),
+        "words": words,
+        "length_fit": round(fit, 3),
+        "has_subject": has_subject,
+        "unfilled": unfilled,
+        "missing_names": missing_names,
+    }
+
+def rank_variants(emails, params):
+    """Return [{email, score, ...checks}] best first; ties keep the API's order."""
+    scored = [dict(score_variant(email, params), email=email) for email in emails]
+    return sorted(scored, key=lambda variant: -variant['score'])
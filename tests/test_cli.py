@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from email_generator.cli import DEFAULT_PARAMS, build_parser, params_from_args, params_from_request, read_requests
+from email_generator.config import EMAIL_PRESETS
+
+def test_params_from_args_applies_preset_then_flags():
+    args = build_parser().parse_args([
+        "generate", "--preset", "Sales Pitch", "--tone", "Friendly", "--recipient-name", "Ada"
+    ])
+    params = params_from_args(args)
+    assert params["tone"] == "Friendly"
+    assert params["email_purpose"] == EMAIL_PRESETS["Sales Pitch"]["purpose"]
+    assert params["recipient_name"] == "Ada"
+    assert params["language"] == DEFAULT_PARAMS["language"]
+
+def test_params_from_request_overrides_defaults_and_resolves_attachments(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("notes")
+    defaults = dict(DEFAULT_PARAMS, recipient_name="Default", language="French")
+    params = params_from_request(
+        {"recipient_name": "Grace", "unknown": "ignored", "attachments": [str(path)]},
+        defaults
+    )
+    assert params["recipient_name"] == "Grace"
+    assert params["language"] == "French"
+    assert "unknown" not in params
+    assert [attachment.name for attachment in params["uploaded_files"]] == ["notes.txt"]
+
+@pytest.mark.parametrize("name, content, expected", [
+    ("one.json", json.dumps({"recipient_name": "Ada"}), [{"recipient_name": "Ada"}]),
+    ("list.json", json.dumps([{"row_id": 1}, {"row_id": 2}]), [{"row_id": 1}, {"row_id": 2}]),
+    ("many.jsonl", '{"row_id": 1}\n\n{"row_id": 2}\n', [{"row_id": 1}, {"row_id": 2}]),
+])
+def test_read_requests(tmp_path, name, content, expected):
+    path = tmp_path / name
+    path.write_text(content)
+    assert read_requests(str(path)) == expected
+
+@pytest.mark.parametrize("flags", [["--variants", "2"], ["--json"], ["--pdf", "out.pdf"], ["--template"],
+                                   ["--slot", "topic=x"], ["--save-history"]])
+def test_single_email_flags_are_rejected_for_several_requests(tmp_path, capsys, flags):
+    path = tmp_path / "requests.jsonl"
+    path.write_text('{"recipient_name": "Ada"}\n{"recipient_name": "Grace"}\n')
+    args = build_parser().parse_args(["generate", "--params", str(path), *flags])
+    with pytest.raises(SystemExit) as error:
+        args.func(args)
+    assert error.value.code == 2
+    assert f"{flags[0]}: only for a single email" in capsys.readouterr().err
@@ -0,0 +1,35 @@
+from email_generator.compaction import DUPLICATE_NOTE, compact_texts
+from email_generator.extraction import PAGE_BREAK
+
+REPEATED = "The quarterly report shows revenue growth of twelve percent this year"
+
+def count_words(text):
+    return len(text.split())
+
+def test_lines_repeated_from_an_earlier_attachment_are_dropped():
+    texts, stats = compact_texts(
+        [f"Summary\n{REPEATED}", f"Cover letter for the board\n{REPEATED}"], count_words
+    )
+    assert texts == [f"Summary\n{REPEATED}", f"Cover letter for the board\n{DUPLICATE_NOTE}"]
+    assert stats["duplicate_lines"] == 1
+    assert stats["tokens_saved"] == count_words(REPEATED)
+    assert stats["chars_saved"] == stats["chars_before"] - stats["chars_after"] > 0
+
+def test_page_headers_and_footers_are_kept_once():
+    findings = ["Revenue grew", "Costs fell", "Hiring paused", "Churn dropped"]
+    pages = [
+        f"ACME Corp Confidential\nQuarterly review\n{finding} this quarter.\nSee appendix\nPage {i + 1}"
+        for i, finding in enumerate(findings)
+    ]
+    (text,), stats = compact_texts([PAGE_BREAK.join(pages)])
+    assert text.count("ACME Corp Confidential") == 1
+    assert text.count("Page ") == 1
+    assert all(f"{finding} this quarter." in text for finding in findings)
+    # The two lines at each edge are checked, so the repeated second lines go as well
+    assert text.count("Quarterly review") == text.count("See appendix") == 1
+    assert stats["boilerplate_lines"] == 12
+
+def test_whitespace_is_normalized_without_touching_distinct_text():
+    texts, stats = compact_texts(["Dear  team,\n\n\n\nThanks   again.  "])
+    assert texts == ["Dear team,\n\nThanks again."]
+    assert stats["duplicate_lines"] == stats["boilerplate_lines"] == 0
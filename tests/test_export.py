@@ -0,0 +1,83 @@
+import os
+import json
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from email_generator.export import export_history_zip, prune_exports
+from email_generator.history import HistoryStore, build_email_record
+
+PARAMS = {
+    "tone": "Professional",
+    "recipient_name": "Grace",
+    "language": "English",
+    "writing_style": "Direct",
+    "email_length": "Short",
+    "email_purpose": "Follow up",
+}
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    yield store
+    store.close()
+
+def add(store, subject, user_id="ada"):
+    return store.add(build_email_record(f"Subject: {subject}\nDear Grace,\nThanks.", PARAMS), user_id)
+
+def read_manifest(archive):
+    return [json.loads(line) for line in archive.read("manifest.jsonl").decode("utf-8").splitlines()]
+
+def test_export_writes_text_files_and_manifest(store, tmp_path):
+    first = add(store, "Quarterly review")
+    second = add(store, "Lunch / Friday?")
+    add(store, "Not mine", user_id="someone-else")
+    output = str(tmp_path / "out" / "history.zip")
+    progress = []
+
+    summary = export_history_zip(output, user_id="ada", formats=("txt",), store=store,
+                                 on_progress=lambda summary: progress.append(summary["done"]))
+
+    assert summary == {"path": output, "total": 2, "done": 2, "error": 0}
+    assert progress == [1, 2]
+    assert not os.path.exists(output + ".part")
+    with zipfile.ZipFile(output) as archive:
+        manifest = read_manifest(archive)
+        assert sorted(entry["id"] for entry in manifest) == [first, second]
+        for entry in manifest:
+            [name] = entry["files"]
+            assert name.startswith(f"emails/{entry['id']:06d}_") and name.endswith(".txt")
+            assert archive.read(name).decode("utf-8") == store.get(entry["id"], "ada")["content"]
+        assert f"emails/{second:06d}_Lunch_Friday.txt" in archive.namelist()
+
+def test_export_renders_pdfs_for_matching_emails(store, tmp_path):
+    favorite = add(store, "Keep this")
+    add(store, "Skip this")
+    store.set_favorite(favorite, True, "ada")
+    output = str(tmp_path / "favorites.zip")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        summary = export_history_zip(output, user_id="ada", formats=("pdf", "txt"), store=store,
+                                     executor=executor, favorites_only=True)
+
+    assert summary["total"] == summary["done"] == 1 and summary["error"] == 0
+    with zipfile.ZipFile(output) as archive:
+        [entry] = read_manifest(archive)
+        assert entry["id"] == favorite and entry["favorite"]
+        pdf, txt = sorted(entry["files"])
+        assert archive.read(pdf).startswith(b"%PDF")
+        assert archive.read(txt).decode("utf-8").startswith("Subject: Keep this")
+
+def test_prune_exports_removes_only_old_zips(tmp_path):
+    old_zip, new_zip, old_other = (tmp_path / name for name in ("old.zip", "new.zip", "old.txt"))
+    for path in (old_zip, new_zip, old_other):
+        path.write_bytes(b"data")
+    two_days_ago = time.time() - 48 * 3600
+    for path in (old_zip, old_other):
+        os.utime(path, (two_days_ago, two_days_ago))
+
+    assert prune_exports(str(tmp_path), max_age_hours=24) == 1
+    assert sorted(os.listdir(tmp_path)) == ["new.zip", "old.txt"]
+    assert prune_exports(str(tmp_path / "missing")) == 0
@@ -0,0 +1,165 @@
+import io
+import zipfile
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from email_generator import extraction
+from email_generator.config import EXCEL_HEAD_ROWS
+from email_generator.extraction import (
+    ExtractionCache,
+    MemoryAttachment,
+    extract_attachments,
+    iter_text_from_docx,
+    iter_text_from_excel,
+)
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ExtractionCache()
+    monkeypatch.setattr(extraction, "get_extraction_cache", lambda: cache)
+    return cache
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+def text_lines(name, count):
+    return "\n".join(f"{name} line {i:04d}" for i in range(count))
+
+def attachment(name, count):
+    return MemoryAttachment(name, text_lines(name, count).encode("utf-8"))
+
+def test_without_budget_every_file_is_complete(cache, executor):
+    files = [attachment("a.txt", 50), attachment("b.txt", 5)]
+    results = extract_attachments(files, executor=executor)
+    assert results == [(text_lines("a.txt", 50), True), (text_lines("b.txt", 5), True)]
+
+def test_budget_is_shared_fairly(cache, executor):
+    files = [attachment("short.txt", 3), attachment("a.txt", 1000), attachment("b.txt", 1000)]
+    budget = 2000
+    short, first, second = extract_attachments(files, budget=budget, executor=executor)
+
+    # The short file is kept whole and what it leaves unused goes to the others
+    assert short == (text_lines("short.txt", 3), True)
+    share = (budget - len(short[0])) // 2
+    assert first == (text_lines("a.txt", 1000)[:share], False)
+    assert second == (text_lines("b.txt", 1000)[:share], False)
+
+def test_cached_complete_text_is_cut_to_the_share(cache, executor):
+    files = [attachment("a.txt", 1000), attachment("b.txt", 1000)]
+    extract_attachments(files[:1], executor=executor)
+
+    first, second = extract_attachments(files, budget=1000, executor=executor)
+    assert first == (text_lines("a.txt", 1000)[:500], False)
+    assert second == (text_lines("b.txt", 1000)[:500], False)
+
+def test_invalid_file_gets_a_placeholder(cache, executor):
+    files = [MemoryAttachment("tool.exe", b"MZ"), attachment("a.txt", 2)]
+    invalid, text = extract_attachments(files, budget=1000, executor=executor)
+    assert invalid[0].startswith("[Error processing tool.exe:")
+    assert text == (text_lines("a.txt", 2), True)
+
+def workbook_file(sheets):
+    """Build an .xlsx in memory from {title: rows}."""
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for title, rows in sheets.items():
+        sheet = workbook.create_sheet(title)
+        for row in rows:
+            sheet.append(row)
+    data = io.BytesIO()
+    workbook.save(data)
+    data.seek(0)
+    return data
+
+def test_excel_small_sheets_are_emitted_whole():
+    file = workbook_file({
+        "Contacts": [["Name", "Joined"], ["Ada", date(2024, 6, 1)], [], ["Grace", 3.0]],
+        "Blank": [],
+    })
+    assert list(iter_text_from_excel(file)) == [
+        "## Sheet: Contacts (2 rows)",
+        "Name | Joined",
+        "Ada | 2024-06-01",
+        "Grace | 3",
+        "## Sheet: Blank (empty)",
+    ]
+
+def test_excel_large_sheets_are_summarized_before_their_first_rows():
+    rows = [["Region", "Amount"]] + [["North" if i % 3 else "South", i] for i in range(1, 101)]
+    file = workbook_file({"Sales": rows, "Notes": [[1, "no header"]]})
+
+    lines = list(iter_text_from_excel(file))
+
+    assert lines[:4] == [
+        "## Sheet: Sales (100 rows x 2 columns)",
+        "Columns:",
+        "- Region: text, 100 values; top: North (~67), South (~33)",
+        "- Amount: number, 100 values; number range 1 to 100",
+    ]
+    # A first row with numbers is data, not a header
+    assert lines[4:7] == ["## Sheet: Notes (1 rows)", "Column 1 | Column 2", "1 | no header"]
+    assert lines[7:9] == [f"## Sheet: Sales, first {EXCEL_HEAD_ROWS} rows", "Region | Amount"]
+    assert lines[9:] == [f"{'South' if i % 3 == 0 else 'North'} | {i}" for i in range(1, EXCEL_HEAD_ROWS + 1)]
+
+def docx_file(body):
+    """Build a .docx in memory whose document body is the given WordprocessingML."""
+    xml = (
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+        'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006">'
+        f'<w:body>{body}</w:body></w:document>'
+    )
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as archive:
+        archive.writestr("word/document.xml", xml)
+    data.seek(0)
+    return data
+
+def paragraph(*runs):
+    return "<w:p>" + "".join(f"<w:r>{run}</w:r>" for run in runs) + "</w:p>"
+
+def cell(*paragraphs):
+    return "<w:tc>" + "".join(paragraphs) + "</w:tc>"
+
+def test_docx_paragraphs_keep_runs_breaks_and_order():
+    body = (
+        paragraph("<w:t>Dear </w:t>", "<w:t>Ada,</w:t>")
+        + paragraph("<w:t>Name</w:t><w:tab/><w:t>Value</w:t>", "<w:br/><w:t>next line</w:t>")
+        + paragraph()
+        + paragraph("<w:instrText>PAGE</w:instrText><w:t>Thanks</w:t>")
+    )
+    assert list(iter_text_from_docx(docx_file(body))) == ["Dear Ada,", "Name\tValue\nnext line", "Thanks"]
+
+def test_docx_tables_become_rows_with_nested_tables_folded_in():
+    nested = "<w:tbl><w:tr>" + cell(paragraph("<w:t>inner</w:t>")) + "</w:tr></w:tbl>"
+    body = (
+        paragraph("<w:t>Before</w:t>")
+        + "<w:tbl>"
+        + "<w:tr>" + cell(paragraph("<w:t>Item</w:t>")) + cell(paragraph("<w:t>Price</w:t>")) + "</w:tr>"
+        + "<w:tr>" + cell(paragraph("<w:t>Tea</w:t>"), nested) + cell(paragraph("<w:t>3</w:t>")) + "</w:tr>"
+        + "<w:tr>" + cell(paragraph()) + cell(paragraph()) + "</w:tr>"
+        + "</w:tbl>"
+        + paragraph("<w:t>After</w:t>")
+    )
+    assert list(iter_text_from_docx(docx_file(body))) == ["Before", "Item | Price", "Tea inner | 3", "After"]
+
+def test_docx_text_boxes_are_read_once():
+    text_box = (
+        "<mc:AlternateContent>"
+        f"<mc:Choice><w:txbxContent>{paragraph('<w:t>Boxed</w:t>')}</w:txbxContent></mc:Choice>"
+        f"<mc:Fallback><w:txbxContent>{paragraph('<w:t>Boxed</w:t>')}</w:txbxContent></mc:Fallback>"
+        "</mc:AlternateContent>"
+    )
+    body = paragraph("<w:t>Intro</w:t>", text_box)
+    assert list(iter_text_from_docx(docx_file(body))) == ["Intro\nBoxed"]
+
+def test_docx_without_document_xml_fails():
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as archive:
+        archive.writestr("other.xml", "<x/>")
+    with pytest.raises(Exception, match="DOCX extraction error"):
+        list(iter_text_from_docx(data))
@@ -0,0 +1,76 @@
+import time
+import threading
+
+import pytest
+
+from email_generator.generation import CompletionCache
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def run_concurrently(cache, key, compute, callers):
+    results = [None] * callers
+
+    def call(i):
+        try:
+            results[i] = cache.get_or_compute(key, compute)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+def test_concurrent_requests_share_one_computation():
+    cache = CompletionCache()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return "email"
+
+    threads, results = run_concurrently(cache, "key", compute, 5)
+    wait_until(lambda: cache.coalesced == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(source for _, source in results) == ["coalesced"] * 4 + ["computed"]
+    assert all(value == "email" for value, _ in results)
+    assert cache.get_or_compute("key", compute) == ("email", "cache")
+
+def test_waiters_get_the_leaders_error_and_nothing_is_cached():
+    cache = CompletionCache()
+    release = threading.Event()
+
+    def compute():
+        release.wait(5)
+        raise RuntimeError("rate limited")
+
+    threads, results = run_concurrently(cache, "key", compute, 3)
+    wait_until(lambda: cache.coalesced == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.get_or_compute("key", lambda: "retried") == ("retried", "computed")
+
+def test_bypass_replaces_the_cached_value():
+    cache = CompletionCache()
+    cache.get_or_compute("key", lambda: "first")
+    assert cache.get_or_compute("key", lambda: "second", bypass=True) == ("second", "computed")
+    assert cache.get_or_compute("key", lambda: "third") == ("second", "cache")
+
+@pytest.mark.parametrize("n", [2, 3])
+def test_variant_requests_have_their_own_keys(n):
+    single = CompletionCache.make_key("Write an email", "gpt-4o", 0.7, 800)
+    assert CompletionCache.make_key("Write an email", "gpt-4o", 0.7, 800, n=1) == single
+    assert CompletionCache.make_key("Write an email", "gpt-4o", 0.7, 800, n=n) != single
@@ -0,0 +1,65 @@
+from datetime import date
+
+import pytest
+
+from email_generator.history import HistoryStore, build_email_record
+
+PARAMS = {
+    "tone": "Professional",
+    "recipient_name": "Grace",
+    "language": "English",
+    "writing_style": "Direct",
+    "email_length": "Short",
+    "email_purpose": "Follow up",
+}
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    yield store
+    store.close()
+
+def add(store, subject, body, user_id="ada", **params):
+    record = build_email_record(f"Subject: {subject}\nDear Grace,\n{body}", dict(PARAMS, **params))
+    return store.add(record, user_id)
+
+def test_search_ranks_matches_and_marks_snippets(store):
+    add(store, "Lunch", "Are you free for lunch on Friday?")
+    budget_id = add(store, "Budget review", "The budget review moved to Monday; the budget is final.")
+    add(store, "Budget", "Quick note about the budget.", user_id="someone-else")
+
+    results = store.search("ada", query="budget")
+    assert [record["id"] for record in results] == [budget_id]
+    assert "**budget**" in results[0]["snippet"].lower()
+    assert store.search_count("ada", query="budget") == 1
+
+def test_search_filters_without_query_are_newest_first(store):
+    first = add(store, "One", "First email", tone="Friendly")
+    add(store, "Two", "Second email", tone="Formal")
+    third = add(store, "Three", "Third email", tone="Friendly")
+
+    results = store.search("ada", tone="Friendly")
+    assert [record["id"] for record in results] == [third, first]
+    assert "content" not in results[0]
+    assert store.search("ada", tone="Friendly", include_content=True)[0]["content"].startswith("Subject: Three")
+
+def test_search_by_date_and_favorites(store):
+    email_id = add(store, "Today", "Written today")
+    add(store, "Other", "Not a favorite")
+    store.set_favorite(email_id, True, "ada")
+
+    assert store.search_count("ada", date_from=date.today(), date_to=date.today()) == 2
+    assert store.search_count("ada", date_to=date(2000, 1, 1)) == 0
+    assert [record["id"] for record in store.search("ada", favorites_only=True)] == [email_id]
+
+def test_get_favorite_and_delete_are_scoped_to_the_owner(store):
+    email_id = add(store, "Private", "Only for Ada")
+
+    assert store.get(email_id, "mallory") is None
+    assert not store.set_favorite(email_id, True, "mallory")
+    assert not store.delete(email_id, "mallory")
+    assert store.get(email_id, "ada")["favorite"] is False
+
+    assert store.set_favorite(email_id, True, "ada")
+    assert store.delete(email_id, "ada")
+    assert store.get(email_id, "ada") is None
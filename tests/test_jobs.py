@@ -0,0 +1,85 @@
+import time
+import threading
+
+import pytest
+
+from email_generator import jobs
+from email_generator.jobs import JobQueue
+
+def wait_for(queue, job_id, user_id, statuses=("done", "failed"), timeout=5):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = queue.get(job_id, user_id)
+        if job["status"] in statuses:
+            return job
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+@pytest.fixture
+def gate(monkeypatch):
+    """Replace the pipeline with one that streams a token and waits for the gate to open."""
+    gate = threading.Event()
+
+    def generate_record(params, model, preset_name=None, on_token=None, user_id=None, **options):
+        on_token(f"Dear {params['recipient_name']}")
+        assert gate.wait(5)
+        if params['recipient_name'] == "fail":
+            raise Exception("the model returned an empty email")
+        return {"id": 7, "content": f"Dear {params['recipient_name']},", "stats": {"user": user_id}}
+
+    monkeypatch.setattr(jobs, "generate_record", generate_record)
+    return gate
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(workers=1, max_pending=2, max_finished=10)
+    yield queue
+    queue.shutdown(wait=False)
+
+def submit(queue, user_id, recipient="Ada"):
+    return queue.submit({"recipient_name": recipient, "email_purpose": "Intro"}, "gpt-4o", user_id)
+
+def test_jobs_are_only_visible_to_their_owner(queue, gate):
+    alice_job = submit(queue, "alice")
+    bob_job = submit(queue, "bob")
+
+    assert [job["id"] for job in queue.list("alice")] == [alice_job]
+    assert [job["id"] for job in queue.list("bob")] == [bob_job]
+    assert queue.get(alice_job, "bob") is None
+    wait_for(queue, alice_job, "alice", statuses=("running",))
+    assert queue.get(alice_job, "alice")["partial"] == "Dear Ada"
+
+    gate.set()
+    job = wait_for(queue, alice_job, "alice")
+    assert job["status"] == "done"
+    assert job["email"] == "Dear Ada," and job["email_id"] == 7 and job["stats"] == {"user": "alice"}
+
+    queue.dismiss(alice_job, "bob")
+    assert queue.get(alice_job, "alice") is not None
+    queue.dismiss(alice_job, "alice")
+    assert queue.get(alice_job, "alice") is None
+
+def test_pending_limit_is_per_user(queue, gate):
+    submit(queue, "alice")
+    submit(queue, "alice")
+    with pytest.raises(ValueError):
+        submit(queue, "alice")
+    submit(queue, "bob")
+    gate.set()
+
+def test_only_the_owner_cancels_a_queued_job(queue, gate):
+    running = submit(queue, "alice")
+    queued = submit(queue, "alice")
+    wait_for(queue, running, "alice", statuses=("running",))
+
+    assert not queue.cancel(queued, "bob")
+    assert queue.cancel(queued, "alice")
+    assert queue.get(queued, "alice")["error"] == "Cancelled"
+    assert not queue.cancel(running, "alice")
+    gate.set()
+
+def test_failed_jobs_keep_the_error(queue, gate):
+    gate.set()
+    job = wait_for(queue, submit(queue, "alice", recipient="fail"), "alice")
+    assert job["status"] == "failed"
+    assert job["error"] == "the model returned an empty email"
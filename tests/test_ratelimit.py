@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from email_generator import ratelimit
+from email_generator.config import RETRY_BASE_DELAY, RETRY_MAX_DELAY
+from email_generator.ratelimit import RateLimiter, backoff_delay, call_with_retries, retry_after_seconds
+
+class APIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+class RecordingLimiter:
+    def __init__(self):
+        self.acquired = []
+
+    def acquire(self, tokens):
+        self.acquired.append(tokens)
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(ratelimit.time, "sleep", delays.append)
+    return delays
+
+def test_retry_after_seconds_reads_headers():
+    assert retry_after_seconds(APIError(429, {"retry-after-ms": "1500", "retry-after": "9"})) == 1.5
+    assert retry_after_seconds(APIError(429, {"retry-after": "3"})) == 3.0
+    retry_at = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < retry_after_seconds(APIError(429, {"retry-after": retry_at})) <= 30
+    assert retry_after_seconds(APIError(429, {"retry-after": "soon"})) is None
+    assert retry_after_seconds(APIError(429)) is None
+    assert retry_after_seconds(ValueError("no response")) is None
+
+def test_backoff_delay_honours_retry_after_with_jitter():
+    for _ in range(50):
+        assert 2.0 <= backoff_delay(0, retry_after=2.0) <= 2.4
+    assert backoff_delay(0, retry_after=10 * RETRY_MAX_DELAY) == RETRY_MAX_DELAY
+
+def test_backoff_delay_grows_exponentially_up_to_the_cap():
+    for attempt in range(10):
+        for _ in range(20):
+            assert 0 <= backoff_delay(attempt) <= min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+
+def test_rate_limiter_request_bucket():
+    limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=1_000_000)
+    assert limiter._reserve(10) == 0
+    assert limiter._reserve(10) == 0
+    # Empty: the next request refills at 2 per minute
+    assert 29 < limiter._reserve(10) <= 30
+
+def test_rate_limiter_token_bucket():
+    limiter = RateLimiter(requests_per_minute=1000, tokens_per_minute=100)
+    assert limiter._reserve(80) == 0
+    # 20 tokens left; 30 more refill in 18 seconds at 100 per minute
+    assert 17.9 < limiter._reserve(50) <= 18
+    # Requests larger than the whole quota wait for a full bucket instead of forever
+    assert limiter._reserve(500) <= 60
+
+def test_call_with_retries_retries_transient_errors(sleeps):
+    limiter = RecordingLimiter()
+    errors = [APIError(429, {"retry-after": "2"}), APIError(503)]
+
+    def call():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert call_with_retries(call, 42, limiter=limiter, max_retries=3) == "ok"
+    assert limiter.acquired == [42, 42, 42]
+    assert len(sleeps) == 2
+    assert 2.0 <= sleeps[0] <= 2.4
+    assert 0 <= sleeps[1] <= RETRY_BASE_DELAY * 2
+
+def test_call_with_retries_gives_up(sleeps):
+    limiter = RecordingLimiter()
+
+    def rejected():
+        raise APIError(400)
+
+    with pytest.raises(APIError):
+        call_with_retries(rejected, 1, limiter=limiter, max_retries=3)
+    assert limiter.acquired == [1]
+    assert sleeps == []
+
+    def overloaded():
+        raise APIError(500)
+
+    with pytest.raises(APIError):
+        call_with_retries(overloaded, 1, limiter=limiter, max_retries=3)
+    assert len(sleeps) == 2
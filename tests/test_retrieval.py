@@ -0,0 +1,62 @@
+from email_generator.config import RETRIEVAL_CHUNK_CHARS
+from email_generator.retrieval import join_chunks, query_terms, select_chunks, split_chunks
+
+def words(text):
+    return len(text.split())
+
+def paragraph(topic):
+    """One line about a topic, more than half a chunk long, so split_chunks keeps it as its own chunk."""
+    sentence = f"This section covers {topic} in some detail for the reader. "
+    return (sentence * (RETRIEVAL_CHUNK_CHARS // 2 // len(sentence) + 1)).strip()
+
+def test_query_terms_drop_stopwords_and_case():
+    assert query_terms("Please follow up about the OVERDUE invoice, the invoice!") == [
+        "follow", "invoice", "overdue", "up"
+    ]
+    assert query_terms("the and of") == []
+
+def test_split_chunks_breaks_at_lines_and_hard_splits_long_lines():
+    text = "\n".join(["x" * 300] * 5)
+    chunks = split_chunks(text)
+    assert all(len(chunk) <= RETRIEVAL_CHUNK_CHARS for chunk in chunks)
+    assert "\n".join(chunks) == text
+
+    long_line = "y" * (RETRIEVAL_CHUNK_CHARS * 2 + 10)
+    assert split_chunks(long_line) == [long_line[:RETRIEVAL_CHUNK_CHARS],
+                                       long_line[RETRIEVAL_CHUNK_CHARS:2 * RETRIEVAL_CHUNK_CHARS],
+                                       long_line[2 * RETRIEVAL_CHUNK_CHARS:]]
+    assert split_chunks("\n\n") == []
+
+def test_select_chunks_keeps_the_relevant_chunk_within_budget():
+    report = "\n".join(paragraph(topic) for topic in ("office plants", "the holiday party", "parking"))
+    invoices = "\n".join(paragraph(topic) for topic in ("the team offsite", "overdue invoice payments"))
+    budget = words(paragraph("overdue invoice payments")) + 3
+
+    selections = select_chunks([report, invoices], "Chase the overdue invoice", budget, words)
+
+    assert selections[0] == []
+    [(position, chunk)] = selections[1]
+    assert "overdue invoice" in chunk
+    assert split_chunks(invoices)[position] == chunk
+
+def test_select_chunks_without_matches_takes_texts_from_the_start():
+    text = "\n".join(paragraph(topic) for topic in ("alpha", "beta", "gamma"))
+    chunks = split_chunks(text)
+    budget = 2 * (words(chunks[0]) + 3)
+
+    [selected] = select_chunks([text], "zebra", budget, words)
+
+    assert [position for position, _ in selected] == [0, 1]
+
+def test_select_chunks_returns_chunks_in_document_order():
+    text = "\n".join(paragraph(topic) for topic in ("invoice", "lunch", "invoice reminder", "weather"))
+
+    [selected] = select_chunks([text], "invoice", 10_000, words)
+
+    assert [position for position, _ in selected] == sorted(position for position, _ in selected)
+    assert len(selected) == len(split_chunks(text))
+
+def test_join_chunks_marks_gaps():
+    assert join_chunks([(0, "a"), (1, "b"), (3, "d")]) == "a\nb\n[…]\nd"
+    assert join_chunks([(2, "c")]) == "[…]\nc"
+    assert join_chunks([]) == "[…]"
@@ -0,0 +1,145 @@
+import json
+import threading
+
+import pytest
+
+pytest.importorskip("httpx")
+from starlette.testclient import TestClient
+
+from email_generator import service
+from email_generator.history import HistoryStore, build_email_record
+from email_generator.service import create_app
+
+PARAMS = {
+    "tone": "Professional",
+    "recipient_name": "Grace",
+    "language": "English",
+    "writing_style": "Direct",
+    "email_length": "Short",
+    "email_purpose": "Follow up",
+}
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    monkeypatch.setattr(service, "get_history_store", lambda: store)
+    yield store
+    store.close()
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Replace the pipeline with a fake that records its arguments and streams two tokens."""
+    calls = []
+
+    def generate_record(params, model, on_token=None, **options):
+        calls.append(dict(options, params=params, model=model))
+        if params['recipient_name'] == "fail":
+            raise Exception("the model returned an empty email")
+        if on_token:
+            on_token("Dear ")
+            on_token(f"Dear {params['recipient_name']},")
+        return {"content": f"Dear {params['recipient_name']},", "stats": {"source": "computed"}}
+
+    monkeypatch.setattr(service, "generate_record", generate_record)
+    return calls
+
+@pytest.fixture
+def client(store):
+    with TestClient(create_app(concurrency=2, max_waiting=0, api_key=None)) as client:
+        yield client
+
+def add(store, subject, user_id):
+    return store.add(build_email_record(f"Subject: {subject}\nDear Grace,", PARAMS), user_id)
+
+def test_generate_returns_the_record(client, calls):
+    response = client.post("/generate?user=alice", json={"recipient_name": "Ada", "preset": "Sales Pitch"})
+    assert response.status_code == 200
+    assert response.json()["content"] == "Dear Ada,"
+    [call] = calls
+    assert call["params"]["recipient_name"] == "Ada"
+    assert call["preset_name"] == "Sales Pitch"
+    assert call["user_id"] == "alice" and call["variants"] == 1
+
+    client.post("/generate", json={"recipient_name": "Ada", "save_history": False, "variants": 3})
+    assert calls[1]["user_id"] is None and calls[1]["variants"] == 3
+
+@pytest.mark.parametrize("body, query, error", [
+    ({"model": "gpt-unknown"}, "", "Unknown model"),
+    ({"preset": "Unknown"}, "", "Unknown preset"),
+    ({"recipient_name": 42}, "", "recipient_name must be a string"),
+    ({"variants": 3}, "?stream=true", "variants cannot be streamed"),
+    ({"variants": 99}, "", "variants must be between"),
+])
+def test_generate_rejects_bad_requests(client, calls, body, query, error):
+    response = client.post("/generate" + query, json=body)
+    assert response.status_code == 400
+    assert error in response.json()["error"]
+    assert calls == []
+
+def test_generate_reports_pipeline_errors(client, calls):
+    response = client.post("/generate", json={"recipient_name": "fail"})
+    assert response.status_code == 502
+    assert response.json() == {"error": "Generation error: the model returned an empty email"}
+
+def test_generate_streams_server_sent_events(client, calls):
+    response = client.post("/generate?stream=true", json={"recipient_name": "Ada"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        (block.split("\n")[0].removeprefix("event: "), json.loads(block.split("\n")[1].removeprefix("data: ")))
+        for block in response.text.strip().split("\n\n")
+    ]
+    assert events == [
+        ("token", {"text": "Dear "}),
+        ("token", {"text": "Ada,"}),
+        ("done", {"content": "Dear Ada,", "stats": {"source": "computed"}}),
+    ]
+
+def test_full_service_answers_503(store, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def generate_record(params, model, **options):
+        started.set()
+        assert release.wait(5)
+        return {"content": "done"}
+
+    monkeypatch.setattr(service, "generate_record", generate_record)
+    with TestClient(create_app(concurrency=1, max_waiting=0, api_key=None)) as client:
+        first = threading.Thread(target=client.post, args=("/generate",), kwargs={"json": {}})
+        first.start()
+        assert started.wait(5)
+        try:
+            response = client.post("/generate", json={})
+            assert response.status_code == 503
+            assert response.headers["retry-after"] == "1"
+            assert client.get("/health").json()["running"] == 1
+        finally:
+            release.set()
+            first.join()
+        assert client.get("/health").json()["running"] == 0
+
+def test_api_key_is_required_when_set(store):
+    with TestClient(create_app(api_key="secret")) as client:
+        assert client.get("/history").status_code == 401
+        assert client.get("/history", headers={"Authorization": "Bearer secret"}).status_code == 200
+        assert client.get("/health").status_code == 200
+
+def test_history_is_scoped_to_the_user(client, store):
+    alice_id = add(store, "For Alice", "alice")
+    add(store, "For Bob", "bob")
+
+    listing = client.get("/history?user=alice").json()
+    assert listing["total"] == 1
+    assert [email["id"] for email in listing["emails"]] == [alice_id]
+    assert client.get("/history?user=alice&query=bob").json()["total"] == 0
+
+    assert client.get(f"/history/{alice_id}?user=alice").json()["metadata"]["subject"] == "For Alice"
+    assert client.get(f"/history/{alice_id}?user=mallory").status_code == 404
+    assert client.delete(f"/history/{alice_id}?user=mallory").status_code == 404
+    assert store.get(alice_id, "alice") is not None
+
+    assert client.delete(f"/history/{alice_id}?user=alice").json() == {"deleted": alice_id}
+    assert client.get(f"/history/{alice_id}?user=alice").status_code == 404
+
+def test_history_rejects_bad_filters(client):
+    assert client.get("/history?from=yesterday").status_code == 400
+    assert client.get("/history?limit=0").status_code == 400
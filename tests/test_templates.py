@@ -0,0 +1,41 @@
+from email_generator.templates import CompiledTemplate, parse_slot_values
+
+TEMPLATE = (
+    "Dear [Recipient Name],\n\n"
+    "[If applicable: We met at [Event] last week.]\n\n"
+    "I am writing about [Topic].\n\n"
+    "Best regards,\n[Your Name]"
+)
+
+def test_slots_and_sections_are_parsed_once():
+    template = CompiledTemplate(TEMPLATE)
+    assert template.slots == ["Recipient Name", "Event", "Topic", "Your Name"]
+    assert template.sections == ["If applicable"]
+
+def test_render_fills_slots_and_reports_the_rest():
+    result = CompiledTemplate(TEMPLATE).render({"recipient name": "Ada", "TOPIC": "the roadmap"})
+    assert result["text"] == (
+        "Dear Ada,\n\nI am writing about the roadmap.\n\nBest regards,\n[Your Name]"
+    )
+    assert result["filled"] == ["Recipient Name", "Topic"]
+    assert result["unfilled"] == ["Your Name"]
+    assert result["sections"] == {"If applicable": False}
+
+def test_section_is_kept_when_its_slots_are_filled():
+    result = CompiledTemplate(TEMPLATE).render({"Event": "PyCon"})
+    assert "We met at PyCon last week." in result["text"]
+    assert result["sections"] == {"If applicable": True}
+
+def test_section_label_switches_it_on_or_off():
+    template = CompiledTemplate(TEMPLATE)
+    off = template.render({"Event": "PyCon", "If applicable": "no"})
+    assert "PyCon" not in off["text"]
+    assert off["sections"] == {"If applicable": False}
+
+    on = template.render({"If applicable": "yes"})
+    assert "We met at [Event] last week." in on["text"]
+    assert "Event" in on["unfilled"]
+
+def test_parse_slot_values():
+    values = parse_slot_values("[Topic]: the roadmap\nEvent = PyCon\nnot a slot\nEmpty:")
+    assert values == {"Topic": "the roadmap", "Event": "PyCon"}
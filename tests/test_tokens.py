@@ -0,0 +1,57 @@
+import pytest
+
+from email_generator import tokens
+from email_generator.config import (
+    MAX_ATTACHMENT_TOKENS,
+    DEFAULT_CONTEXT_WINDOW,
+    OUTPUT_TOKENS_BY_LENGTH,
+    GENERATION_MAX_TOKENS,
+    CONTEXT_SAFETY_MARGIN,
+)
+from email_generator.tokens import count_tokens, fair_shares, plan_token_budget, truncate_to_tokens
+
+@pytest.fixture
+def approximate(monkeypatch):
+    """Count with the local approximation, as when tiktoken is unavailable."""
+    monkeypatch.setattr(tokens, "get_encoding", lambda model=None: None)
+
+@pytest.mark.parametrize("sizes, budget, expected", [
+    ([10, 50, 200], 150, [10, 50, 90]),
+    ([10, 20], 100, [10, 20]),
+    ([300, 100, 300], 300, [100, 100, 100]),
+    ([200, 10, 200], 110, [50, 10, 50]),
+    ([], 100, []),
+])
+def test_fair_shares(sizes, budget, expected):
+    assert fair_shares(sizes, budget) == expected
+
+def test_plan_token_budget_caps_attachments():
+    budget = plan_token_budget("gpt-4o", 500, "Short")
+    assert budget == {
+        "context_window": 128000,
+        "max_output_tokens": OUTPUT_TOKENS_BY_LENGTH["Short"],
+        "attachment_budget": MAX_ATTACHMENT_TOKENS,
+    }
+
+def test_plan_token_budget_fits_a_small_context_window():
+    instruction_tokens = DEFAULT_CONTEXT_WINDOW - 1000
+    budget = plan_token_budget("unknown-model", instruction_tokens, "Short")
+    assert budget["context_window"] == DEFAULT_CONTEXT_WINDOW
+    assert budget["attachment_budget"] == 1000 - OUTPUT_TOKENS_BY_LENGTH["Short"] - CONTEXT_SAFETY_MARGIN
+
+    budget = plan_token_budget("unknown-model", DEFAULT_CONTEXT_WINDOW, None)
+    assert budget["max_output_tokens"] == GENERATION_MAX_TOKENS
+    assert budget["attachment_budget"] == 0
+
+def test_approximate_counts(approximate):
+    assert count_tokens("你好世界") == 4
+    assert count_tokens("12345") == 2
+    assert count_tokens("Hello, world!") == 4
+    assert count_tokens("") == 0
+
+def test_truncate_to_tokens(approximate):
+    text = "one two three four five six"
+    assert truncate_to_tokens(text, 10) == (text, False)
+    cut, truncated = truncate_to_tokens(text, 3)
+    assert truncated and cut == "one two three"
+    assert count_tokens(cut) <= 3
@@ -0,0 +1,80 @@
+import pytest
+
+from email_generator import pipeline
+from email_generator.cli import DEFAULT_PARAMS
+from email_generator.history import HistoryStore
+from email_generator.variants import rank_variants, score_variant
+
+PARAMS = {"user_name": "Grace Hopper", "recipient_name": "Ada Lovelace", "email_length": "Short"}
+
+def email(words, subject=True, greeting="Dear Ada,", closing="Best,\nGrace"):
+    body = " ".join(["word"] * words)
+    return "\n".join(filter(None, ["Subject: Hello" if subject else "", greeting, body, closing]))
+
+def test_good_draft_passes_every_check():
+    checks = score_variant(email(80), PARAMS)
+    assert checks["has_subject"]
+    assert checks["length_fit"] == 1.0
+    assert checks["unfilled"] == [] and checks["missing_names"] == []
+
+def test_placeholders_and_missing_names_are_reported():
+    checks = score_variant(email(80, greeting="Dear [Recipient Name],", closing="Best,\n[Your Name]"), PARAMS)
+    assert checks["unfilled"] == ["[Recipient Name]", "[Your Name]"]
+    assert checks["missing_names"] == ["Grace Hopper", "Ada Lovelace"]
+    assert checks["score"] < score_variant(email(80), PARAMS)["score"]
+
+def test_blank_names_are_ignored():
+    checks = score_variant(email(80), dict(PARAMS, user_name="   ", recipient_name=None))
+    assert checks["missing_names"] == []
+
+def test_rank_puts_the_best_draft_first():
+    drafts = [email(400), email(80, subject=False), email(80)]
+    ranked = rank_variants(drafts, PARAMS)
+    assert [variant["email"] for variant in ranked] == [drafts[2], drafts[0], drafts[1]]
+    assert ranked[0]["score"] > ranked[1]["score"] > ranked[2]["score"]
+
+def test_rank_keeps_the_api_order_for_ties():
+    drafts = [email(80, closing="Thanks,\nGrace"), email(80)]
+    assert [variant["email"] for variant in rank_variants(drafts, PARAMS)] == drafts
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    yield store
+    store.close()
+
+def fake_completions(monkeypatch, texts):
+    requests = []
+
+    def generate_variants_cached(client, prompt, model, n, bypass_cache=False, max_tokens=None):
+        requests.append(n)
+        return texts, {"time_to_first_token": 0.1, "total_time": 0.1, "source": "computed"}
+
+    monkeypatch.setattr(pipeline, "initialize_openai_client", lambda: None)
+    monkeypatch.setattr(pipeline, "generate_variants_cached", generate_variants_cached)
+    monkeypatch.setattr(pipeline, "generate_email_cached", lambda *args, **kwargs: ("", {"source": "computed"}))
+    return requests
+
+def test_generate_record_saves_the_best_variant(monkeypatch, store):
+    drafts = [email(400), email(80)]
+    requests = fake_completions(monkeypatch, drafts)
+    params = dict(DEFAULT_PARAMS, **PARAMS, uploaded_files=[])
+
+    record = pipeline.generate_record(params, "gpt-4o", variants=2, user_id="ada", store=store)
+
+    assert requests == [2]
+    assert record["content"] == drafts[1]
+    assert [variant["email"] for variant in record["variants"]] == [drafts[1], drafts[0]]
+    assert record["variants"][0]["email_id"] == record["id"]
+    assert record["variants"][1]["record"]["content"] == drafts[0]
+    assert "id" not in record["variants"][1]["record"]
+    assert store.count("ada") == 1 and store.get(record["id"], "ada")["content"] == drafts[1]
+    assert record["stats"]["tokens"]["output_tokens"] > 0
+
+def test_generate_record_rejects_an_empty_email(monkeypatch, store):
+    fake_completions(monkeypatch, [])
+    params = dict(DEFAULT_PARAMS, **PARAMS, uploaded_files=[])
+
+    with pytest.raises(Exception, match="empty email"):
+        pipeline.generate_record(params, "gpt-4o", user_id="ada", store=store)
+    assert store.count("ada") == 0